@@ -0,0 +1,245 @@
+"""Offline benchmarks for the prices pipeline.
+
+Runs ``get_prices`` against synthetic providers (configurable latency and
+history length), then times normalization and the CSV/Parquet writers at
+several universe sizes. Results are stored as JSON so a later run can be
+compared against a baseline::
+
+    python -m benchmarks.bench_prices --out bench.json
+    python -m benchmarks.bench_prices --compare benchmarks/baseline.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+import numpy as np
+import pandas as pd
+
+from marketdata import prices as mp
+from marketdata.providers import Provider
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - Windows
+    resource = None  # type: ignore
+
+DEFAULT_SIZES = [10, 1_000, 10_000]
+
+# Metrics where a larger value is better; every other metric is a cost.
+HIGHER_IS_BETTER = {"tickers_per_sec"}
+
+
+class SyntheticProvider(Provider):
+    """Offline provider returning ``history`` random-walk bars per symbol."""
+
+    def __init__(self, name: str = "yahoo", *, latency: float = 0.0, history: int = 252, **kwargs) -> None:
+        kwargs.setdefault("max_concurrency", 64)
+        super().__init__(**kwargs)
+        self.name = name
+        self.latency = latency
+        self.history = history
+
+    def download(self, tickers: List[str], start: pd.Timestamp, end: pd.Timestamp) -> Dict[str, pd.DataFrame]:
+        if self.latency:
+            time.sleep(self.latency)
+        idx = pd.bdate_range(end=end, periods=self.history, name="Date")
+        out = {}
+        for t in tickers:
+            rng = np.random.default_rng(zlib.crc32(t.encode()))
+            close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(idx))))
+            out[t] = pd.DataFrame(
+                {
+                    "Open": close,
+                    "High": close * 1.01,
+                    "Low": close * 0.99,
+                    "Close": close,
+                    "Adj Close": close,
+                    "Volume": rng.integers(1_000, 1_000_000, len(idx)),
+                },
+                index=idx,
+            )
+        return out
+
+
+def _peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return round(peak / (1 << 20 if sys.platform == "darwin" else 1 << 10), 1)
+
+
+def _dir_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+
+
+@contextmanager
+def _stage(timings: Dict[str, float], name: str) -> Iterator[None]:
+    t0 = time.perf_counter()
+    yield
+    timings[name] = round(time.perf_counter() - t0, 4)
+
+
+def run_size(
+    n: int,
+    *,
+    latency: float = 0.0,
+    history: int = 252,
+    workers: int = 8,
+    batch_size: int = 100,
+) -> dict:
+    """Benchmark one universe size and return its metrics."""
+    tickers = [f"T{i:05d}" for i in range(n)]
+    end = pd.Timestamp("2024-12-31")
+    start = end - pd.offsets.BDay(history)
+    primary = SyntheticProvider(latency=latency, history=history)
+    fallback = SyntheticProvider("stooq", latency=latency, history=history)
+    timings: Dict[str, float] = {}
+
+    with _stage(timings, "fetch"):
+        bars = mp.get_prices(
+            tickers, str(start.date()), str(end.date()), workers=workers, batch_size=batch_size, providers=(primary, fallback)
+        )
+
+    raw = primary.download(tickers, start, end)
+    with _stage(timings, "normalize"):
+        mp.normalize_batch(raw, "yahoo")
+    del raw
+
+    with _stage(timings, "ensure_date_column"):
+        for df in bars.values():
+            mp._ensure_date_column(df)
+
+    written: Dict[str, int] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_dir = os.path.join(tmp, "csv")
+        with _stage(timings, "save_csv"):
+            mp.save_prices_csv(bars, csv_dir, incremental=False)
+        written["csv"] = _dir_bytes(csv_dir)
+
+        with _stage(timings, "save_csv_parallel"):
+            mp.save_prices_csv(bars, os.path.join(tmp, "csv_parallel"), incremental=False, workers=workers, processes=True)
+
+        # One extra bar per ticker, as in a nightly incremental update.
+        nxt = end + pd.offsets.BDay(1)
+        update = {t: df.tail(1).assign(Date=nxt) for t, df in bars.items()}
+        with _stage(timings, "save_csv_incremental"):
+            mp.save_prices_csv(update, csv_dir, incremental=True)
+
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:  # pragma: no cover - optional dep
+            pass
+        else:
+            pq_dir = os.path.join(tmp, "parquet")
+            with _stage(timings, "save_parquet"):
+                mp.save_prices_parquet(bars, pq_dir)
+            written["parquet"] = _dir_bytes(pq_dir)
+
+    total = sum(timings.values())
+    return {
+        "tickers": n,
+        "rows": int(sum(len(df) for df in bars.values())),
+        "tickers_per_sec": round(n / timings["fetch"], 1) if timings["fetch"] else None,
+        "bytes_written": written,
+        "peak_rss_mb": _peak_rss_mb(),
+        "stages_sec": timings,
+        "total_sec": round(total, 4),
+    }
+
+
+def run_suite(sizes: List[int] = DEFAULT_SIZES, **kwargs) -> dict:
+    """Run :func:`run_size` for each size (ascending, so peak RSS is per size)."""
+    results = {}
+    for n in sorted(sizes):
+        results[str(n)] = run_size(n, **kwargs)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            **kwargs,
+        },
+        "results": results,
+    }
+
+
+def _flatten(result: dict) -> Dict[str, float]:
+    flat = {"tickers_per_sec": result["tickers_per_sec"], "peak_rss_mb": result["peak_rss_mb"]}
+    flat.update({f"stages_sec.{k}": v for k, v in result["stages_sec"].items()})
+    flat.update({f"bytes_written.{k}": v for k, v in result["bytes_written"].items()})
+    return flat
+
+
+def compare(current: dict, baseline: dict, tolerance: float = 0.25) -> List[str]:
+    """Return a line per metric that regressed by more than ``tolerance``.
+
+    A metric the baseline has no value for (say a newly added stage) is
+    reported too, so it can't go unchecked until the baseline is refreshed.
+    """
+    regressions = []
+    for size, result in current["results"].items():
+        base = baseline["results"].get(size)
+        if base is None:
+            continue
+        base_flat = _flatten(base)
+        for metric, value in _flatten(result).items():
+            if metric not in base_flat:
+                regressions.append(f"{size} tickers: {metric} missing from baseline")
+                continue
+            ref = base_flat[metric]
+            if value is None or not ref:
+                continue
+            ratio = value / ref
+            worse = ratio < 1 - tolerance if metric in HIGHER_IS_BETTER else ratio > 1 + tolerance
+            if worse:
+                regressions.append(f"{size} tickers: {metric} {ref} -> {value} ({ratio:.2f}x)")
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(prog="bench_prices", description=__doc__.splitlines()[0])
+    ap.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    ap.add_argument("--latency", type=float, default=0.0, help="Synthetic provider latency per request (s)")
+    ap.add_argument("--history", type=int, default=252, help="Bars per ticker")
+    ap.add_argument("--workers", type=int, default=8)
+    ap.add_argument("--batch-size", type=int, default=100)
+    ap.add_argument("--out", help="Write results JSON here")
+    ap.add_argument("--compare", help="Baseline JSON to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative regression")
+    args = ap.parse_args(argv)
+
+    report = run_suite(
+        args.sizes,
+        latency=args.latency,
+        history=args.history,
+        workers=args.workers,
+        batch_size=args.batch_size,
+    )
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            fh.write(text + "\n")
+    print(text)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as fh:
+            baseline = json.load(fh)
+        regressions = compare(report, baseline, args.tolerance)
+        for line in regressions:
+            print("REGRESSION", line)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main())
@@ -1,2 +1,2 @@
-__all__ = ['prices']
+__all__ = ['analytics', 'backfill', 'cache', 'calendars', 'cli', 'client', 'intraday', 'metrics', 'mmap_store', 'panel', 'prices', 'providers', 'refresh', 'server', 'store']
 __version__ = '1.0.0'
@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import tempfile
+import threading
+from functools import partial
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .cache import DEFAULT_CACHE_DIR, _atomic_write_json
+from .panel import PRICE_COLUMNS, to_long
+
+log = logging.getLogger(__name__)
+
+TRADING_DAYS = 252
+
+Bars = Dict[str, pd.DataFrame] | pd.DataFrame
+Result = pd.Series | pd.DataFrame
+
+
+def _long(bars: Bars) -> pd.DataFrame:
+    """Return ``bars`` (a dict or a long panel) as a ``(Ticker, Date)``-sorted long panel."""
+    if isinstance(bars, dict):
+        return to_long(bars)
+    if not isinstance(bars.index, pd.MultiIndex):
+        bars = bars.set_index(["Ticker", "Date"])
+    return bars if bars.index.is_monotonic_increasing else bars.sort_index()
+
+
+def _groups(long: pd.DataFrame) -> tuple[List[str], np.ndarray, np.ndarray]:
+    """Return the tickers of a sorted long panel with their first and end row positions."""
+    codes = long.index.codes[0]
+    starts = np.r_[0, np.flatnonzero(np.diff(codes)) + 1] if len(codes) else np.array([], dtype=np.int64)
+    ends = np.r_[starts[1:], len(codes)].astype(np.int64)
+    names = [str(t) for t in long.index.levels[0][codes[starts]]]
+    return names, starts, ends
+
+
+class DerivedCache:
+    """On-disk cache of derived series, keyed by the version of the bars they came from.
+
+    Each series (say 21-day volatility of ``Adj Close``) is kept as one
+    pickled long frame in ``<cache_dir>/<key>.pkl``. ``<key>.json`` records,
+    per ticker, how many source rows it was computed from and a running
+    hash of those rows, which is the source-data version. Methods are
+    thread-safe.
+    """
+
+    def __init__(self, cache_dir: str = os.path.join(DEFAULT_CACHE_DIR, "derived")) -> None:
+        self.cache_dir = cache_dir
+        self._lock = threading.RLock()
+
+    def _path(self, key: str, ext: str) -> str:
+        return os.path.join(self.cache_dir, f"{key.replace(' ', '_')}.{ext}")
+
+    def load(self, key: str) -> tuple[Result | None, Dict[str, dict]]:
+        with self._lock:
+            try:
+                with open(self._path(key, "json"), "r", encoding="utf-8") as fh:
+                    versions = json.load(fh)
+                return pd.read_pickle(self._path(key, "pkl")), versions
+            except Exception:  # missing or unreadable: recompute from scratch
+                return None, {}
+
+    def save(self, key: str, result: Result, versions: Dict[str, dict]) -> None:
+        with self._lock:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            os.close(fd)
+            result.to_pickle(tmp_path)
+            os.replace(tmp_path, self._path(key, "pkl"))
+            _atomic_write_json(self._path(key, "json"), versions)
+
+    def clear(self) -> None:
+        with self._lock:
+            if os.path.isdir(self.cache_dir):
+                for name in os.listdir(self.cache_dir):
+                    if name.endswith((".pkl", ".json")):
+                        os.remove(os.path.join(self.cache_dir, name))
+
+
+def _derive(
+    key: str,
+    long: pd.DataFrame,
+    fn: Callable[[pd.DataFrame], Result],
+    columns: Sequence[str],
+    *,
+    lookback: int,
+    redo: int,
+    cache: DerivedCache | None,
+) -> Result:
+    """Compute ``fn`` over a long panel, reusing what ``cache`` holds under ``key``.
+
+    A ticker whose bars match the cached version is served from the cache.
+    One whose bars only gained rows at the end (the cached rows hash the
+    same) keeps its cached results except the last ``redo``, and ``fn``
+    runs on the bars after those plus ``lookback`` earlier rows of warm-up;
+    any other ticker is recomputed in full. All the rows to compute are
+    stacked into one slice, so ``fn`` runs once per call.
+    """
+    if cache is None or long.empty:
+        return fn(long)
+
+    names, starts, ends = _groups(long)
+    rows = ends - starts
+    dates = long.index.get_level_values("Date")
+    frame = long[list(columns)].reset_index(level="Date")
+    prefix = np.r_[np.uint64(0), np.cumsum(pd.util.hash_pandas_object(frame, index=False).to_numpy())]
+    full = prefix[ends] - prefix[starts]
+
+    cached, versions = cache.load(key)
+    cached_tickers = set() if cached is None else set(cached.index.get_level_values("Ticker").unique().astype(str))
+    # Rows each ticker's cached results came from, and the hash of that many current rows.
+    seen = np.array(
+        [versions[t]["rows"] if t in versions and t in cached_tickers else 0 for t in names], dtype=np.int64
+    )
+    seen = np.where(seen <= rows, seen, 0)
+    prior = prefix[starts + seen] - prefix[starts]
+    keep_through: Dict[str, pd.Timestamp] = {}  # cached rows kept per ticker, by date
+    compute_after: Dict[str, pd.Timestamp] = {}  # fresh rows used per ticker, by date
+    positions: List[np.ndarray] = []
+    reused = tailed = 0
+    for i, t in enumerate(names):
+        if seen[i] and int(prior[i]) == versions[t]["digest"]:
+            if seen[i] == rows[i]:
+                keep_through[t] = pd.Timestamp.max
+                reused += 1
+                continue
+            old = cached.xs(t, level="Ticker").index
+            if len(old) > redo:
+                cut = old[len(old) - redo - 1]
+                first = starts[i] + int(np.searchsorted(dates[starts[i] : ends[i]], cut, side="right"))
+                positions.append(np.arange(max(starts[i], first - lookback), ends[i]))
+                keep_through[t] = compute_after[t] = cut
+                tailed += 1
+                continue
+        positions.append(np.arange(starts[i], ends[i]))
+    log.debug("%s: %d tickers cached, %d tails, %d full", key, reused, tailed, len(names) - reused - tailed)
+
+    parts: List[Result] = []
+    if cached is not None:
+        ticks = cached.index.get_level_values("Ticker").astype(str)
+        limit = pd.Series(keep_through, dtype="datetime64[ns]").reindex(ticks).to_numpy()
+        own = ~ticks.isin(names)
+        parts.append(cached[own | (cached.index.get_level_values("Date").to_numpy() <= limit)])
+    if positions:
+        fresh = fn(long.iloc[np.concatenate(positions)])
+        ticks = fresh.index.get_level_values("Ticker").astype(str)
+        after = pd.Series(compute_after, dtype="datetime64[ns]").reindex(ticks).to_numpy()
+        fresh_dates = fresh.index.get_level_values("Date").to_numpy()
+        parts.append(fresh[pd.isna(after) | (fresh_dates > after)])
+
+    merged = pd.concat(parts).sort_index() if len(parts) > 1 else parts[0]
+    versions.update({t: {"rows": int(r), "digest": int(d)} for t, r, d in zip(names, rows, full)})
+    cache.save(key, merged, versions)
+    wanted = merged.index.get_level_values("Ticker").astype(str).isin(names)
+    return merged[wanted]
+
+
+def _returns(long: pd.DataFrame, field: str, periods: int, log_returns: bool) -> pd.Series:
+    x = long[field].to_numpy(dtype="float64")
+    codes = long.index.codes[0]
+    out = np.full(len(x), np.nan)
+    if 0 < periods < len(x):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = x[periods:] / x[:-periods]
+            out[periods:] = np.where(
+                codes[periods:] == codes[:-periods], np.log(ratio) if log_returns else ratio - 1.0, np.nan
+            )
+    return pd.Series(out, index=long.index, name="Return")
+
+
+def returns(
+    bars: Bars,
+    *,
+    field: str = "Adj Close",
+    periods: int = 1,
+    log_returns: bool = False,
+    cache: DerivedCache | None = None,
+) -> pd.Series:
+    """Per-ticker returns over ``periods`` bars for every ticker at once.
+
+    ``bars`` is a ``{ticker: frame}`` dict or a long panel (see
+    :func:`marketdata.panel.to_long`). The result is indexed like the long
+    panel, so ``.unstack("Ticker")`` gives a ``Date`` x ``Ticker`` frame;
+    each ticker's first ``periods`` rows are NaN. With a
+    :class:`DerivedCache`, only tickers whose bars changed are recomputed,
+    and for bars that were only appended to, only the new rows.
+    """
+    long = _long(bars)
+    key = f"returns-{field}-{periods}-{'log' if log_returns else 'simple'}"
+    fn = partial(_returns, field=field, periods=periods, log_returns=log_returns)
+    return _derive(key, long, fn, [field], lookback=periods, redo=0, cache=cache)
+
+
+def rolling_volatility(
+    bars: Bars,
+    window: int = 21,
+    *,
+    field: str = "Adj Close",
+    annualize: int | None = TRADING_DAYS,
+    cache: DerivedCache | None = None,
+) -> pd.Series:
+    """Rolling standard deviation of daily log returns over ``window`` bars.
+
+    Scaled by ``sqrt(annualize)`` unless that is ``None``. The rolling
+    window runs once over the stacked panel: each ticker's first return is
+    NaN, so windows reaching into the previous ticker come out NaN rather
+    than mixing tickers. Indexed and cached like :func:`returns`.
+    """
+    long = _long(bars)
+    scale = np.sqrt(annualize) if annualize else 1.0
+
+    def fn(df: pd.DataFrame) -> pd.Series:
+        r = _returns(df, field, 1, True)
+        vol = pd.Series(r.to_numpy()).rolling(window, min_periods=window).std().to_numpy() * scale
+        return pd.Series(vol, index=df.index, name="Volatility")
+
+    key = f"volatility-{field}-{window}-{annualize}"
+    return _derive(key, long, fn, [field], lookback=window, redo=0, cache=cache)
+
+
+def _resample(long: pd.DataFrame, rule: str) -> pd.DataFrame:
+    df = long.reset_index()
+    df["Ticker"] = df["Ticker"].astype("category")
+    out = df.groupby(["Ticker", pd.Grouper(key="Date", freq=rule)], observed=True, sort=True).agg(
+        Open=("Open", "first"),
+        High=("High", "max"),
+        Low=("Low", "min"),
+        Close=("Close", "last"),
+        AdjClose=("Adj Close", "last"),
+        Volume=("Volume", "sum"),
+        Source=("Source", "last"),
+        Last=("Date", "last"),
+    )
+    out = out.rename(columns={"AdjClose": "Adj Close"})
+    ticker = out.index.get_level_values("Ticker")
+    out.index = pd.MultiIndex.from_arrays([ticker, out.pop("Last")], names=["Ticker", "Date"])
+    return out
+
+
+def resample(bars: Bars, rule: str = "W-FRI", *, cache: DerivedCache | None = None) -> pd.DataFrame:
+    """Aggregate bars to ``rule`` periods (``"W-FRI"``, ``"ME"``...) for every ticker at once.
+
+    Open is the period's first, High the max, Low the min, Close and
+    Adj Close the last and Volume the sum. Rows are dated by each period's
+    last bar, so a week cut short by a holiday ends on its Thursday. Returns
+    a long panel like :func:`marketdata.panel.to_long`. With a
+    :class:`DerivedCache` a ticker's latest (possibly partial) period is
+    redone as new bars arrive and earlier ones are kept.
+    """
+    long = _long(bars)
+    fn = partial(_resample, rule=rule)
+    return _derive(f"resample-{rule}", long, fn, PRICE_COLUMNS + ["Volume"], lookback=0, redo=1, cache=cache)
@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+import pandas as pd
+
+from .cache import _atomic_write_json
+from .prices import get_prices, save_prices_csv, save_prices_parquet
+
+log = logging.getLogger(__name__)
+
+MANIFEST_NAME = ".backfill.json"
+
+
+def plan_chunks(
+    tickers: List[str],
+    start: str,
+    end: str,
+    *,
+    chunk_size: int = 100,
+    years_per_chunk: int = 5,
+) -> List[dict]:
+    """Split ``tickers`` x ``start``..``end`` into backfill chunks.
+
+    Each chunk covers up to ``chunk_size`` tickers and ``years_per_chunk``
+    years. Chunk ids are derived from their position, so the same inputs
+    always produce the same plan.
+    """
+    start_dt, end_dt = pd.Timestamp(start), pd.Timestamp(end)
+    windows = []
+    lo = start_dt
+    while lo <= end_dt:
+        hi = min(lo + pd.DateOffset(years=years_per_chunk) - pd.Timedelta(days=1), end_dt)
+        windows.append((lo, hi))
+        lo = hi + pd.Timedelta(days=1)
+
+    chunks = []
+    size = max(1, chunk_size)
+    for g, i in enumerate(range(0, len(tickers), size)):
+        for lo, hi in windows:
+            chunks.append(
+                {
+                    "id": f"{g:05d}-{lo.date()}",
+                    "group": g,
+                    "tickers": tickers[i : i + size],
+                    "start": str(lo.date()),
+                    "end": str(hi.date()),
+                    "status": "pending",
+                    "attempts": 0,
+                }
+            )
+    return chunks
+
+
+def _fingerprint(tickers: List[str], start: str, end: str, chunk_size: int, years_per_chunk: int, fmt: str) -> dict:
+    digest = hashlib.sha1(",".join(tickers).encode()).hexdigest()
+    return {
+        "tickers": len(tickers),
+        "tickers_sha1": digest,
+        "start": str(pd.Timestamp(start).date()),
+        "end": str(pd.Timestamp(end).date()),
+        "chunk_size": chunk_size,
+        "years_per_chunk": years_per_chunk,
+        "format": fmt,
+    }
+
+
+def load_manifest(path: str) -> dict | None:
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return None
+
+
+def _fmt_seconds(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    return f"{seconds // 60}m{seconds % 60:02d}s"
+
+
+def run_backfill(
+    tickers: List[str],
+    start: str,
+    end: str,
+    out_dir: str,
+    *,
+    format: str = "csv",
+    partitioned: bool = False,
+    manifest_path: str | None = None,
+    chunk_size: int = 100,
+    years_per_chunk: int = 5,
+    parallel: int = 4,
+    reset: bool = False,
+    on_error: str = "raise",
+    progress: Callable[[int, int, float | None], None] | None = None,
+    **options,
+) -> dict:
+    """Backfill ``tickers`` over ``start``..``end`` into ``out_dir`` in resumable chunks.
+
+    The universe is cut into chunks (see :func:`plan_chunks`) whose status
+    is kept in a JSON manifest (``<out_dir>/.backfill.json`` by default),
+    rewritten atomically as each chunk finishes. Rerunning with the same
+    arguments skips chunks already ``done`` and retries the rest; a chunk
+    fails as a whole if its fetch raises (``on_error="raise"`` by default)
+    or its bars cannot be written. ``reset`` discards an existing manifest,
+    which is also required if the tickers, dates or chunking changed.
+
+    Up to ``parallel`` ticker groups run at once; each group's date windows
+    run oldest first, so writers append rather than rewrite. ``options``
+    go to :func:`~marketdata.prices.get_prices`. ``progress`` is called
+    after every chunk with ``(finished, total, eta_seconds)``; progress and
+    ETA are also logged. Returns the manifest.
+    """
+    tickers = sorted(dict.fromkeys(t.upper() for t in tickers))
+    manifest_path = manifest_path or os.path.join(out_dir, MANIFEST_NAME)
+    params = _fingerprint(tickers, start, end, chunk_size, years_per_chunk, format)
+
+    manifest = None if reset else load_manifest(manifest_path)
+    if manifest is not None and manifest.get("params") != params:
+        raise ValueError(f"{manifest_path} was written for a different backfill; reset it to start over")
+    if manifest is None:
+        chunks = plan_chunks(tickers, start, end, chunk_size=chunk_size, years_per_chunk=years_per_chunk)
+        manifest = {"params": params, "created_at": time.time(), "chunks": chunks}
+        os.makedirs(out_dir, exist_ok=True)
+        _atomic_write_json(manifest_path, manifest)
+
+    chunks = manifest["chunks"]
+    todo = [c for c in chunks if c["status"] != "done"]
+    total, finished = len(chunks), len(chunks) - len(todo)
+    if not todo:
+        log.info("backfill: all %d chunks already done", total)
+        return manifest
+    log.info("backfill: %d of %d chunks to run (%d already done)", len(todo), total, finished)
+
+    lock = threading.Lock()
+    writer_lock = threading.Lock()
+    mmap_writer = None
+    if format == "mmap":
+        from .mmap_store import MmapWriter
+
+        mmap_writer = MmapWriter(out_dir)
+    t0 = time.monotonic()
+    ran = 0
+
+    def write(bars: Dict[str, pd.DataFrame]) -> None:
+        if format == "csv":
+            paths = save_prices_csv(bars, out_dir, incremental=True)
+        elif format == "parquet":
+            paths = save_prices_parquet(bars, out_dir, partitioned=partitioned, incremental=True)
+        else:
+            with writer_lock:
+                paths = mmap_writer.write(bars)
+        # The file writers log failures and carry on; a chunk must not be marked done with bars missing.
+        written = {getattr(p, "ticker", p) for p in paths}
+        missing = [t for t, df in bars.items() if not df.empty and t not in written]
+        if missing:
+            raise RuntimeError(f"failed to write {', '.join(missing)}")
+
+    def finish(chunk: dict, status: str, **fields) -> None:
+        nonlocal finished, ran
+        with lock:
+            chunk.update(status=status, finished_at=time.time(), **fields)
+            finished += 1
+            ran += 1
+            elapsed = time.monotonic() - t0
+            eta = elapsed / ran * (total - finished) if ran else None
+            _atomic_write_json(manifest_path, manifest)
+        log.info(
+            "backfill: %d/%d chunks (%.0f%%), elapsed %s, ETA %s%s",
+            finished,
+            total,
+            100.0 * finished / total,
+            _fmt_seconds(elapsed),
+            _fmt_seconds(eta) if eta is not None else "?",
+            "" if status == "done" else f" [chunk {chunk['id']} failed: {chunk.get('error')}]",
+        )
+        if progress is not None:
+            progress(finished, total, eta)
+
+    def run_group(group: List[dict]) -> None:
+        for chunk in group:
+            with lock:
+                chunk.update(status="running", attempts=chunk.get("attempts", 0) + 1, error=None)
+            try:
+                bars = get_prices(chunk["tickers"], chunk["start"], chunk["end"], on_error=on_error, **options)
+                write(bars)
+            except Exception as e:
+                finish(chunk, "failed", error=str(e))
+            else:
+                finish(chunk, "done", rows=int(sum(len(df) for df in bars.values())))
+
+    groups: Dict[int, List[dict]] = {}
+    for chunk in todo:
+        groups.setdefault(chunk["group"], []).append(chunk)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, parallel), thread_name_prefix="backfill") as pool:
+            for fut in [pool.submit(run_group, g) for g in groups.values()]:
+                fut.result()
+    finally:
+        if mmap_writer is not None:
+            mmap_writer.close()
+        with lock:
+            _atomic_write_json(manifest_path, manifest)
+    return manifest
@@ -0,0 +1,330 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, List, Tuple
+
+import pandas as pd
+
+from .calendars import WEEKDAYS, ExchangeCalendar, for_symbol
+
+log = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "MARKETDATA_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "marketdata")
+)
+
+Range = Tuple[pd.Timestamp, pd.Timestamp]
+Stamped = Tuple[pd.Timestamp, pd.Timestamp, float]
+
+
+def _atomic_write_json(path: str, payload: dict) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as tmp:
+        json.dump(payload, tmp, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _merge_ranges(ranges: List[Range]) -> List[Range]:
+    """Merge overlapping or day-adjacent inclusive date ranges."""
+    merged: List[Range] = []
+    for lo, hi in sorted(ranges):
+        if merged and lo <= merged[-1][1] + pd.Timedelta(days=1):
+            merged[-1] = (merged[-1][0], max(merged[-1][1], hi))
+        else:
+            merged.append((lo, hi))
+    return merged
+
+
+def _merge_stamped(ranges: List[Stamped]) -> List[Stamped]:
+    """Merge like :func:`_merge_ranges`, keeping the oldest write time of the merged pieces."""
+    merged: List[Stamped] = []
+    for lo, hi, at in sorted(ranges):
+        if merged and lo <= merged[-1][1] + pd.Timedelta(days=1):
+            merged[-1] = (merged[-1][0], max(merged[-1][1], hi), min(merged[-1][2], at))
+        else:
+            merged.append((lo, hi, at))
+    return merged
+
+
+def _missing_ranges(
+    covered: List[Range], start: pd.Timestamp, end: pd.Timestamp, calendar: ExchangeCalendar = WEEKDAYS
+) -> List[Range]:
+    """Return the parts of ``start``..``end`` (inclusive) not in ``covered``.
+
+    Gaps that contain no ``calendar`` sessions (e.g. a weekend or holiday
+    between two cached weeks) cannot hold bars and are dropped.
+    """
+    gaps: List[Range] = []
+    cursor = start
+    for lo, hi in _merge_ranges(covered):
+        if hi < cursor:
+            continue
+        if lo > end:
+            break
+        if lo > cursor:
+            gaps.append((cursor, lo - pd.Timedelta(days=1)))
+        cursor = max(cursor, hi + pd.Timedelta(days=1))
+        if cursor > end:
+            break
+    if cursor <= end:
+        gaps.append((cursor, end))
+    if not gaps:
+        return gaps
+    counts = calendar.count_sessions([lo for lo, _ in gaps], [hi for _, hi in gaps])
+    return [gap for gap, n in zip(gaps, counts) if n > 0]
+
+
+class BarCache:
+    """Persistent on-disk cache of normalized daily bars.
+
+    Each ticker's bars live in ``<cache_dir>/bars/<TICKER>.pkl``; ``index.json``
+    records which inclusive date ranges have already been fetched and when
+    each was written, when the ticker was last read, and its file size. A
+    range not written within ``ttl`` no longer counts as covered, so it is
+    fetched again (a range merged from several writes expires with the
+    oldest); a ticker is dropped once all its ranges have expired, and the
+    least recently read tickers are evicted once the cache grows beyond
+    ``max_bytes``. Methods are
+    thread-safe, so one cache can be shared by concurrent fetches.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = DEFAULT_CACHE_DIR,
+        *,
+        ttl: pd.Timedelta | str | None = "1D",
+        max_bytes: int | None = 1 << 30,
+    ) -> None:
+        self.cache_dir = cache_dir
+        self.ttl = pd.Timedelta(ttl) if ttl is not None else None
+        self.max_bytes = max_bytes
+        self._index_path = os.path.join(cache_dir, "index.json")
+        self._index: Dict[str, dict] | None = None
+        self._lock = threading.RLock()
+
+    # --- index bookkeeping -------------------------------------------------
+
+    @property
+    def index(self) -> Dict[str, dict]:
+        if self._index is None:
+            try:
+                with open(self._index_path, "r", encoding="utf-8") as fh:
+                    self._index = json.load(fh)
+            except (FileNotFoundError, json.JSONDecodeError):
+                self._index = {}
+        return self._index
+
+    def _path(self, ticker: str) -> str:
+        return os.path.join(self.cache_dir, "bars", f"{ticker.upper().replace('^', '_')}.pkl")
+
+    def _flush(self) -> None:
+        _atomic_write_json(self._index_path, self.index)
+
+    def _drop(self, ticker: str) -> None:
+        self.index.pop(ticker, None)
+        try:
+            os.remove(self._path(ticker))
+        except FileNotFoundError:
+            pass
+
+    def _stale(self, written_at: float, now: float) -> bool:
+        return self.ttl is not None and now - written_at > self.ttl.total_seconds()
+
+    def _ranges(self, entry: dict, now: float) -> List[Stamped]:
+        """Return the unexpired ``(lo, hi, written_at)`` ranges of an index entry."""
+        ranges = [
+            (pd.Timestamp(r[0]), pd.Timestamp(r[1]), r[2] if len(r) > 2 else entry.get("written_at", 0))
+            for r in entry["ranges"]
+        ]
+        return [r for r in ranges if not self._stale(r[2], now)]
+
+    def _expire(self, key: str, now: float) -> List[Stamped]:
+        """Forget ``key``'s expired ranges, dropping it once none are left; returns the rest."""
+        entry = self.index[key]
+        live = self._ranges(entry, now)
+        if not live and (entry["ranges"] or self._stale(entry.get("written_at", 0), now)):
+            self._drop(key)
+        elif len(live) < len(entry["ranges"]):
+            entry["ranges"] = [[str(lo.date()), str(hi.date()), at] for lo, hi, at in live]
+        return live
+
+    def coverage(self, ticker: str) -> List[Range]:
+        """Return the merged, unexpired date ranges already held for ``ticker``."""
+        with self._lock:
+            key = ticker.upper()
+            entry = self.index.get(key)
+            if entry is None:
+                return []
+            n = len(entry["ranges"])
+            live = self._expire(key, time.time())
+            if len(live) < n:
+                self._flush()
+            return [(lo, hi) for lo, hi, _ in live]
+
+    def missing(self, ticker: str, start: pd.Timestamp, end: pd.Timestamp) -> List[Range]:
+        """Return the sub-ranges of ``start``..``end`` that must be fetched."""
+        return _missing_ranges(self.coverage(ticker), start, end, for_symbol(ticker))
+
+    # --- data ---------------------------------------------------------------
+
+    def load(self, ticker: str, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+        """Return cached bars for ``ticker`` within ``start``..``end``."""
+        with self._lock:
+            key = ticker.upper()
+            if key not in self.index:
+                return pd.DataFrame()
+            try:
+                df = pd.read_pickle(self._path(key))
+            except Exception:  # missing or corrupt entry
+                self._drop(key)
+                self._flush()
+                return pd.DataFrame()
+            self.index[key]["accessed_at"] = time.time()
+            df = df[(df["Date"] >= start) & (df["Date"] <= end)]
+            return df.reset_index(drop=True)
+
+    def store(
+        self,
+        ticker: str,
+        df: pd.DataFrame,
+        start: pd.Timestamp | None = None,
+        end: pd.Timestamp | None = None,
+    ) -> None:
+        """Merge ``df`` into the cache and mark ``start``..``end`` as covered.
+
+        Rows already cached for the same ``Date`` are replaced by ``df``. When
+        no (or an empty) range is given the rows are kept but no coverage is
+        recorded, so the window is fetched again next time.
+        """
+        with self._lock:
+            key = ticker.upper()
+            path = self._path(key)
+            entry = self.index.get(key)
+            if entry is not None:
+                try:
+                    old = pd.read_pickle(path)
+                except Exception:
+                    old, entry = pd.DataFrame(), None
+                if not old.empty:
+                    df = pd.concat([old, df], ignore_index=True)
+            df = df.drop_duplicates(subset=["Date"], keep="last").sort_values("Date").reset_index(drop=True)
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            os.close(fd)
+            df.to_pickle(tmp_path)
+            os.replace(tmp_path, path)
+
+            now = time.time()
+            ranges = self._ranges(entry, now) if entry is not None else []
+            if start is not None and end is not None and start <= end:
+                ranges.append((start, end, now))
+            self.index[key] = {
+                "ranges": [[str(lo.date()), str(hi.date()), at] for lo, hi, at in _merge_stamped(ranges)],
+                "written_at": now,
+                "accessed_at": now,
+                "bytes": os.path.getsize(path),
+            }
+
+    def evict(self) -> None:
+        """Apply TTL and size limits, then persist the index."""
+        with self._lock:
+            now = time.time()
+            for key in list(self.index):
+                self._expire(key, now)
+            if self.max_bytes is not None:
+                total = sum(e.get("bytes", 0) for e in self.index.values())
+                by_age = sorted(self.index, key=lambda k: self.index[k].get("accessed_at", 0))
+                for key in by_age:
+                    if total <= self.max_bytes:
+                        break
+                    total -= self.index[key].get("bytes", 0)
+                    log.debug("%s: evicted from bar cache", key)
+                    self._drop(key)
+            self._flush()
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self.index):
+                self._drop(key)
+            self._flush()
+
+
+class NegativeCache:
+    """Persistent record of symbols that returned no data from any provider.
+
+    Stored as ``<cache_dir>/negative.json`` mapping symbol to the time it was
+    last found empty. A symbol counts as dead until ``expiry`` has passed,
+    after which it is fetched normally again. Only requests whose window
+    ends within ``recent`` of today consult or update the record, since an
+    empty historical window may simply predate a listing. Methods are
+    thread-safe.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = DEFAULT_CACHE_DIR,
+        *,
+        expiry: pd.Timedelta | str = "7D",
+        recent: pd.Timedelta | str = "7D",
+    ) -> None:
+        self.path = os.path.join(cache_dir, "negative.json")
+        self.expiry = pd.Timedelta(expiry)
+        self.recent = pd.Timedelta(recent)
+        self._entries: Dict[str, float] | None = None
+        self._dirty = False
+        self._lock = threading.RLock()
+
+    @property
+    def entries(self) -> Dict[str, float]:
+        if self._entries is None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as fh:
+                    self._entries = json.load(fh)
+            except (FileNotFoundError, json.JSONDecodeError):
+                self._entries = {}
+        return self._entries
+
+    def is_recent(self, end: pd.Timestamp) -> bool:
+        return end >= pd.Timestamp.today().normalize() - self.recent
+
+    def is_dead(self, ticker: str) -> bool:
+        with self._lock:
+            seen = self.entries.get(ticker.upper())
+        return seen is not None and time.time() - seen < self.expiry.total_seconds()
+
+    def add(self, ticker: str) -> None:
+        log.info("%s: no data from any provider; skipping for %s", ticker, self.expiry)
+        with self._lock:
+            self.entries[ticker.upper()] = time.time()
+            self._dirty = True
+
+    def discard(self, ticker: str) -> None:
+        with self._lock:
+            if self.entries.pop(ticker.upper(), None) is not None:
+                self._dirty = True
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            now = time.time()
+            live = {t: seen for t, seen in self.entries.items() if now - seen < self.expiry.total_seconds()}
+            _atomic_write_json(self.path, live)
+            self._entries = live
+            self._dirty = False
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries = {}
+            self._dirty = False
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
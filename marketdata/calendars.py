@@ -0,0 +1,273 @@
+from __future__ import annotations
+
+import datetime as dt
+from functools import cached_property
+from typing import Callable, Dict, Iterable, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+# Holiday tables cover these years; outside them only weekends are closed.
+FIRST_YEAR, LAST_YEAR = 1980, 2060
+# How long after the close a session's bar is taken to be final upstream.
+SETTLE_DELAY = pd.Timedelta(minutes=30)
+
+HolidayRule = Callable[[int], Iterable[dt.date]]
+
+
+def easter(year: int) -> dt.date:
+    """Return Western (Gregorian) Easter Sunday of ``year``."""
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7  # noqa: E741 - standard name in the algorithm
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return dt.date(year, month, day + 1)
+
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> dt.date:
+    """Return the ``n``-th ``weekday`` (Mon=0) of a month; ``n=-1`` is the last."""
+    if n > 0:
+        first = dt.date(year, month, 1)
+        return first + dt.timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = dt.date(year + month // 12, month % 12 + 1, 1) - dt.timedelta(days=1)
+    return last - dt.timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _nearest_weekday(day: dt.date) -> dt.date:
+    """US observance: Saturday holidays move to Friday, Sunday ones to Monday."""
+    return day + dt.timedelta(days={5: -1, 6: 1}.get(day.weekday(), 0))
+
+
+def _next_monday(day: dt.date) -> dt.date:
+    return day + dt.timedelta(days={5: 2, 6: 1}.get(day.weekday(), 0))
+
+
+def _nyse_holidays(year: int) -> List[dt.date]:
+    days = []
+    new_year = dt.date(year, 1, 1)
+    if new_year.weekday() != 5:  # a Saturday New Year is not made up on Friday Dec 31
+        days.append(_next_monday(new_year))
+    if year >= 1998:
+        days.append(_nth_weekday(year, 1, 0, 3))  # Martin Luther King Jr. Day
+    days += [
+        _nth_weekday(year, 2, 0, 3),  # Washington's Birthday
+        easter(year) - dt.timedelta(days=2),  # Good Friday
+        _nth_weekday(year, 5, 0, -1),  # Memorial Day
+        _nearest_weekday(dt.date(year, 7, 4)),
+        _nth_weekday(year, 9, 0, 1),  # Labor Day
+        _nth_weekday(year, 11, 3, 4),  # Thanksgiving
+        _nearest_weekday(dt.date(year, 12, 25)),
+    ]
+    if year >= 2022:
+        days.append(_nearest_weekday(dt.date(year, 6, 19)))  # Juneteenth
+    return days
+
+
+_NYSE_CLOSURES = [
+    "1985-09-27", "1994-04-27", "2001-09-11", "2001-09-12", "2001-09-13", "2001-09-14",
+    "2004-06-11", "2007-01-02", "2012-10-29", "2012-10-30", "2018-12-05", "2025-01-09",
+]  # fmt: skip
+
+
+def _lse_holidays(year: int) -> List[dt.date]:
+    days = [
+        _next_monday(dt.date(year, 1, 1)),
+        easter(year) - dt.timedelta(days=2),
+        easter(year) + dt.timedelta(days=1),
+        {1995: dt.date(1995, 5, 8), 2020: dt.date(2020, 5, 8)}.get(year, _nth_weekday(year, 5, 0, 1)),
+        {2002: dt.date(2002, 6, 4), 2012: dt.date(2012, 6, 4), 2022: dt.date(2022, 6, 2)}.get(
+            year, _nth_weekday(year, 5, 0, -1)
+        ),
+        _nth_weekday(year, 8, 0, -1),
+    ]
+    # Weekend Christmas and Boxing Days move to the following weekdays.
+    christmas = dt.date(year, 12, 25)
+    shift, boxing_shift = {4: (0, 2), 5: (2, 2), 6: (2, 0)}.get(christmas.weekday(), (0, 0))
+    boxing = dt.date(year, 12, 26) + dt.timedelta(days=boxing_shift)
+    return days + [christmas + dt.timedelta(days=shift), boxing]
+
+
+_LSE_CLOSURES = ["1999-12-31", "2002-06-03", "2011-04-29", "2012-06-05", "2022-06-03", "2022-09-19", "2023-05-08"]
+
+
+def _euronext_holidays(year: int) -> List[dt.date]:
+    return [
+        dt.date(year, 1, 1),
+        easter(year) - dt.timedelta(days=2),
+        easter(year) + dt.timedelta(days=1),
+        dt.date(year, 5, 1),
+        dt.date(year, 12, 25),
+        dt.date(year, 12, 26),
+    ]
+
+
+def _borsa_italiana_holidays(year: int) -> List[dt.date]:
+    return _euronext_holidays(year) + [dt.date(year, 8, 15), dt.date(year, 12, 24), dt.date(year, 12, 31)]
+
+
+def _xetra_holidays(year: int) -> List[dt.date]:
+    return _euronext_holidays(year) + [dt.date(year, 12, 24), dt.date(year, 12, 31)]
+
+
+def _as_days(dates) -> tuple[np.ndarray, bool]:
+    """Coerce a date or array of dates to ``datetime64[D]`` (wall-clock dates)."""
+    scalar = np.ndim(dates) == 0
+    idx = pd.DatetimeIndex(pd.to_datetime(np.atleast_1d(dates) if scalar else dates))
+    if idx.tz is not None:
+        idx = idx.tz_localize(None)
+    return idx.values.astype("datetime64[D]"), scalar
+
+
+def _as_timestamps(days: np.ndarray, scalar: bool) -> pd.Timestamp | pd.DatetimeIndex:
+    idx = pd.DatetimeIndex(days.astype("datetime64[ns]"))
+    return idx[0] if scalar else idx
+
+
+class ExchangeCalendar:
+    """Trading sessions of one exchange.
+
+    Sessions are the weekdays outside the exchange's holidays. The holiday
+    table is built from ``rule`` (a function of the year) plus one-off
+    ``closures`` for :data:`FIRST_YEAR`..:data:`LAST_YEAR` on first use;
+    all date arithmetic then goes through numpy's business-day functions,
+    so methods take a single date or whole arrays of them alike.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        tz: str,
+        close: dt.time,
+        rule: HolidayRule | None = None,
+        *,
+        closures: Sequence[str] = (),
+        weekmask: str = "1111100",
+    ) -> None:
+        self.name = name
+        self.tz = tz
+        self.close = close
+        self.rule = rule
+        self.closures = list(closures)
+        self.weekmask = weekmask
+
+    def __repr__(self) -> str:
+        return f"ExchangeCalendar({self.name!r})"
+
+    @cached_property
+    def holidays(self) -> np.ndarray:
+        """Sorted ``datetime64[D]`` array of weekday closures."""
+        days = set(self.closures)
+        if self.rule is not None:
+            for year in range(FIRST_YEAR, LAST_YEAR + 1):
+                days.update(str(d) for d in self.rule(year))
+        return np.array(sorted(days), dtype="datetime64[D]")
+
+    @cached_property
+    def _busdaycal(self) -> np.busdaycalendar:
+        return np.busdaycalendar(weekmask=self.weekmask, holidays=self.holidays)
+
+    def is_session(self, dates) -> bool | np.ndarray:
+        days, scalar = _as_days(dates)
+        out = np.is_busday(days, busdaycal=self._busdaycal)
+        return bool(out[0]) if scalar else out
+
+    def rollback(self, dates) -> pd.Timestamp | pd.DatetimeIndex:
+        """Return each date if it is a session, else the session before it."""
+        days, scalar = _as_days(dates)
+        return _as_timestamps(np.busday_offset(days, 0, roll="backward", busdaycal=self._busdaycal), scalar)
+
+    def rollforward(self, dates) -> pd.Timestamp | pd.DatetimeIndex:
+        """Return each date if it is a session, else the session after it."""
+        days, scalar = _as_days(dates)
+        return _as_timestamps(np.busday_offset(days, 0, roll="forward", busdaycal=self._busdaycal), scalar)
+
+    def add_sessions(self, dates, n: int) -> pd.Timestamp | pd.DatetimeIndex:
+        """Step ``n`` sessions from each date (``n < 0`` steps back).
+
+        A date that is not a session lies between two: one session after
+        a Saturday is the Monday, one session before it the Friday.
+        """
+        days, scalar = _as_days(dates)
+        roll = "backward" if n >= 0 else "forward"
+        return _as_timestamps(np.busday_offset(days, n, roll=roll, busdaycal=self._busdaycal), scalar)
+
+    def count_sessions(self, start, end) -> int | np.ndarray:
+        """Count sessions in ``start``..``end`` inclusive (zero if ``end < start``)."""
+        lo, scalar = _as_days(start)
+        hi, _ = _as_days(end)
+        out = np.maximum(np.busday_count(lo, hi + np.timedelta64(1, "D"), busdaycal=self._busdaycal), 0)
+        return int(out[0]) if scalar and np.ndim(end) == 0 else out
+
+    def sessions(self, start, end) -> pd.DatetimeIndex:
+        """Return the sessions in ``start``..``end`` inclusive."""
+        lo, _ = _as_days(start)
+        hi, _ = _as_days(end)
+        days = np.arange(lo[0], hi[0] + np.timedelta64(1, "D"), dtype="datetime64[D]")
+        return _as_timestamps(days[np.is_busday(days, busdaycal=self._busdaycal)], False)
+
+    def last_completed_session(self, now: pd.Timestamp | None = None) -> pd.Timestamp:
+        """Return the newest session whose bar is final at ``now``.
+
+        That is today once the exchange has closed (plus
+        :data:`SETTLE_DELAY`), otherwise the previous session. ``now``
+        defaults to the current time; a naive ``now`` is read as exchange
+        local time.
+        """
+        now = pd.Timestamp.now(tz=self.tz) if now is None else pd.Timestamp(now)
+        if now.tzinfo is not None:
+            now = now.tz_convert(self.tz).tz_localize(None)
+        today = now.normalize()
+        closed = now >= today + pd.Timedelta(hours=self.close.hour, minutes=self.close.minute) + SETTLE_DELAY
+        if closed and self.is_session(today):
+            return today
+        return self.rollback(today - pd.Timedelta(days=1))
+
+
+US = ExchangeCalendar("XNYS", "America/New_York", dt.time(16, 0), _nyse_holidays, closures=_NYSE_CLOSURES)
+UK = ExchangeCalendar("XLON", "Europe/London", dt.time(16, 30), _lse_holidays, closures=_LSE_CLOSURES)
+FR = ExchangeCalendar("XPAR", "Europe/Paris", dt.time(17, 30), _euronext_holidays)
+IT = ExchangeCalendar("XMIL", "Europe/Rome", dt.time(17, 30), _borsa_italiana_holidays)
+DE = ExchangeCalendar("XETR", "Europe/Berlin", dt.time(17, 30), _xetra_holidays)
+# Markets without a table: every weekday is a session, final at midnight UTC.
+WEEKDAYS = ExchangeCalendar("WEEKDAYS", "UTC", dt.time(23, 59))
+
+# Yahoo symbol suffix -> calendar; the suffixes :func:`marketdata.providers._stooq_symbol` maps, plus Xetra.
+SUFFIXES: Dict[str, ExchangeCalendar] = {"L": UK, "PA": FR, "MI": IT, "DE": DE}
+
+
+def for_symbol(symbol: str) -> ExchangeCalendar:
+    """Return the calendar for a Yahoo-style symbol.
+
+    As in :func:`marketdata.providers._stooq_symbol`, a symbol without a
+    suffix is a US listing. Unknown suffixes and currency or futures
+    symbols (``EURUSD=X``, ``ES=F``) get :data:`WEEKDAYS`.
+    """
+    parts = symbol.split(".")
+    if len(parts) == 2:
+        return SUFFIXES.get(parts[1].upper(), WEEKDAYS)
+    return WEEKDAYS if "=" in symbol else US
+
+
+def session_ends(
+    symbols: Iterable[str], end: str | pd.Timestamp, now: pd.Timestamp | None = None
+) -> Dict[str, pd.Timestamp]:
+    """Return ``{symbol: last session with a final bar on or before end}``.
+
+    Bars dated after a symbol's entry either don't exist (weekend, holiday)
+    or are still forming, so fetching past it can't add final data. Each
+    calendar is evaluated once however many symbols share it.
+    """
+    end_dt = pd.Timestamp(end)
+    by_calendar: Dict[ExchangeCalendar, pd.Timestamp] = {}
+    out: Dict[str, pd.Timestamp] = {}
+    for s in symbols:
+        cal = for_symbol(s)
+        if cal not in by_calendar:
+            by_calendar[cal] = min(cal.rollback(end_dt), cal.last_completed_session(now))
+        out[s] = by_calendar[cal]
+    return out
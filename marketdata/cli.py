@@ -0,0 +1,493 @@
+"""Command-line entry point for ``prices``.
+
+Only the standard library is imported at module load; pandas, yfinance and
+the fetch machinery in :mod:`marketdata.prices` are imported once arguments
+have been parsed, so ``prices --help`` and usage errors return immediately.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import sys
+from typing import List
+
+log = logging.getLogger(__name__)
+
+
+def _add_ticker_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument(
+        "--tickers",
+        nargs="+",
+        help="Symbols (Yahoo format). Separate with spaces or commas.",
+    )
+    p.add_argument("--config", help="JSON/YAML watchlist file")
+    p.add_argument("--group", default="watchlist", help="Group name in watchlist config")
+
+
+def _load_config(p: argparse.ArgumentParser, path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as fh:
+        if path.lower().endswith((".yaml", ".yml")):
+            try:
+                import yaml  # type: ignore
+            except ImportError:  # pragma: no cover - optional dep
+                p.error("PyYAML required for YAML configs")
+            return yaml.safe_load(fh)
+        return json.load(fh)
+
+
+def _read_tickers(p: argparse.ArgumentParser, args: argparse.Namespace) -> List[str]:
+    """Collect symbols from ``--tickers`` and ``--config``; exits if there are none."""
+    tickers: List[str] = []
+    if args.tickers:
+        for group in args.tickers:
+            tickers.extend(
+                [t.strip().upper() for t in group.split(",") if t.strip()]
+            )
+    if args.config:
+        cfg = _load_config(p, args.config)
+        groups = cfg.get("groups", {})
+        if args.group and args.group in groups:
+            tickers.extend(groups[args.group])
+        else:
+            tickers.extend(cfg.get("tickers", []))
+    tickers = sorted({t.strip().upper() for t in tickers if t})
+    if not tickers:
+        p.error("No tickers provided. Use --tickers or --config.")
+    return tickers
+
+
+def serve(argv: list[str]) -> int:
+    """``prices serve``: keep bars in memory and answer clients over HTTP."""
+    p = argparse.ArgumentParser(
+        prog="prices serve",
+        description="Serve bars from a shared in-memory cache over HTTP or a Unix socket.",
+    )
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--socket", default=None, help="Listen on this Unix socket instead of TCP")
+    p.add_argument(
+        "--max-memory",
+        type=int,
+        default=512,
+        metavar="MB",
+        help="Evict least recently requested tickers beyond this size (default: %(default)s)",
+    )
+    p.add_argument("--batch-size", type=int, default=None)
+    p.add_argument("--workers", type=int, default=1)
+    p.add_argument("--hedge-after", type=float, default=None, metavar="SECONDS")
+    p.add_argument("--cache-dir", default=None, help="On-disk bar cache shared with the prices CLI")
+    p.add_argument("--no-cache", action="store_true", help="Keep bars in memory only")
+    p.add_argument("--log-level", default="INFO")
+    args = p.parse_args(argv)
+    logging.basicConfig(level=getattr(logging, args.log_level.upper(), logging.INFO))
+
+    from . import prices
+    from .cache import DEFAULT_CACHE_DIR, BarCache, NegativeCache
+    from .server import BarServer, MemoryCache, make_server
+
+    cache_dir = args.cache_dir or DEFAULT_CACHE_DIR
+    bar_server = BarServer(
+        memory=MemoryCache(args.max_memory << 20),
+        batch_size=args.batch_size,
+        workers=args.workers,
+        hedge_after=args.hedge_after,
+        providers=None if args.no_cache else (prices.YAHOO, prices._cached_stooq(cache_dir)),
+        cache=None if args.no_cache else BarCache(cache_dir),
+        negative_cache=None if args.no_cache else NegativeCache(cache_dir),
+    )
+    server = make_server(bar_server, host=args.host, port=args.port, socket_path=args.socket)
+    log.info("serving bars on %s", args.socket or f"http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+def backfill(argv: list[str]) -> int:
+    """``prices backfill``: resumable chunked history download."""
+    p = argparse.ArgumentParser(
+        prog="prices backfill",
+        description="Backfill history in chunks tracked by an on-disk manifest; "
+        "rerun the same command to resume after a failure.",
+    )
+    _add_ticker_args(p)
+    p.add_argument("--start", required=True)
+    p.add_argument("--end", required=True)
+    p.add_argument("--out-dir", "--out", dest="out_dir", required=True)
+    p.add_argument("--format", choices=["csv", "parquet", "mmap"], default="csv")
+    p.add_argument("--partitioned", action="store_true", help="With --format parquet, write a partitioned dataset")
+    p.add_argument("--chunk-size", type=int, default=100, help="Tickers per chunk (default: %(default)s)")
+    p.add_argument("--years-per-chunk", type=int, default=5, help="Years per chunk (default: %(default)s)")
+    p.add_argument("--parallel", type=int, default=4, help="Ticker groups run at once (default: %(default)s)")
+    p.add_argument("--manifest", default=None, help="Manifest path (default: <out-dir>/.backfill.json)")
+    p.add_argument("--reset", action="store_true", help="Discard the manifest and start over")
+    p.add_argument(
+        "--on-error",
+        choices=["raise", "warn", "ignore"],
+        default="raise",
+        help="raise (default) fails the whole chunk so a rerun retries it",
+    )
+    p.add_argument("--batch-size", type=int, default=None)
+    p.add_argument("--workers", type=int, default=1, help="Request groups fetched concurrently within a chunk")
+    p.add_argument("--cache-dir", default=None)
+    p.add_argument("--no-cache", action="store_true")
+    p.add_argument("--log-level", default="INFO")
+    args = p.parse_args(argv)
+    logging.basicConfig(level=getattr(logging, args.log_level.upper(), logging.INFO))
+    tickers = _read_tickers(p, args)
+
+    from . import prices
+    from .backfill import run_backfill
+    from .cache import DEFAULT_CACHE_DIR, NegativeCache
+
+    cache_dir = args.cache_dir or DEFAULT_CACHE_DIR
+    try:
+        manifest = run_backfill(
+            tickers,
+            args.start,
+            args.end,
+            args.out_dir,
+            format=args.format,
+            partitioned=args.partitioned,
+            manifest_path=args.manifest,
+            chunk_size=args.chunk_size,
+            years_per_chunk=args.years_per_chunk,
+            parallel=args.parallel,
+            reset=args.reset,
+            on_error=args.on_error,
+            batch_size=args.batch_size,
+            workers=args.workers,
+            providers=None if args.no_cache else (prices.YAHOO, prices._cached_stooq(cache_dir)),
+            negative_cache=None if args.no_cache else NegativeCache(cache_dir),
+        )
+    except ValueError as e:
+        p.error(str(e))
+    failed = [c["id"] for c in manifest["chunks"] if c["status"] != "done"]
+    print(f"Backfill: {len(manifest['chunks']) - len(failed)}/{len(manifest['chunks'])} chunks done")
+    if failed:
+        print("Failed chunks (rerun to retry):", ", ".join(failed))
+        return 1
+    return 0
+
+
+def refresh(argv: list[str]) -> int:
+    """``prices refresh``: apply a watchlist's changes to stored bars."""
+    p = argparse.ArgumentParser(
+        prog="prices refresh",
+        description="Backfill names added to the watchlist, fetch only the latest bars for the rest "
+        "and archive removed names (changes as recorded by watchlist-update).",
+    )
+    _add_ticker_args(p)
+    p.add_argument("--out-dir", "--out", dest="out_dir", required=True)
+    p.add_argument("--history-start", default="2000-01-01", help="Start of the history fetched for added names")
+    p.add_argument("--end", default=None, help="Last date to fetch (default: today)")
+    p.add_argument(
+        "--lookback",
+        type=int,
+        default=5,
+        help="Sessions before the newest stored bar refetched for existing names (default: %(default)s)",
+    )
+    p.add_argument("--format", choices=["csv", "parquet", "mmap"], default="csv")
+    p.add_argument("--partitioned", action="store_true", help="With --format parquet, use a partitioned dataset")
+    p.add_argument("--archive-dir", default=None, help="Where removed names go (default: <out-dir>/_archive)")
+    p.add_argument("--on-error", choices=["raise", "warn", "ignore"], default="warn")
+    p.add_argument("--batch-size", type=int, default=None)
+    p.add_argument("--workers", type=int, default=1)
+    p.add_argument("--cache-dir", default=None)
+    p.add_argument("--no-cache", action="store_true")
+    p.add_argument("--log-level", default="INFO")
+    args = p.parse_args(argv)
+    logging.basicConfig(level=getattr(logging, args.log_level.upper(), logging.INFO))
+    tickers = _read_tickers(p, args)
+    cfg = _load_config(p, args.config) if args.config else {}
+    changes = cfg.get("changes") or {}
+
+    from . import prices
+    from .cache import DEFAULT_CACHE_DIR, BarCache, NegativeCache
+    from .refresh import refresh as run_refresh
+
+    cache_dir = args.cache_dir or DEFAULT_CACHE_DIR
+    summary = run_refresh(
+        tickers,
+        args.out_dir,
+        added=changes.get("added", []),
+        removed=changes.get("removed", []),
+        version=cfg.get("last_updated"),
+        history_start=args.history_start,
+        end=args.end,
+        lookback=args.lookback,
+        format=args.format,
+        partitioned=args.partitioned,
+        archive_dir=args.archive_dir,
+        on_error=args.on_error,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        providers=None if args.no_cache else (prices.YAHOO, prices._cached_stooq(cache_dir)),
+        cache=None if args.no_cache else BarCache(cache_dir),
+        negative_cache=None if args.no_cache else NegativeCache(cache_dir),
+    )
+    print(
+        f"Refresh: {len(summary['history'])} full histories, {len(summary['updated'])} updated, "
+        f"{len(summary['current'])} current, {len(summary['archived'])} archived"
+    )
+    if summary["failed"]:
+        print("No data for:", ", ".join(summary["failed"]))
+        return 1
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["serve"]:
+        return serve(argv[1:])
+    if argv[:1] == ["backfill"]:
+        return backfill(argv[1:])
+    if argv[:1] == ["refresh"]:
+        return refresh(argv[1:])
+
+    p = argparse.ArgumentParser(
+        prog="prices",
+        description="Fetch OHLCV via Yahoo and save optional CSV/Parquet. "
+        "Run `prices serve --help`, `prices backfill --help` or `prices refresh --help` for the other modes.",
+    )
+    _add_ticker_args(p)
+    p.add_argument("--start", required=True)
+    p.add_argument("--end", required=True)
+    p.add_argument("--out-dir", "--out", dest="out_dir", default="")
+    p.add_argument(
+        "--format",
+        choices=["csv", "parquet", "mmap"],
+        default="csv",
+        help="mmap writes a memory-mappable columnar store (see marketdata.mmap_store)",
+    )
+    p.add_argument(
+        "--interval",
+        default="1d",
+        help="Bar interval: 1d (default) or intraday 1m, 2m, 5m, 15m, 30m, 60m, 90m, 1h. Intraday bars "
+        "are appended to a partitioned Parquet dataset under <out-dir>/_intraday/<interval>",
+    )
+    p.add_argument("--on-error", choices=["raise", "warn", "ignore"], default="warn")
+    p.add_argument(
+        "--batch-size",
+        type=int,
+        default=None,
+        help="Request up to N symbols per Yahoo download (default: one at a time)",
+    )
+    p.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Fetch up to N request groups concurrently (default: 1)",
+    )
+    p.add_argument(
+        "--hedge-after",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="Also ask Stooq if Yahoo hasn't answered within SECONDS; first valid result wins",
+    )
+    p.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=None,
+        help="With --out-dir, fetched request groups allowed to wait for the writer (default: 2x workers)",
+    )
+    p.add_argument(
+        "--cache-dir",
+        default=None,
+        help="Local bar cache; only uncached date ranges are downloaded "
+        "(default: $MARKETDATA_CACHE_DIR or ~/.cache/marketdata)",
+    )
+    p.add_argument("--no-cache", action="store_true", help="Always download the full window")
+    p.add_argument(
+        "--no-negative-cache",
+        action="store_true",
+        help="Fetch symbols even if they recently returned no data from any provider",
+    )
+    p.add_argument(
+        "--clear-negative-cache",
+        action="store_true",
+        help="Forget symbols previously recorded as returning no data",
+    )
+    p.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Append to existing outputs; tickers already stored through the last completed session are not fetched",
+    )
+    p.add_argument(
+        "--partitioned",
+        action="store_true",
+        help="With --format parquet, append to a Ticker=/year= partitioned dataset",
+    )
+    p.add_argument(
+        "--write-workers",
+        type=int,
+        default=1,
+        metavar="N",
+        help="With --out-dir csv/parquet, write up to N files concurrently (default: 1)",
+    )
+    p.add_argument(
+        "--write-processes",
+        action="store_true",
+        help="Use worker processes rather than threads for --write-workers (CSV formatting is CPU-bound)",
+    )
+    p.add_argument(
+        "--metrics-out",
+        default=None,
+        metavar="PATH",
+        help="Write run metrics to PATH: Prometheus textfile if it ends in .prom, JSON otherwise",
+    )
+    p.add_argument("--log-level", default="INFO")
+    p.add_argument("--table", action="store_true", help="Print full tables instead of a summary")
+
+    args = p.parse_args(argv)
+    from .metrics import RunMetrics
+
+    metrics = RunMetrics()
+    logging.basicConfig(level=getattr(logging, args.log_level.upper(), logging.INFO))
+
+    if args.out_dir and args.out_dir.endswith(".csv"):
+        p.error("--out-dir expects a directory, not a file name")
+
+    tickers = _read_tickers(p, args)
+
+    # Heavy imports (pandas, yfinance) only once there is work to do.
+    from . import prices
+    from .cache import DEFAULT_CACHE_DIR, BarCache, NegativeCache
+
+    args.cache_dir = args.cache_dir or DEFAULT_CACHE_DIR
+    if args.clear_negative_cache:
+        NegativeCache(args.cache_dir).clear()
+
+    options = dict(
+        start=args.start,
+        end=args.end,
+        on_error=args.on_error,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        hedge_after=args.hedge_after,
+        providers=None if args.no_cache else (prices.YAHOO, prices._cached_stooq(args.cache_dir)),
+        cache=None if args.no_cache else BarCache(args.cache_dir),
+        negative_cache=None if args.no_negative_cache else NegativeCache(args.cache_dir),
+        metrics=metrics,
+    )
+
+    successes = 0
+    if args.interval != "1d":
+        from .intraday import bar_length, update_intraday
+
+        try:
+            bar_length(args.interval)
+        except ValueError as e:
+            p.error(str(e))
+        # The caches only hold daily bars.
+        for key in ("cache", "negative_cache", "hedge_after"):
+            options.pop(key)
+        options["interval"] = args.interval
+
+    if args.out_dir and args.interval != "1d":
+        paths = update_intraday(
+            tickers,
+            args.start,
+            args.end,
+            args.out_dir,
+            interval=args.interval,
+            on_error=args.on_error,
+            batch_size=args.batch_size,
+            workers=args.workers,
+            max_in_flight=args.max_in_flight,
+            providers=options["providers"],
+            metrics=metrics,
+        )
+        print("Saved:", paths)
+        successes = len(paths)
+    elif args.out_dir:
+        current: List[str] = []
+        if args.incremental:
+            current = prices.up_to_date(
+                tickers, args.end, args.out_dir, format=args.format, partitioned=args.partitioned
+            )
+            for t in current:
+                log.info("%s: %s already holds bars through the last completed session", t, args.out_dir)
+            tickers = [t for t in tickers if t not in set(current)]
+
+        # Writer stage: persist tickers as they arrive and drop them, so
+        # memory stays flat and a failure keeps everything already written.
+        # With --write-workers, up to that many arrived frames are written at once.
+        paths: List[str] = []
+        pending: dict = {}
+        mmap_writer = None
+        pool = None
+        if args.format == "mmap":
+            from .mmap_store import MmapWriter
+
+            mmap_writer = MmapWriter(args.out_dir, incremental=args.incremental, metrics=metrics)
+        elif args.write_workers > 1:
+            pool = prices._writer_pool(args.write_workers, args.write_processes)
+
+        def flush() -> None:
+            nonlocal paths
+            if args.format == "csv":
+                paths += prices.save_prices_csv(
+                    pending, out_dir=args.out_dir, incremental=args.incremental, metrics=metrics, workers=pool or 1
+                )
+            else:
+                paths += prices.save_prices_parquet(
+                    pending,
+                    out_dir=args.out_dir,
+                    partitioned=args.partitioned,
+                    incremental=args.incremental,
+                    metrics=metrics,
+                    workers=pool or 1,
+                )
+            pending.clear()
+
+        try:
+            for t, df in prices.iter_prices(tickers, max_in_flight=args.max_in_flight, **options):
+                if mmap_writer is not None:
+                    paths += mmap_writer.write({t: df})
+                    continue
+                pending[t] = df
+                if len(pending) >= args.write_workers:
+                    flush()
+        finally:
+            if pending:
+                flush()
+            if pool is not None:
+                pool.shutdown()
+            if mmap_writer is not None:
+                mmap_writer.close()
+        print("Saved:", paths)
+        successes = len(paths) + len(current)
+    else:
+        bars = prices.get_prices(tickers, **options)
+        for t, df in bars.items():
+            if args.table:
+                if df.empty:
+                    print(f"{t}: no data")
+                else:
+                    print(f"{t}:")
+                    print(df.to_string(index=False))
+            else:
+                src = df["Source"].iloc[-1] if not df.empty else "NA"
+                print(f"{t}: rows={len(df)} source={src}")
+        successes = sum(1 for df in bars.values() if not df.empty)
+
+    if args.metrics_out:
+        metrics.finish()
+        metrics.write(args.metrics_out)
+        log.info("wrote run metrics to %s", args.metrics_out)
+
+    return 0 if successes > 0 else 2
+
+
+def cli() -> None:  # console_scripts entrypoint
+    sys.exit(main())
+
+
+if __name__ == "__main__":  # pragma: no cover
+    sys.exit(main())
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import http.client
+import io
+import json
+import socket
+from typing import Dict, List
+from urllib.parse import urlencode, urlsplit
+
+import pandas as pd
+
+DEFAULT_URL = "http://127.0.0.1:8765"
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str, timeout: float) -> None:
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self) -> None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+def _connect(url: str, timeout: float) -> http.client.HTTPConnection:
+    parts = urlsplit(url)
+    if parts.scheme == "unix":
+        return _UnixHTTPConnection(parts.path, timeout)
+    return http.client.HTTPConnection(parts.hostname or "127.0.0.1", parts.port or 80, timeout=timeout)
+
+
+def _from_json(body: bytes, tickers: List[str]) -> Dict[str, pd.DataFrame]:
+    out: Dict[str, pd.DataFrame] = {}
+    for t, frame in json.loads(body).items():
+        df = pd.DataFrame(frame["data"], columns=frame["columns"])
+        if "Date" in df.columns:
+            df["Date"] = pd.to_datetime(df["Date"]).dt.tz_localize(None)
+        out[t] = df
+    return {t: out.get(t.upper(), pd.DataFrame()) for t in tickers}
+
+
+def _from_arrow(body: bytes, tickers: List[str]) -> Dict[str, pd.DataFrame]:
+    import pyarrow as pa
+
+    stacked = pa.ipc.open_stream(io.BytesIO(body)).read_pandas()
+    by_ticker = dict(tuple(stacked.groupby("Ticker", sort=False))) if not stacked.empty else {}
+    return {
+        t: by_ticker[t.upper()].reset_index(drop=True) if t.upper() in by_ticker else pd.DataFrame()
+        for t in tickers
+    }
+
+
+def get_prices(
+    tickers: List[str],
+    start: str,
+    end: str,
+    *,
+    on_error: str = "warn",
+    url: str = DEFAULT_URL,
+    format: str = "json",
+    timeout: float = 300.0,
+) -> Dict[str, pd.DataFrame]:
+    """Fetch bars from a running ``prices serve`` daemon.
+
+    Mirrors :func:`marketdata.prices.get_prices`: returns frames with the
+    canonical columns keyed by ``tickers`` in order. ``url`` is either
+    ``http://host:port`` or ``unix:///path/to/socket``; ``format`` selects
+    JSON or Arrow IPC (needs pyarrow) on the wire. Raises ``RuntimeError``
+    if the server reports an error.
+    """
+    tickers = list(dict.fromkeys(tickers))
+    query = urlencode(
+        {"tickers": ",".join(tickers), "start": str(start), "end": str(end), "format": format, "on_error": on_error}
+    )
+    conn = _connect(url, timeout)
+    try:
+        conn.request("GET", f"/prices?{query}")
+        resp = conn.getresponse()
+        body = resp.read()
+    finally:
+        conn.close()
+    if resp.status != 200:
+        try:
+            msg = json.loads(body)["error"]
+        except (ValueError, KeyError):
+            msg = body.decode(errors="replace")
+        raise RuntimeError(f"prices server returned {resp.status}: {msg}")
+    return _from_arrow(body, tickers) if format == "arrow" else _from_json(body, tickers)
@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import logging
+from typing import Dict, Iterator, List
+
+import pandas as pd
+
+from .metrics import RunMetrics
+from .prices import STOOQ, YAHOO, _fetch_group, _run_jobs
+from .providers import Provider
+from .store import _require_pyarrow, _stored_max_date, _utc, dataset_root, write_dataset
+
+log = logging.getLogger(__name__)
+
+# Bar length of each intraday interval (Yahoo's names); daily bars are "1d".
+INTERVALS = {
+    "1m": "1min",
+    "2m": "2min",
+    "5m": "5min",
+    "15m": "15min",
+    "30m": "30min",
+    "60m": "60min",
+    "90m": "90min",
+    "1h": "60min",
+}
+
+
+def bar_length(interval: str) -> pd.Timedelta:
+    """Return the length of one ``interval`` bar; raises ``ValueError`` for unknown intervals."""
+    try:
+        return pd.Timedelta(INTERVALS[interval])
+    except KeyError:
+        raise ValueError(f"unknown interval {interval!r}; use 1d or one of {', '.join(INTERVALS)}") from None
+
+
+def time_windows(
+    start: str | pd.Timestamp,
+    end: str | pd.Timestamp,
+    interval: str,
+    provider: Provider,
+    now: pd.Timestamp | None = None,
+) -> List[tuple[pd.Timestamp, pd.Timestamp]]:
+    """Split ``start``..``end`` into the ``[lo, hi)`` windows ``provider`` serves per request.
+
+    Bounds are UTC (naive ones are read as UTC) and a date-only ``end``
+    includes that whole day. The range is clipped to how far back the
+    provider keeps ``interval`` bars and to ``now``; a range entirely
+    outside them gives no windows.
+    """
+    if interval not in provider.intervals:
+        raise ValueError(f"{provider.name} does not serve {interval} bars")
+    span, lookback = (pd.Timedelta(x) for x in provider.intervals[interval])
+    now = pd.Timestamp.now(tz="UTC") if now is None else _utc(now)
+
+    end_ts = pd.Timestamp(end)
+    hi = min(_utc(end_ts + pd.Timedelta(days=1) if end_ts == end_ts.normalize() else end_ts), now)
+    lo = _utc(start)
+    if lo < now - lookback:
+        lo = now - lookback
+        log.info("%s only keeps %s bars for %s; starting at %s", provider.name, interval, lookback, lo)
+
+    windows: List[tuple[pd.Timestamp, pd.Timestamp]] = []
+    while lo < hi:
+        windows.append((lo, min(lo + span, hi)))
+        lo = windows[-1][1]
+    return windows
+
+
+def _combine(parts: List[pd.DataFrame], lo: pd.Timestamp, hi: pd.Timestamp) -> pd.DataFrame:
+    """Stitch one ticker's window frames into ``[lo, hi)``, sorted and de-duplicated."""
+    if not parts:
+        return pd.DataFrame()
+    df = pd.concat(parts, ignore_index=True)
+    df = df[(df["Date"] >= lo) & (df["Date"] < hi)]
+    df = df.drop_duplicates(subset=["Date"], keep="last").sort_values("Date", ignore_index=True)
+    df["Ticker"] = df["Ticker"].astype(str).astype("category")
+    df["Source"] = df["Source"].astype(str).astype("category")
+    df.attrs["normalized"] = True
+    return df
+
+
+def iter_intraday(
+    tickers: List[str],
+    start: str | pd.Timestamp,
+    end: str | pd.Timestamp,
+    *,
+    interval: str,
+    on_error: str = "warn",
+    batch_size: int | None = None,
+    workers: int = 1,
+    max_in_flight: int | None = None,
+    providers: tuple[Provider, Provider] | None = None,
+    metrics: RunMetrics | None = None,
+    now: pd.Timestamp | None = None,
+) -> Iterator[tuple[str, pd.DataFrame]]:
+    """Yield ``(ticker, frame)`` pairs of ``interval`` bars as each ticker completes.
+
+    The range is cut into the windows the primary provider allows per
+    request (see :func:`time_windows`) and every request group x window
+    runs as its own job, up to ``workers`` at once. A ticker is yielded
+    once all its windows are in, as one frame with :data:`~marketdata.prices.COLUMNS`
+    whose ``Date`` is the bar's UTC start time; bars still forming at
+    ``now`` are dropped. The fallback provider is only asked if it serves
+    ``interval`` (Stooq doesn't). Other options are as for
+    :func:`~marketdata.prices.get_prices`.
+    """
+    length = bar_length(interval)
+    tickers = list(dict.fromkeys(tickers))
+    primary, fallback = providers or (YAHOO, STOOQ)
+    now = pd.Timestamp.now(tz="UTC") if now is None else _utc(now)
+    windows = time_windows(start, end, interval, primary, now)
+    if not windows:
+        log.debug("%s: no %s bars to fetch in %s..%s", ",".join(tickers), interval, start, end)
+        for t in tickers:
+            yield t, pd.DataFrame()
+        return
+
+    size = batch_size if batch_size and batch_size > 1 else 1
+    lo, hi = windows[0][0], min(windows[-1][1], now - length + pd.Timedelta(1))
+
+    def run(group: List[str], w_lo: pd.Timestamp, w_hi: pd.Timestamp):
+        return _fetch_group(group, w_lo, w_hi, on_error, primary, fallback, None, metrics, interval)[0]
+
+    parts: Dict[str, List[pd.DataFrame]] = {t: [] for t in tickers}
+    remaining = dict.fromkeys(tickers, len(windows))
+    # Groups outermost, so a group's windows finish (and are released) together.
+    jobs = ((tickers[i : i + size], w_lo, w_hi) for i in range(0, len(tickers), size) for w_lo, w_hi in windows)
+    for fetched in _run_jobs(jobs, run, workers, max_in_flight):
+        for t, df in fetched.items():
+            if not df.empty:
+                parts[t].append(df)
+            remaining[t] -= 1
+            if remaining[t] == 0:
+                yield t, _combine(parts.pop(t), lo, hi)
+
+
+def update_intraday(
+    tickers: List[str],
+    start: str | pd.Timestamp,
+    end: str | pd.Timestamp,
+    out_dir: str,
+    *,
+    interval: str,
+    **options,
+) -> List[str]:
+    """Fetch ``interval`` bars for ``tickers`` and append them to the dataset under ``out_dir``.
+
+    Each ticker resumes one bar after its newest stored bar, read from
+    Parquet footers only, so stored data is never reread; new bars are
+    written as fresh part files as each ticker arrives, and a year that
+    collects more than :data:`~marketdata.store.MAX_PARTS` of them is
+    compacted into one (see :func:`~marketdata.store.write_dataset` and
+    :func:`~marketdata.store.dataset_root`). ``options`` go to
+    :func:`iter_intraday`. Returns the part files written.
+    """
+    _require_pyarrow()
+    length = bar_length(interval)
+    root = dataset_root(out_dir, interval)
+    first = _utc(start)
+    starts: Dict[pd.Timestamp, List[str]] = {}
+    for t in dict.fromkeys(tickers):
+        last = _stored_max_date(root, t)
+        begin = first if last is None else max(first, _utc(last) + length)
+        starts.setdefault(begin, []).append(t)
+
+    paths: List[str] = []
+    for begin, group in starts.items():
+        for t, df in iter_intraday(group, begin, end, interval=interval, **options):
+            if not df.empty:
+                written = write_dataset({t: df}, out_dir, interval=interval, metrics=options.get("metrics"))
+                paths += [p for p in written if p.rows]
+    return paths
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+# Upper bounds (seconds) for provider request latency buckets.
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style."""
+
+    def __init__(self, buckets: List[float] = LATENCY_BUCKETS) -> None:
+        self.buckets = list(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "buckets": {str(b): c for b, c in zip(self.buckets, self.counts)},
+        }
+
+
+class RunMetrics:
+    """Counters and timings for one run of the prices pipeline.
+
+    Pass an instance as ``metrics=`` to :func:`marketdata.prices.get_prices`,
+    :func:`~marketdata.prices.iter_prices` and the ``save_prices_*`` writers;
+    it is filled in as the run progresses (thread-safe) and can then be read
+    with :meth:`to_dict` or exported with :meth:`write`.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter()
+        self._t1: float | None = None
+        self.request_latency: Dict[str, Histogram] = {}
+        self.request_errors: Dict[str, int] = {}
+        self.retries: Dict[str, int] = {}
+        self.circuit_open: Dict[str, int] = {}
+        self.fallbacks = 0
+        self.failures = 0
+        self.stage_seconds: Dict[str, float] = {}
+        self.rows_written: Dict[str, int] = {}
+        self.bytes_written: Dict[str, int] = {}
+
+    # --- recording ----------------------------------------------------------
+
+    def observe_request(self, provider: str, seconds: float, ok: bool = True) -> None:
+        with self._lock:
+            self.request_latency.setdefault(provider, Histogram()).observe(seconds)
+            if not ok:
+                self.request_errors[provider] = self.request_errors.get(provider, 0) + 1
+
+    def inc_retry(self, provider: str) -> None:
+        with self._lock:
+            self.retries[provider] = self.retries.get(provider, 0) + 1
+
+    def inc_circuit_open(self, provider: str) -> None:
+        with self._lock:
+            self.circuit_open[provider] = self.circuit_open.get(provider, 0) + 1
+
+    def inc_fallback(self) -> None:
+        with self._lock:
+            self.fallbacks += 1
+
+    def inc_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+
+    def add_stage(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def time(self, stage: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(stage, time.perf_counter() - t0)
+
+    def record_write(self, ticker: str, rows: int, nbytes: int) -> None:
+        with self._lock:
+            self.rows_written[ticker] = self.rows_written.get(ticker, 0) + rows
+            self.bytes_written[ticker] = self.bytes_written.get(ticker, 0) + nbytes
+
+    def finish(self) -> None:
+        """Freeze the wall-clock time (otherwise it keeps running)."""
+        self._t1 = time.perf_counter()
+
+    @property
+    def wall_seconds(self) -> float:
+        return (self._t1 if self._t1 is not None else time.perf_counter()) - self._t0
+
+    # --- export -------------------------------------------------------------
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "wall_seconds": round(self.wall_seconds, 6),
+                "requests": {p: h.to_dict() for p, h in self.request_latency.items()},
+                "request_errors": dict(self.request_errors),
+                "retries": dict(self.retries),
+                "circuit_open": dict(self.circuit_open),
+                "fallbacks": self.fallbacks,
+                "failures": self.failures,
+                "stage_seconds": {k: round(v, 6) for k, v in self.stage_seconds.items()},
+                "rows_written": dict(self.rows_written),
+                "bytes_written": dict(self.bytes_written),
+            }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(self, prefix: str = "marketdata") -> str:
+        """Render in the Prometheus text exposition format (node exporter textfile)."""
+        d = self.to_dict()
+        lines: List[str] = []
+
+        def family(name: str, kind: str, help_text: str) -> str:
+            full = f"{prefix}_{name}"
+            lines.append(f"# HELP {full} {help_text}")
+            lines.append(f"# TYPE {full} {kind}")
+            return full
+
+        name = family("provider_request_seconds", "histogram", "Provider request latency.")
+        for provider, h in d["requests"].items():
+            for bound, count in h["buckets"].items():
+                lines.append(f'{name}_bucket{{provider="{provider}",le="{bound}"}} {count}')
+            lines.append(f'{name}_bucket{{provider="{provider}",le="+Inf"}} {h["count"]}')
+            lines.append(f'{name}_sum{{provider="{provider}"}} {h["sum"]}')
+            lines.append(f'{name}_count{{provider="{provider}"}} {h["count"]}')
+
+        for key, help_text in [
+            ("request_errors", "Failed provider requests."),
+            ("retries", "Provider request retries."),
+            ("circuit_open", "Requests refused by an open circuit breaker."),
+        ]:
+            name = family(f"provider_{key}_total", "counter", help_text)
+            for provider, count in d[key].items():
+                lines.append(f'{name}{{provider="{provider}"}} {count}')
+
+        name = family("fallbacks_total", "counter", "Symbols served by the fallback provider.")
+        lines.append(f"{name} {d['fallbacks']}")
+        name = family("failures_total", "counter", "Symbols for which every provider failed.")
+        lines.append(f"{name} {d['failures']}")
+        name = family("stage_seconds", "gauge", "Time spent per pipeline stage.")
+        for stage, seconds in d["stage_seconds"].items():
+            lines.append(f'{name}{{stage="{stage}"}} {seconds}')
+        name = family("rows_written_total", "counter", "Rows written per ticker.")
+        for ticker, rows in d["rows_written"].items():
+            lines.append(f'{name}{{ticker="{ticker}"}} {rows}')
+        name = family("bytes_written_total", "counter", "Bytes written per ticker.")
+        for ticker, nbytes in d["bytes_written"].items():
+            lines.append(f'{name}{{ticker="{ticker}"}} {nbytes}')
+        name = family("run_wall_seconds", "gauge", "Wall-clock time of the run.")
+        lines.append(f"{name} {d['wall_seconds']}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str) -> None:
+        """Atomically write Prometheus text (``.prom``/``.txt``) or JSON to ``path``."""
+        text = self.to_prometheus() if path.endswith((".prom", ".txt")) else self.to_json() + "\n"
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            fh.write(text)
+        os.replace(tmp_path, path)
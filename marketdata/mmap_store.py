@@ -0,0 +1,328 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+from typing import Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .cache import _atomic_write_json
+from .metrics import RunMetrics
+from .prices import _as_normalized, _clear_refetch, _flag_refetch, _reconcile_adjustments
+
+log = logging.getLogger(__name__)
+
+# Column -> (file stem, on-disk dtype). Dates are int64 nanoseconds since the
+# epoch; Source is a uint8 code into the index's ``sources`` list.
+FIELDS = {
+    "Date": ("date", "<i8"),
+    "Open": ("open", "<f8"),
+    "High": ("high", "<f8"),
+    "Low": ("low", "<f8"),
+    "Close": ("close", "<f8"),
+    "Adj Close": ("adj_close", "<f8"),
+    "Volume": ("volume", "<i8"),
+    "Source": ("source", "u1"),
+}
+ROW_BYTES = sum(np.dtype(dtype).itemsize for _, dtype in FIELDS.values())
+
+# Each run is written with room to grow: a quarter of its length, and at
+# least SPARE_ROWS rows (about three months of daily bars).
+SPARE_ROWS = 64
+
+
+def _empty_index() -> dict:
+    return {"version": 2, "generation": 0, "rows": 0, "sources": [], "tickers": {}}
+
+
+def _capacity(rows: int) -> int:
+    return rows + max(SPARE_ROWS, rows // 4)
+
+
+def _segment(seg: List[int]) -> tuple[int, int, int]:
+    """Return a run's ``(offset, rows, capacity)``; version 1 runs have no spare rows."""
+    return seg[0], seg[1], seg[2] if len(seg) > 2 else seg[1]
+
+
+def _read_index(root: str) -> dict:
+    try:
+        with open(os.path.join(root, "index.json"), "r", encoding="utf-8") as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return _empty_index()
+
+
+def _column_path(root: str, col: str, generation: int) -> str:
+    stem, dtype = FIELDS[col]
+    return os.path.join(root, f"{stem}-{generation}.{np.dtype(dtype).str[1:]}")
+
+
+def _to_columns(df: pd.DataFrame, sources: List[str]) -> Dict[str, np.ndarray]:
+    """Encode a normalized frame into the fixed-width on-disk columns."""
+    out = {"Date": df["Date"].to_numpy("datetime64[ns]").view("i8")}
+    for col in ["Open", "High", "Low", "Close", "Adj Close"]:
+        out[col] = df[col].to_numpy("float64", na_value=np.nan)
+    out["Volume"] = df["Volume"].fillna(0).to_numpy("int64")
+    names = df["Source"].astype(object).fillna("").astype(str)
+    for name in names.unique():
+        if name not in sources:
+            if len(sources) == 255:
+                raise ValueError("mmap store supports at most 255 distinct sources")
+            sources.append(name)
+    out["Source"] = names.map({s: i for i, s in enumerate(sources)}).to_numpy("uint8")
+    return out
+
+
+class MmapStore:
+    """Read-only view of a store written by :func:`write_store`.
+
+    Every column file is memory-mapped once; :meth:`arrays` returns slices of
+    those maps and :meth:`frame` wraps them in a DataFrame, neither copying
+    the price data. The view reflects the index at the time it was opened.
+    """
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+        self.index = _read_index(root)
+        rows = self.index["rows"]
+        self._maps: Dict[str, np.ndarray] = {}
+        for col, (_, dtype) in FIELDS.items():
+            if rows:
+                path = _column_path(root, col, self.index["generation"])
+                self._maps[col] = np.memmap(path, dtype=dtype, mode="r", shape=(rows,))
+            else:
+                self._maps[col] = np.empty(0, dtype=dtype)
+
+    @property
+    def tickers(self) -> List[str]:
+        return list(self.index["tickers"])
+
+    def arrays(
+        self,
+        ticker: str,
+        start: str | pd.Timestamp | None = None,
+        end: str | pd.Timestamp | None = None,
+    ) -> Dict[str, np.ndarray]:
+        """Return ``ticker``'s columns as memory-mapped arrays (empty if unknown)."""
+        seg = self.index["tickers"].get(ticker.upper())
+        if seg is None:
+            return {col: np.empty(0, dtype=dtype) for col, (_, dtype) in FIELDS.items()}
+        lo, hi = seg[0], seg[0] + seg[1]
+        dates = self._maps["Date"][lo:hi]
+        if start is not None:
+            lo += int(np.searchsorted(dates, pd.Timestamp(start).value, side="left"))
+        if end is not None:
+            hi = seg[0] + int(np.searchsorted(dates, pd.Timestamp(end).value, side="right"))
+        return {col: arr[lo:max(lo, hi)] for col, arr in self._maps.items()}
+
+    def frame(
+        self,
+        ticker: str,
+        start: str | pd.Timestamp | None = None,
+        end: str | pd.Timestamp | None = None,
+    ) -> pd.DataFrame:
+        """Return ``ticker``'s bars with the canonical columns.
+
+        Price, volume and date columns are views on the mapped files (and so
+        read-only); ``Ticker`` and ``Source`` are categoricals.
+        """
+        arrs = self.arrays(ticker, start, end)
+        n = len(arrs["Date"])
+        if n == 0:
+            return pd.DataFrame()
+        series = [pd.Series(arrs["Date"].view("datetime64[ns]"), name="Date", copy=False)]
+        series += [pd.Series(arrs[c], name=c, copy=False) for c in ["Open", "High", "Low", "Close", "Adj Close"]]
+        series.append(pd.Series(arrs["Volume"], name="Volume", copy=False))
+        ticker_cat = pd.Categorical.from_codes(np.zeros(n, dtype="int8"), [ticker.upper()])
+        source_cat = pd.Categorical.from_codes(arrs["Source"].astype("int16"), self.index["sources"])
+        series += [pd.Series(ticker_cat, name="Ticker"), pd.Series(source_cat, name="Source")]
+        return pd.concat(series, axis=1, copy=False)
+
+
+def load_prices(
+    tickers: Sequence[str],
+    start: str | pd.Timestamp | None = None,
+    end: str | pd.Timestamp | None = None,
+    *,
+    root: str,
+) -> Dict[str, pd.DataFrame]:
+    """Load bars for ``tickers`` like :func:`marketdata.store.load_prices`, via memory maps."""
+    store = MmapStore(root)
+    return {t: store.frame(t, start, end) for t in tickers}
+
+
+def _append(root: str, generation: int, rows: int, cols: Dict[str, np.ndarray], spare: int = 0) -> None:
+    """Write ``cols`` after the first ``rows`` rows of each file, followed by ``spare`` zeroed rows."""
+    for col, (_, dtype) in FIELDS.items():
+        with open(_column_path(root, col, generation), "ab") as fh:
+            # Anything past the indexed rows is left over from an interrupted write.
+            fh.truncate(rows * np.dtype(dtype).itemsize)
+            fh.write(np.ascontiguousarray(cols[col], dtype=dtype).tobytes())
+            fh.write(bytes(spare * np.dtype(dtype).itemsize))
+
+
+def _write_at(root: str, generation: int, offset: int, cols: Dict[str, np.ndarray]) -> None:
+    """Overwrite rows from ``offset`` on, which no index entry covers yet."""
+    for col, (_, dtype) in FIELDS.items():
+        with open(_column_path(root, col, generation), "r+b") as fh:
+            fh.seek(offset * np.dtype(dtype).itemsize)
+            fh.write(np.ascontiguousarray(cols[col], dtype=dtype).tobytes())
+
+
+def compact(root: str) -> None:
+    """Rewrite the store without rows orphaned by relocated tickers."""
+    index = _read_index(root)
+    old_gen, new_gen = index["generation"], index["generation"] + 1
+    store = MmapStore(root)
+    offset = 0
+    tickers: Dict[str, List[int]] = {}
+    parts: Dict[str, List[np.ndarray]] = {col: [] for col in FIELDS}
+    for t, seg in index["tickers"].items():
+        lo, n, _ = _segment(seg)
+        cap = _capacity(n)
+        tickers[t] = [offset, n, cap]
+        offset += cap
+        for col, (_, dtype) in FIELDS.items():
+            parts[col] += [store._maps[col][lo : lo + n], np.zeros(cap - n, dtype=dtype)]
+    _append(root, new_gen, 0, {col: np.concatenate(arrs) for col, arrs in parts.items()})
+    del store
+    index.update(generation=new_gen, rows=offset, tickers=tickers)
+    _atomic_write_json(os.path.join(root, "index.json"), index)
+    for col in FIELDS:
+        try:
+            os.remove(_column_path(root, col, old_gen))
+        except FileNotFoundError:
+            pass
+
+
+class MmapWriter:
+    """Append bars to the store under ``root``; see :func:`write_store`.
+
+    The index is replaced atomically at the end of every :meth:`write` and
+    :meth:`remove` call, once the rows it points at are on disk, so a
+    process killed before :meth:`close` loses none of the tickers a call
+    returned. Batching several tickers per call saves index rewrites.
+    """
+
+    def __init__(self, root: str, *, incremental: bool = True, metrics: RunMetrics | None = None) -> None:
+        os.makedirs(root, exist_ok=True)
+        self.root = root
+        self.incremental = incremental
+        self.metrics = metrics
+        self.index = _read_index(root)
+        self._store = MmapStore(root)
+
+    def __enter__(self) -> "MmapWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def write(self, bars: Dict[str, pd.DataFrame], *, incremental: bool | None = None) -> List[str]:
+        """Write ``bars`` and return the tickers written.
+
+        ``incremental`` overrides the writer's setting for this call.
+        """
+        incremental = self.incremental if incremental is None else incremental
+        index = self.index
+        written: List[str] = []
+        for t, df in bars.items():
+            if df.empty:
+                continue
+            key = t.upper()
+            df = _as_normalized(df)
+            df = df.drop_duplicates(subset=["Date"], keep="last").sort_values("Date")
+            seg = index["tickers"].get(key)
+            in_place = False
+            if seg is not None and incremental:
+                old = self._frame(key)
+                if (df["Date"] <= old["Date"].iloc[-1]).any():
+                    old, restated = _reconcile_adjustments(t, old, df)
+                    if restated is not None:
+                        _flag_refetch(self.root, t, restated)
+                    df = pd.concat([old, df], ignore_index=True)
+                    df = df.drop_duplicates(subset=["Date"], keep="last").sort_values("Date")
+                else:
+                    lo, n, cap = _segment(seg)
+                    # New bars fit the run's spare rows, or the run is last and can grow.
+                    in_place = n + len(df) <= cap or lo + cap == index["rows"]
+                    if not in_place:
+                        df = pd.concat([old, df], ignore_index=True)
+
+            cols = _to_columns(df, index["sources"])
+            if in_place:
+                _write_at(self.root, index["generation"], lo + n, cols)
+                index["tickers"][key] = [lo, n + len(df), max(cap, n + len(df))]
+                index["rows"] = max(index["rows"], lo + n + len(df))
+            else:
+                cap = _capacity(len(df))
+                _append(self.root, index["generation"], index["rows"], cols, spare=cap - len(df))
+                index["tickers"][key] = [index["rows"], len(df), cap]
+                index["rows"] += cap
+            if not incremental:
+                _clear_refetch(self.root, t)
+            if self.metrics is not None:
+                self.metrics.record_write(t, len(df), len(df) * ROW_BYTES)
+            written.append(t)
+            log.info("%s: wrote %d rows to %s", t, len(df), self.root)
+        if written:
+            self._save_index()
+        return written
+
+    def remove(self, tickers: Sequence[str]) -> List[str]:
+        """Drop ``tickers`` from the index and return those that were stored.
+
+        Their rows stay in the column files until the store is compacted.
+        """
+        removed = [t for t in tickers if self.index["tickers"].pop(t.upper(), None) is not None]
+        if removed:
+            self._save_index()
+        return removed
+
+    def _frame(self, key: str) -> pd.DataFrame:
+        # Runs written or grown since the store was opened aren't in its view yet.
+        if self._store.index["tickers"].get(key) != self.index["tickers"][key]:
+            self.flush()
+        return self._store.frame(key)
+
+    def _save_index(self) -> None:
+        _atomic_write_json(os.path.join(self.root, "index.json"), self.index)
+
+    def flush(self) -> None:
+        self._save_index()
+        self._store = MmapStore(self.root)
+
+    def close(self) -> None:
+        self.flush()
+        self._store = None
+        live = sum(_segment(seg)[2] for seg in self.index["tickers"].values())
+        if self.index["rows"] - live > live:
+            compact(self.root)
+
+
+def write_store(
+    bars: Dict[str, pd.DataFrame],
+    root: str,
+    *,
+    incremental: bool = True,
+    metrics: RunMetrics | None = None,
+) -> List[str]:
+    """Write bars into the memory-mappable store under ``root``.
+
+    Each column is one flat file of fixed-width values shared by all
+    tickers; ``index.json`` maps each ticker to its ``[offset, length,
+    capacity]`` run of rows, where rows past ``length`` are spare. With
+    ``incremental``, bars newer than the stored ones are written in place
+    into the run's spare rows (or past the end of the last run), so
+    appending costs only the new rows. A ticker that outgrows its run, or
+    whose stored bars are revised, has its merged rows written as a new,
+    larger run at the end. Without ``incremental`` the ticker's rows are
+    replaced. The index is replaced
+    atomically after the data is written, so readers and interrupted writes
+    never see partial runs; the files are compacted once orphaned rows
+    outnumber reserved ones. Returns the tickers written.
+    """
+    with MmapWriter(root, incremental=incremental, metrics=metrics) as writer:
+        return writer.write(bars)
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+from typing import Dict, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .prices import COLUMNS, _as_normalized
+
+PRICE_COLUMNS = ["Open", "High", "Low", "Close", "Adj Close"]
+# Per-row columns of the long panel; Ticker and Date form the index.
+VALUE_COLUMNS = PRICE_COLUMNS + ["Volume", "Source"]
+
+
+def _empty_long(multiindex: bool) -> pd.DataFrame:
+    df = pd.DataFrame({c: pd.Series(dtype="float64") for c in COLUMNS})
+    df["Date"] = df["Date"].astype("datetime64[ns]")
+    df["Ticker"] = df["Ticker"].astype("category")
+    df["Source"] = df["Source"].astype("category")
+    return df.set_index(["Ticker", "Date"])[VALUE_COLUMNS] if multiindex else df
+
+
+def to_long(
+    bars: Dict[str, pd.DataFrame],
+    *,
+    float32: bool = False,
+    multiindex: bool = True,
+) -> pd.DataFrame:
+    """Stack ``{ticker: frame}`` into one long-format frame.
+
+    ``Ticker`` and ``Source`` become categoricals (ticker categories sorted),
+    and with ``float32`` the price columns are stored as float32, roughly
+    halving their memory. With ``multiindex`` the result is indexed by a
+    sorted, duplicate-free ``(Ticker, Date)`` MultiIndex, so
+    ``panel.loc["AAPL"]`` or ``panel.loc[("AAPL", slice(lo, hi)), :]`` are
+    index lookups rather than scans.
+    """
+    items = [(t.upper(), _as_normalized(df)) for t, df in bars.items() if not df.empty]
+    if not items:
+        return _empty_long(multiindex)
+
+    lengths = np.fromiter((len(df) for _, df in items), dtype=np.int64, count=len(items))
+    body = pd.concat([df[["Date"] + VALUE_COLUMNS] for _, df in items], ignore_index=True)
+    names = sorted({t for t, _ in items})
+    codes = np.searchsorted(names, [t for t, _ in items])
+    body.insert(0, "Ticker", pd.Categorical.from_codes(np.repeat(codes, lengths), names))
+    body["Source"] = body["Source"].astype(str).astype("category")
+    if float32:
+        body[PRICE_COLUMNS] = body[PRICE_COLUMNS].astype("float32")
+    if not multiindex:
+        return body[COLUMNS]
+
+    body = body.set_index(["Ticker", "Date"])
+    body = body[~body.index.duplicated(keep="last")]
+    return body.sort_index()
+
+
+def to_wide(
+    bars: Dict[str, pd.DataFrame] | pd.DataFrame,
+    fields: str | Sequence[str] = ("Close", "Adj Close"),
+    *,
+    float32: bool = False,
+) -> pd.DataFrame:
+    """Pivot bars (a dict or a long panel) to a ``Date`` x ``Ticker`` panel.
+
+    A single field name gives plain ticker columns; a sequence gives
+    ``(field, Ticker)`` column pairs, e.g. ``wide["Adj Close"]["AAPL"]``.
+    """
+    long = to_long(bars, float32=float32) if isinstance(bars, dict) else bars
+    if not isinstance(long.index, pd.MultiIndex):
+        long = long.set_index(["Ticker", "Date"]).sort_index()
+    return long[fields if isinstance(fields, str) else list(fields)].unstack("Ticker")
+
+
+def from_long(panel: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    """Split a long panel (as returned by :func:`to_long`) back into ``{ticker: frame}``."""
+    df = panel.reset_index() if isinstance(panel.index, pd.MultiIndex) else panel
+    out: Dict[str, pd.DataFrame] = {}
+    for t, part in df.groupby("Ticker", sort=False, observed=True):
+        part = part.reindex(columns=COLUMNS).reset_index(drop=True)
+        part.attrs["normalized"] = True
+        out[str(t)] = part
+    return out
+
+
+def from_wide(wide: pd.DataFrame, field: str = "Close") -> Dict[str, pd.DataFrame]:
+    """Split a :func:`to_wide` panel into ``{ticker: frame}``.
+
+    Frames hold ``Date``, ``Ticker`` and whichever fields the panel has
+    (``field`` names the values of a single-field panel), so they are not
+    complete bars; dates where a ticker has no value are dropped.
+    """
+    if isinstance(wide.columns, pd.MultiIndex):
+        stacked = wide.stack("Ticker", future_stack=True)
+    else:
+        stacked = wide.stack(future_stack=True).rename(field).to_frame()
+    stacked = stacked.dropna(how="all").reset_index()
+    out: Dict[str, pd.DataFrame] = {}
+    for t, part in stacked.groupby("Ticker", sort=False, observed=True):
+        out[str(t)] = part.reset_index(drop=True)
+    return out
@@ -1,27 +1,41 @@
 from __future__ import annotations
 
-import argparse
+import io
 import json
 import logging
+import multiprocessing
 import os
-import sys
+import tempfile
+import threading
 import time
-from typing import Dict, List
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Iterator, List, TypeVar
 
+import numpy as np
 import pandas as pd
-import yfinance as yf
+
+from .cache import BarCache, NegativeCache, _atomic_write_json
+from .calendars import for_symbol, session_ends
+from .cli import cli, main  # noqa: F401 - historical entry point, now in marketdata.cli
+from .metrics import RunMetrics
+from .providers import STOOQ, YAHOO, CircuitOpenError, Provider, StooqProvider, _stooq_symbol  # noqa: F401
 
 log = logging.getLogger(__name__)
 
+T = TypeVar("T")
 
-def _stooq_symbol(symbol: str) -> str:
-    """Map Yahoo-style symbols to stooq symbols."""
-    parts = symbol.split(".")
-    if len(parts) == 2:
-        ticker, suffix = parts
-        mapping = {"L": "uk", "PA": "fr", "MI": "it"}
-        return f"{ticker.lower()}.{mapping.get(suffix.upper(), suffix.lower())}"
-    return f"{symbol.lower()}.us"
+# Canonical column order for normalized bars and on-disk outputs.
+COLUMNS = [
+    "Date",
+    "Open",
+    "High",
+    "Low",
+    "Close",
+    "Adj Close",
+    "Volume",
+    "Ticker",
+    "Source",
+]
 
 
 def _weekend_safe_end(end: pd.Timestamp) -> pd.Timestamp:
@@ -61,61 +75,310 @@ def _ensure_date_column(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def get_prices(
-    tickers: List[str],
-    start: str,
-    end: str,
+def normalize_batch(
+    raw: Dict[str, pd.DataFrame],
+    sources: Dict[str, str] | str,
     *,
-    on_error: str = "warn",
-) -> Dict[str, pd.DataFrame]:
-    """Fetch daily OHLCV bars via Yahoo with Stooq fallback.
+    split: bool = True,
+) -> Dict[str, pd.DataFrame] | pd.DataFrame:
+    """Coerce many raw provider frames to the canonical layout in one pass.
 
-    Guarantees returned frames have columns:
-    ['Date','Open','High','Low','Close','Adj Close','Volume','Ticker','Source'].
+    ``raw`` maps ticker to the provider's frame (dates in a ``DatetimeIndex``,
+    an index named ``Date``, or a ``Date`` or ``reset_index()``-style
+    ``index`` column) and ``sources`` gives each ticker's provider name,
+    or one name for all. The frames are concatenated once; column names,
+    dates, missing ``Adj Close``/``Volume`` and the ``Ticker``/``Source``
+    metadata (as categoricals) are then handled on the stacked frame.
+
+    Returns the stacked frame with :data:`COLUMNS`, or with ``split`` one
+    frame per ticker in ``raw`` (empty if it had no usable bars). Frames
+    missing the dates or a price column are logged and dropped. Results carry
+    ``attrs["normalized"] = True`` so writers can skip re-checking them.
     """
-    start_dt = pd.Timestamp(start)
-    end_dt = _weekend_safe_end(pd.Timestamp(end))
-    data: Dict[str, pd.DataFrame] = {}
+    if isinstance(sources, str):
+        sources = dict.fromkeys(raw, sources)
 
-    for t in tickers:
-        df = pd.DataFrame()
-        src = ""
-        last_err = None
+    keys: List[str] = []
+    frames: List[pd.DataFrame] = []
+    no_adj: List[int] = []
+    no_volume: List[int] = []
+    for t, df in raw.items():
+        if df is None or df.empty:
+            continue
+        if any(not isinstance(c, str) or c != c.title() for c in df.columns):
+            df = df.rename(columns=lambda c: str(c).title())
+        date_col = next((c for c in ("Date", "Index") if c in df.columns), None)
+        if date_col is not None:
+            df = df.set_index(date_col)
+        elif not isinstance(df.index, pd.DatetimeIndex) and df.index.name != "Date":
+            log.error("%s: missing 'Date' column or DatetimeIndex", t)
+            continue
+        missing = [c for c in ("Open", "High", "Low", "Close") if c not in df.columns]
+        if missing:
+            log.error("%s: missing '%s' column", t, missing[0])
+            continue
+        if "Adj Close" not in df.columns:
+            no_adj.append(len(keys))
+        if "Volume" not in df.columns:
+            no_volume.append(len(keys))
+        keys.append(t)
+        frames.append(df)
 
-        # --- Yahoo first, with retries ---
-        for attempt in range(3):
-            try:
-                df = yf.download(
-                    t,
-                    start=start_dt,
-                    end=end_dt + pd.Timedelta(days=1),  # yfinance end is exclusive
-                    progress=False,
-                    auto_adjust=False,
-                )
-                src = "yahoo"
-                break
-            except Exception as e:  # pragma: no cover - network failures
-                last_err = e
-                log.debug("%s: yahoo attempt %d failed (%s)", t, attempt + 1, e)
-                time.sleep(2**attempt)
+    if not frames:
+        stacked = pd.DataFrame(columns=COLUMNS)
+    else:
+        lengths = np.fromiter((len(df) for df in frames), dtype=np.int64, count=len(frames))
+        codes = np.repeat(np.arange(len(frames)), lengths)
+        both = pd.concat(frames, copy=False)
+
+        close = both["Close"].to_numpy()
+        adj = both["Adj Close"].to_numpy(copy=True) if "Adj Close" in both.columns else close.copy()
+        if no_adj:
+            mask = np.isin(codes, no_adj)
+            adj[mask] = close[mask]
+        if "Volume" in both.columns:
+            volume = both["Volume"].to_numpy(copy=True)
+            if no_volume:
+                volume[np.isin(codes, no_volume)] = 0
         else:
-            if last_err is not None:
-                log.warning("%s: yahoo fetch failed (%s)", t, last_err)
+            volume = np.zeros(len(both), dtype=np.int64)
+
+        names = [t.upper() for t in keys]
+        uniq_names = list(dict.fromkeys(names))
+        name_codes = np.array([uniq_names.index(n) for n in names]) if len(uniq_names) < len(names) else None
+        srcs = [sources[t] for t in keys]
+        uniq_srcs = list(dict.fromkeys(srcs))
+        src_codes = np.array([uniq_srcs.index(x) for x in srcs])[codes]
+        ticker_codes = codes if name_codes is None else name_codes[codes]
+
+        stacked = pd.DataFrame(
+            {
+                "Date": pd.to_datetime(both.index, errors="coerce"),
+                "Open": both["Open"].to_numpy(),
+                "High": both["High"].to_numpy(),
+                "Low": both["Low"].to_numpy(),
+                "Close": close,
+                "Adj Close": adj,
+                "Volume": volume,
+                "Ticker": pd.Categorical.from_codes(ticker_codes, uniq_names),
+                "Source": pd.Categorical.from_codes(src_codes, uniq_srcs),
+            }
+        )
+    stacked.attrs["normalized"] = True
+    if not split:
+        return stacked
+
+    out: Dict[str, pd.DataFrame] = {t: pd.DataFrame() for t in raw}
+    lo = 0
+    for t, df in zip(keys, frames):
+        part = stacked.iloc[lo : lo + len(df)].reset_index(drop=True)
+        part.attrs["normalized"] = True
+        out[t] = part
+        lo += len(df)
+    return out
+
+
+def _as_normalized(df: pd.DataFrame) -> pd.DataFrame:
+    """Return ``df`` with a ``Date`` column and :data:`COLUMNS`.
+
+    Frames produced by :func:`normalize_batch` are returned untouched.
+    """
+    if df.attrs.get("normalized"):
+        return df
+    return _ensure_date_column(df).reindex(columns=COLUMNS)
+
 
-        # --- Stooq fallback if needed ---
-        if df.empty:
+def _normalize(df: pd.DataFrame, ticker: str, source: str) -> pd.DataFrame:
+    """Coerce a raw provider frame to the canonical column layout.
+
+    Returns an empty frame (after logging) if required columns are missing.
+    """
+    return normalize_batch({ticker: df}, source)[ticker]
+
+
+def _utc_index(df: pd.DataFrame, ticker: str) -> pd.DataFrame:
+    """Index intraday bars by tz-aware UTC timestamps.
+
+    Naive timestamps are taken to be in the symbol's exchange time zone
+    (see :func:`~marketdata.calendars.for_symbol`).
+    """
+    if df is None or df.empty:
+        return df
+    for col in ("Date", "Datetime"):
+        if col in df.columns:
+            df = df.set_index(col)
+            break
+    idx = pd.DatetimeIndex(df.index)
+    if idx.tz is None:
+        idx = idx.tz_localize(for_symbol(ticker).tz, ambiguous="NaT", nonexistent="NaT")
+    return df.set_axis(idx.tz_convert("UTC").rename("Date"), axis=0)
+
+
+# Hedges share one bounded pool, so a large batch never starts a thread per
+# symbol; at most HEDGE_SYMBOLS symbols of a group are hedged.
+HEDGE_WORKERS = 8
+HEDGE_SYMBOLS = 4
+_HEDGE_POOL = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="hedge")
+
+
+def _race_primary(
+    group: List[str],
+    start_dt: pd.Timestamp,
+    end_dt: pd.Timestamp,
+    primary: Provider,
+    fallback: Provider,
+    hedge_after: float,
+    metrics: RunMetrics | None = None,
+    pool: Executor | None = None,
+) -> tuple[Dict[str, pd.DataFrame] | None, Dict[str, pd.DataFrame], Dict[str, Future]]:
+    """Start ``primary`` on ``pool``; if it is slower than ``hedge_after``, race ``fallback``.
+
+    The timer starts once the primary request holds a limiter slot, so time
+    spent queued behind other requests never triggers a hedge. ``pool``
+    should have a thread per fetch worker (:func:`iter_prices` sizes it so);
+    without one a single-use thread is started. Only the first
+    :data:`HEDGE_SYMBOLS` symbols are hedged, on the shared hedge pool.
+    Hedges that are no longer needed (their symbol won, or the primary
+    answered it) are cancelled, so a loser still queued for the pool or the
+    fallback's limiter never makes its request.
+
+    Returns the primary result (``None`` if it failed or lost every race),
+    the fallback frames that won their symbol, and the hedge futures still
+    owed to symbols not yet resolved.
+    """
+    started = threading.Event()
+    own_pool = pool is None
+    if own_pool:
+        pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="primary")
+    pfut = pool.submit(primary.fetch, group, start_dt, end_dt, metrics, started=started)
+    if own_pool:
+        pool.shutdown(wait=False)
+    # A primary that finishes without calling out (open circuit, cached payload) also ends the wait.
+    pfut.add_done_callback(lambda _: started.set())
+    started.wait()
+    wait([pfut], timeout=hedge_after)
+    hedges: Dict[Future, str] = {}
+    cancel: Dict[str, threading.Event] = {}
+    won: Dict[str, pd.DataFrame] = {}
+    if not pfut.done():
+        hedged = group[:HEDGE_SYMBOLS]
+        log.debug(
+            "%s: %s slower than %.1fs, hedging on %s", ",".join(hedged), primary.name, hedge_after, fallback.name
+        )
+        for t in hedged:
+            cancel[t] = threading.Event()
+            fut = _HEDGE_POOL.submit(fallback.fetch, [t], start_dt, end_dt, metrics, cancelled=cancel[t])
+            hedges[fut] = t
+        pending = set(hedges) | {pfut}
+        while not pfut.done() and len(won) < len(group):
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                if fut is pfut or fut.exception() is not None:
+                    continue
+                t = hedges[fut]
+                df = fut.result().get(t, pd.DataFrame())
+                if not df.empty:
+                    won[t] = df
+
+    fetched = None
+    if pfut.done():
+        try:
+            fetched = pfut.result()
+        except CircuitOpenError:
+            log.debug("%s: %s circuit open, using %s", ",".join(group), primary.name, fallback.name)
+        except Exception as e:  # pragma: no cover - network failures
+            log.warning("%s: %s fetch failed (%s)", ",".join(group), primary.name, e)
+    answered = {t for t, df in (fetched or {}).items() if not df.empty}
+    owed: Dict[str, Future] = {}
+    for fut, t in hedges.items():
+        if t in won or t in answered:
+            # Losers are dropped: never started if still queued, and never call out if waiting on the limiter.
+            fut.cancel()
+            cancel[t].set()
+        else:
+            owed[t] = fut
+    return fetched, won, owed
+
+
+def _fetch_group(
+    group: List[str],
+    start_dt: pd.Timestamp,
+    end_dt: pd.Timestamp,
+    on_error: str,
+    primary: Provider,
+    fallback: Provider,
+    hedge_after: float | None = None,
+    metrics: RunMetrics | None = None,
+    interval: str = "1d",
+    primaries: Executor | None = None,
+) -> tuple[Dict[str, pd.DataFrame], List[str]]:
+    """Fetch one request group from ``primary``, falling back per symbol.
+
+    With ``hedge_after`` the fallback is started for the group's first
+    symbols once the primary has been pending that long, and the first
+    non-empty answer per symbol wins (see :func:`_race_primary`, which runs
+    the primary request on ``primaries``). An
+    intraday ``interval`` only falls back (and hedges) if the fallback
+    serves it, and comes back indexed in UTC.
+
+    Returns the frames plus the symbols every provider answered with no rows
+    (as opposed to failing), which callers may treat as dead.
+    """
+    won: Dict[str, pd.DataFrame] = {}
+    owed: Dict[str, Future] = {}
+    can_fall_back = interval == "1d" or interval in fallback.intervals
+    if hedge_after is not None and interval == "1d":
+        fetched, won, owed = _race_primary(
+            group, start_dt, end_dt, primary, fallback, hedge_after, metrics, primaries
+        )
+    else:
+        try:
+            fetched = primary.fetch(group, start_dt, end_dt, metrics, interval)
+        except CircuitOpenError:
+            log.debug("%s: %s circuit open, using %s", ",".join(group), primary.name, fallback.name)
+            fetched = None
+        except Exception as e:  # pragma: no cover - network failures
+            log.warning("%s: %s fetch failed (%s)", ",".join(group), primary.name, e)
+            fetched = None
+    primary_ok = fetched is not None
+
+    data: Dict[str, pd.DataFrame] = {}
+    raw: Dict[str, pd.DataFrame] = {}
+    sources: Dict[str, str] = {}
+    dead: List[str] = []
+    for t in group:
+        if t in won:
+            df, src = won[t], fallback.name
+            if metrics is not None:
+                metrics.inc_fallback()
+        else:
+            df = (fetched or {}).get(t, pd.DataFrame())
+            src = primary.name
+
+        # --- Fallback if needed ---
+        if df.empty and not can_fall_back:
+            if not primary_ok:
+                if metrics is not None:
+                    metrics.inc_failure()
+                msg = f"{t}: {primary.name} fetch failed and {fallback.name} has no {interval} bars"
+                if on_error == "raise":
+                    raise RuntimeError(msg)
+                if on_error == "warn":
+                    log.warning(msg)
+                data[t] = pd.DataFrame()
+                continue
+        elif df.empty:
             try:
-                sym = _stooq_symbol(t)
-                sdf = pd.read_csv(f"https://stooq.com/q/d/l/?s={sym}&i=d")
-                sdf["Date"] = pd.to_datetime(sdf["Date"])
-                sdf = sdf[(sdf["Date"] >= start_dt) & (sdf["Date"] <= end_dt)]
-                if not sdf.empty:
-                    sdf = sdf.rename(columns=str.title)
-                    # Stooq doesn't provide Adj Close; replicate Close.
-                    sdf["Adj Close"] = sdf["Close"]
-                    df = sdf
-                    src = "stooq"
+                if t in owed:
+                    df = owed[t].result().get(t, pd.DataFrame())
+                else:
+                    df = fallback.fetch([t], start_dt, end_dt, metrics, interval).get(t, pd.DataFrame())
+                src = fallback.name
+                if metrics is not None:
+                    metrics.inc_fallback()
             except Exception as e:  # pragma: no cover - network failures
+                if metrics is not None:
+                    metrics.inc_failure()
                 msg = f"{t}: {e}"
                 if on_error == "raise":
                     raise
@@ -123,234 +386,915 @@ def get_prices(
                     log.warning(msg)
                 data[t] = pd.DataFrame()
                 continue
+            if df.empty and primary_ok:
+                dead.append(t)
+
+        raw[t], sources[t] = df, src
+
+    if interval != "1d":
+        raw = {t: _utc_index(df, t) for t, df in raw.items()}
+    # Normalize the whole group at once rather than frame by frame.
+    if metrics is None:
+        data.update(normalize_batch(raw, sources))
+    else:
+        with metrics.time("normalize"):
+            data.update(normalize_batch(raw, sources))
+    data = {t: data[t] for t in group}
 
-        if not df.empty:
-            # --- Normalize schema ---
-            # yfinance returns DatetimeIndex; promote and standardize.
-            df = _ensure_date_column(df)
-            # Title-case all columns to match desired schema
-            df = df.rename(columns=str.title)
-
-            # Verify required columns exist; create/align where possible.
-            required_price_cols = ["Open", "High", "Low", "Close"]
-            for col in required_price_cols:
-                if col not in df.columns:
-                    log.error("%s: missing '%s' column", t, col)
-                    data[t] = pd.DataFrame()
+    return data, dead
+
+
+def _run_jobs(
+    jobs: Iterable[tuple],
+    run: Callable[..., T],
+    workers: int,
+    max_in_flight: int | None = None,
+) -> Iterator[T]:
+    """Yield ``run(*job)`` for each job in completion order.
+
+    At most ``max_in_flight`` jobs (default ``2 * workers``) are submitted
+    ahead of the consumer, so results that haven't been consumed yet can't
+    pile up in memory. Closing the generator, or an exception from a job,
+    cancels the jobs still queued.
+    """
+    if workers <= 1:
+        for job in jobs:
+            yield run(*job)
+        return
+
+    limit = max(1, max_in_flight or 2 * workers)
+    queue = iter(jobs)
+    pending: set = set()
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prices")
+    try:
+        while True:
+            while len(pending) < limit:
+                job = next(queue, None)
+                if job is None:
                     break
-            else:
-                # Adj Close may be missing (e.g., some sources); create if needed
-                if "Adj Close" not in df.columns and "Close" in df.columns:
-                    df["Adj Close"] = df["Close"]
-
-                # Volume may be missing for some symbols; fill with 0 if absent
-                if "Volume" not in df.columns:
-                    df["Volume"] = 0
-
-                if "Date" not in df.columns:
-                    log.error("%s: missing 'Date' column after normalization", t)
-                    data[t] = pd.DataFrame()
-                    continue
+                pending.add(pool.submit(run, *job))
+            if not pending:
+                return
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                yield fut.result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def iter_prices(
+    tickers: List[str],
+    start: str,
+    end: str,
+    *,
+    on_error: str = "warn",
+    batch_size: int | None = None,
+    workers: int = 1,
+    max_in_flight: int | None = None,
+    providers: tuple[Provider, Provider] | None = None,
+    cache: BarCache | None = None,
+    negative_cache: NegativeCache | None = None,
+    hedge_after: float | None = None,
+    metrics: RunMetrics | None = None,
+    interval: str = "1d",
+) -> Iterator[tuple[str, pd.DataFrame]]:
+    """Yield ``(ticker, frame)`` pairs as each fetch finishes.
+
+    Takes the same options as :func:`get_prices`; frames are yielded in
+    completion order rather than ``tickers`` order. ``max_in_flight`` bounds
+    how many request groups run ahead of the consumer, which keeps memory
+    flat however long the ticker list is.
+    """
+    if interval != "1d":
+        from .intraday import iter_intraday
+
+        yield from iter_intraday(
+            tickers,
+            start,
+            end,
+            interval=interval,
+            on_error=on_error,
+            batch_size=batch_size,
+            workers=workers,
+            max_in_flight=max_in_flight,
+            providers=providers,
+            metrics=metrics,
+        )
+        return
+
+    tickers = list(dict.fromkeys(tickers))
+    start_dt = pd.Timestamp(start)
+    end_dt = _weekend_safe_end(pd.Timestamp(end))
+    primary, fallback = providers or (YAHOO, STOOQ)
+    size = batch_size if batch_size and batch_size > 1 else 1
+
+    # Dead symbols are only judged (and skipped) on windows reaching the
+    # recent past; an empty historical window may just predate a listing.
+    recent = negative_cache is not None and negative_cache.is_recent(end_dt)
+    if recent:
+        skipped = [t for t in tickers if negative_cache.is_dead(t)]
+        for t in skipped:
+            log.info("%s: skipped, no data from any provider recently", t)
+            yield t, pd.DataFrame()
+        tickers = [t for t in tickers if t not in set(skipped)]
+
+    # Bars past a symbol's last completed session don't exist yet or are
+    # still forming; symbols with no such session in the window are done.
+    ends = session_ends(tickers, end_dt)
+    idle = [t for t in tickers if ends[t] < start_dt]
+    for t in idle:
+        log.debug("%s: no completed session in %s..%s", t, start_dt.date(), end_dt.date())
+        yield t, pd.DataFrame()
+    if idle:
+        tickers = [t for t in tickers if ends[t] >= start_dt]
 
-                # Attach metadata
-                df = df.assign(Ticker=t.upper(), Source=src)
+    # A hedged primary runs off its job's thread so the job can time it; one thread per worker.
+    primaries = None
+    if hedge_after is not None:
+        primaries = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="primary")
 
-                # Reorder/select canonical columns
-                cols = [
-                    "Date",
-                    "Open",
-                    "High",
-                    "Low",
-                    "Close",
-                    "Adj Close",
-                    "Volume",
-                    "Ticker",
-                    "Source",
-                ]
-                df = df[cols]
+    def run(group: List[str], lo: pd.Timestamp, hi: pd.Timestamp):
+        fetched, dead = _fetch_group(
+            group, lo, hi, on_error, primary, fallback, hedge_after, metrics, primaries=primaries
+        )
+        return lo, hi, fetched, dead
+
+    def record(fetched: Dict[str, pd.DataFrame], dead: List[str]) -> None:
+        if not recent:
+            return
+        for t in dead:
+            if cache is None or not cache.coverage(t):
+                negative_cache.add(t)
+        for t, df in fetched.items():
+            if not df.empty:
+                negative_cache.discard(t)
+
+    try:
+        if cache is None:
+            by_end: Dict[pd.Timestamp, List[str]] = {}
+            for t in tickers:
+                by_end.setdefault(ends[t], []).append(t)
+            jobs = (
+                (group[i : i + size], start_dt, hi) for hi, group in by_end.items() for i in range(0, len(group), size)
+            )
+            for _, _, fetched, dead in _run_jobs(jobs, run, workers, max_in_flight):
+                record(fetched, dead)
+                yield from fetched.items()
+            return
+
+        gaps: Dict[tuple[pd.Timestamp, pd.Timestamp], List[str]] = {}
+        remaining: Dict[str, int] = {}
+        try:
+            for t in tickers:
+                missing = cache.missing(t, start_dt, ends[t])
+                remaining[t] = len(missing)
+                for gap in missing:
+                    gaps.setdefault(gap, []).append(t)
+                if not missing:
+                    yield t, cache.load(t, start_dt, end_dt)
+
+            jobs = (
+                (group[i : i + size], lo, hi)
+                for (lo, hi), group in gaps.items()
+                for i in range(0, len(group), size)
+            )
+            for lo, hi, fetched, dead in _run_jobs(jobs, run, workers, max_in_flight):
+                log.debug("%s: fetched %s..%s", ",".join(fetched), lo.date(), hi.date())
+                for t, df in fetched.items():
+                    if not df.empty:
+                        cache.store(t, df, lo, hi)
+                record(fetched, dead)
+                for t in fetched:
+                    remaining[t] -= 1
+                    if remaining[t] == 0:
+                        yield t, cache.load(t, start_dt, end_dt)
+        finally:
+            cache.evict()
+    finally:
+        if primaries is not None:
+            primaries.shutdown(wait=False)
+        if negative_cache is not None:
+            negative_cache.save()
+
+
+def get_prices(
+    tickers: List[str],
+    start: str,
+    end: str,
+    *,
+    on_error: str = "warn",
+    batch_size: int | None = None,
+    workers: int = 1,
+    providers: tuple[Provider, Provider] | None = None,
+    cache: BarCache | None = None,
+    negative_cache: NegativeCache | None = None,
+    hedge_after: float | None = None,
+    metrics: RunMetrics | None = None,
+    output: str = "dict",
+    float32: bool = False,
+    interval: str = "1d",
+) -> Dict[str, pd.DataFrame] | pd.DataFrame:
+    """Fetch daily OHLCV bars via Yahoo with Stooq fallback.
+
+    With ``batch_size`` > 1, Yahoo is asked for up to that many symbols per
+    request; only symbols that come back empty are retried one by one on
+    Stooq. With ``workers`` > 1, request groups run on a thread pool; each
+    provider's own :class:`~marketdata.providers.RateLimiter` still bounds
+    how many requests hit it at once. ``providers`` overrides the
+    ``(primary, fallback)`` pair. A provider whose circuit breaker is open
+    is skipped straight to the fallback, and with ``hedge_after`` (seconds)
+    the fallback is raced against a slow primary, first valid answer wins.
+
+    With a :class:`~marketdata.cache.BarCache`, only the parts of
+    ``start``..``end`` not already cached are fetched; tickers sharing the
+    same gap are fetched together.
+
+    Each symbol is only fetched through its exchange's last completed
+    session on or before ``end`` (see :mod:`marketdata.calendars`), so
+    weekends, holidays and a session that is still open never cost a
+    request, and a cached window that already reaches that session is
+    served without one.
+
+    With a :class:`~marketdata.cache.NegativeCache`, symbols that recently
+    returned no data from any provider are skipped (returned empty) until
+    their entry expires.
+
+    With a :class:`~marketdata.metrics.RunMetrics`, per-provider request
+    latencies, retries, fallbacks, failures and normalization time are
+    recorded into it.
+
+    With an intraday ``interval`` (``"1m"``, ``"5m"``, ``"1h"``...) bars
+    come from :func:`marketdata.intraday.iter_intraday` instead: the range
+    is split into the windows Yahoo allows per request, fetched
+    concurrently with ``workers``, and ``Date`` holds tz-aware UTC bar
+    start times. The caches only hold daily bars and are not used.
+
+    See :func:`iter_prices` to consume results as they arrive.
+
+    Guarantees returned frames have columns:
+    ['Date','Open','High','Low','Close','Adj Close','Volume','Ticker','Source'].
+
+    ``output="long"`` instead returns one frame indexed by a sorted
+    ``(Ticker, Date)`` MultiIndex, and ``output="wide"`` a ``Date`` x
+    ``(field, Ticker)`` panel of Close and Adj Close; both use categorical
+    ``Ticker``/``Source`` and, with ``float32``, float32 prices. See
+    :mod:`marketdata.panel` for converting between the forms.
+    """
+    if output not in ("dict", "long", "wide"):
+        raise ValueError(f"output must be 'dict', 'long' or 'wide', not {output!r}")
+    data = dict(
+        iter_prices(
+            tickers,
+            start,
+            end,
+            on_error=on_error,
+            batch_size=batch_size,
+            workers=workers,
+            providers=providers,
+            cache=cache,
+            negative_cache=negative_cache,
+            hedge_after=hedge_after,
+            metrics=metrics,
+            interval=interval,
+        )
+    )
+    bars = {t: data[t] for t in dict.fromkeys(tickers)}
+    if output == "dict":
+        return bars
 
-        data[t] = df
+    from . import panel
 
-    return data
+    if output == "long":
+        return panel.to_long(bars, float32=float32)
+    return panel.to_wide(bars, float32=float32)
+
+
+# In-process memo for get_latest_closes: TICKER -> (fetched_at, date, close),
+# oldest answer first; beyond LATEST_CLOSES_MAX symbols the oldest are dropped.
+LATEST_CLOSES_MAX = 10_000
+_LATEST_CLOSES: Dict[str, tuple[float, pd.Timestamp, float]] = {}
+_LATEST_CLOSES_LOCK = threading.Lock()
+
+
+def get_latest_closes(
+    tickers: List[str],
+    *,
+    on_error: str = "warn",
+    ttl: float = 300.0,
+    batch_size: int = 100,
+) -> Dict[str, tuple[pd.Timestamp, float]]:
+    """Return ``{ticker: (date, close)}`` with the latest official close per symbol.
+
+    All symbols not answered from the in-process memo are resolved with one
+    batched :func:`get_prices` call over a small window covering weekends and
+    holidays. Answers are memoized for ``ttl`` seconds (``0`` disables the
+    memo), and for as long as they are the close of the symbol's last
+    completed session, since no newer close can exist before the next one
+    ends; the memo keeps the :data:`LATEST_CLOSES_MAX` most recently fetched
+    symbols. Symbols with no data are left out.
+    """
+    now = time.monotonic()
+    today = pd.Timestamp.today().normalize()
+    out: Dict[str, tuple[pd.Timestamp, float]] = {}
+    with _LATEST_CLOSES_LOCK:
+        memo = {t: _LATEST_CLOSES.get(t.upper()) for t in tickers} if ttl > 0 else {}
+    ends = session_ends([t for t, hit in memo.items() if hit is not None], today)
+    for t, hit in memo.items():
+        if hit is not None and (now - hit[0] < ttl or hit[1] >= ends[t]):
+            out[t] = hit[1:]
+
+    todo = [t for t in dict.fromkeys(tickers) if t not in out]
+    if todo:
+        start = today - pd.Timedelta(days=7)
+        bars = get_prices(
+            todo,
+            start=str(start.date()),
+            end=str(today.date()),
+            on_error=on_error,
+            batch_size=batch_size,
+        )
+        with _LATEST_CLOSES_LOCK:
+            for t in todo:
+                df = bars.get(t, pd.DataFrame())
+                if df.empty:
+                    continue
+                last = df.iloc[-1]
+                out[t] = (last["Date"], float(last["Close"]))
+                if ttl > 0:
+                    _LATEST_CLOSES.pop(t.upper(), None)
+                    _LATEST_CLOSES[t.upper()] = (now, *out[t])
+            while len(_LATEST_CLOSES) > LATEST_CLOSES_MAX:
+                del _LATEST_CLOSES[next(iter(_LATEST_CLOSES))]
+
+    return {t: out[t] for t in tickers if t in out}
 
 
 def get_latest_close(ticker: str, *, on_error: str = "warn") -> tuple[pd.Timestamp, float]:
     """Return the latest official close for ``ticker``.
 
-    A small window is fetched to cover weekends and holidays. Raises
-    ``ValueError`` if no data is returned.
+    Thin wrapper over :func:`get_latest_closes`. Raises ``ValueError`` if no
+    data is returned.
     """
-    today = pd.Timestamp.today().normalize()
-    start = today - pd.Timedelta(days=7)
-    bars = get_prices([ticker], start=str(start.date()), end=str(today.date()), on_error=on_error)
-    df = bars.get(ticker, pd.DataFrame())
-    if df.empty:
+    closes = get_latest_closes([ticker], on_error=on_error)
+    if ticker not in closes:
         raise ValueError(f"No data for {ticker}")
-    last = df.iloc[-1]
-    return last["Date"], float(last["Close"])
+    return closes[ticker]
 
 
-def save_prices_csv(bars: Dict[str, pd.DataFrame], out_dir: str, incremental: bool = True) -> List[str]:
-    paths: List[str] = []
-    os.makedirs(out_dir, exist_ok=True)
+def _atomic_to_csv(df: pd.DataFrame, path: str) -> None:
+    """Write ``df`` to a temp file next to ``path`` and rename it into place."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", newline="") as fh:
+            df.to_csv(fh, index=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _read_csv_tail(
+    path: str, since: pd.Timestamp, block_size: int = 1 << 16
+) -> tuple[list[str], pd.Timestamp | None, pd.DataFrame] | None:
+    """Read the header, last stored ``Date`` and rows dated ``>= since``.
+
+    Only the end of the file is touched: if the last row predates ``since``
+    nothing is parsed at all, otherwise blocks are read backwards until a
+    row dated before ``since`` is seen. Returns ``None`` if the file is
+    missing, lacks a trailing newline (e.g. a torn write) or its rows can't
+    be parsed, and no rows if the header isn't the canonical one; callers
+    then rewrite the file.
+    """
+    try:
+        fh = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    with fh:
+        header = fh.readline()
+        names = header.decode(errors="replace").strip().split(",")
+        if names != COLUMNS:
+            return names, None, pd.DataFrame()
+        body_start = fh.tell()
+        size = fh.seek(0, os.SEEK_END)
+        if size == body_start:
+            return names, None, pd.DataFrame(columns=COLUMNS)
+
+        # Fast path: the newest bar alone often decides it's a pure append.
+        pos = max(body_start, size - 4096)
+        fh.seek(pos)
+        chunk = fh.read()
+        if not chunk.endswith(b"\n"):
+            return None
+        lines = chunk[:-1].rsplit(b"\n", 1)
+        if len(lines) == 2 or pos == body_start:
+            try:
+                last = pd.Timestamp(lines[-1].split(b",", 1)[0].decode())
+            except ValueError:
+                return None
+            if last < since:
+                return names, last, pd.DataFrame(columns=COLUMNS)
+
+        buf = b""
+        pos = size
+        while pos > body_start:
+            step = min(block_size, pos - body_start)
+            pos -= step
+            fh.seek(pos)
+            buf = fh.read(step) + buf
+            if pos == body_start:
+                break
+            # The first line in ``buf`` may be partial; check the next full one.
+            nl = buf.find(b"\n")
+            if nl < 0 or nl == len(buf) - 1:
+                continue
+            first_date = buf[nl + 1 :].split(b",", 1)[0].decode()
+            try:
+                if pd.Timestamp(first_date) < since:
+                    buf = buf[nl + 1 :]
+                    break
+            except ValueError:
+                return None
+
+    try:
+        tail = pd.read_csv(io.BytesIO(header + buf), parse_dates=["Date"])
+    except Exception:
+        return None
+    last = tail["Date"].max() if not tail.empty else None
+    return names, last, tail[tail["Date"] >= since]
 
-    for t, df in bars.items():
-        if df.empty:
-            continue
 
-        # Light guard (get_prices already normalizes).
-        df = _ensure_date_column(df)
+def _frames_match(a: pd.DataFrame, b: pd.DataFrame) -> bool:
+    """Return True if two bar frames hold the same rows (floats compared loosely)."""
+    if len(a) != len(b) or not (a["Date"].to_numpy() == b["Date"].to_numpy()).all():
+        return False
+    for col in COLUMNS[1:]:
+        x, y = a[col], b[col]
+        if pd.api.types.is_numeric_dtype(x) and pd.api.types.is_numeric_dtype(y):
+            if not np.allclose(x.to_numpy(float), y.to_numpy(float), rtol=1e-9, atol=0, equal_nan=True):
+                return False
+        elif not (x.astype(str).to_numpy() == y.astype(str).to_numpy()).all():
+            return False
+    return True
 
-        path = f"{out_dir}/{t.replace('^','_')}_D.csv"
+
+def _append_csv(df: pd.DataFrame, path: str) -> None:
+    """Append rows without a header, truncating back on failure."""
+    with open(path, "a", newline="") as fh:
+        size = fh.tell()
         try:
-            if incremental:
-                try:
-                    old = pd.read_csv(path, parse_dates=["Date"])
-                except Exception:  # FileNotFoundError or malformed file
-                    old = pd.DataFrame()
+            df.to_csv(fh, index=False, header=False)
+            fh.flush()
+            os.fsync(fh.fileno())
+        except BaseException:
+            fh.truncate(size)
+            raise
+
+
+# Bars from the same source whose Close moved by more than this between two
+# downloads were restated (a split), not just re-adjusted for a dividend.
+SPLIT_TOLERANCE = 0.01
+# Relative change in Adj Close / Close below which adjustments are unchanged.
+ADJ_TOLERANCE = 1e-5
+# Per-directory record of tickers whose stored raw prices went stale.
+REFETCH_NAME = ".refetch.json"
+_REFETCH_LOCK = threading.Lock()
+
+
+def pending_refetch(out_dir: str) -> Dict[str, dict]:
+    """Return ``{ticker: {"reason", "detected_at"}}`` for tickers flagged under ``out_dir``.
+
+    Tickers are flagged when an incremental write finds their stored raw
+    prices restated (see :func:`save_prices_csv`); their whole history
+    should be fetched again and written non-incrementally, which clears
+    the flag. ``prices refresh`` does this automatically.
+    """
+    try:
+        with open(os.path.join(out_dir, REFETCH_NAME), "r", encoding="utf-8") as fh:
+            return json.load(fh)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _flag_refetch(out_dir: str, ticker: str, reason: str) -> None:
+    log.warning("%s: stored prices stale (%s), flagged for a full refetch", ticker, reason)
+    with _REFETCH_LOCK:
+        flagged = pending_refetch(out_dir)
+        flagged[ticker.upper()] = {"reason": reason, "detected_at": time.time()}
+        _atomic_write_json(os.path.join(out_dir, REFETCH_NAME), flagged)
+
+
+def _clear_refetch(out_dir: str, ticker: str) -> None:
+    path = os.path.join(out_dir, REFETCH_NAME)
+    if not os.path.exists(path):
+        return
+    with _REFETCH_LOCK:
+        flagged = pending_refetch(out_dir)
+        if flagged.pop(ticker.upper(), None) is not None:
+            _atomic_write_json(path, flagged)
+
+
+def _reconcile_adjustments(ticker: str, stored: pd.DataFrame, new: pd.DataFrame) -> tuple[pd.DataFrame, str | None]:
+    """Bring ``stored`` bars onto the adjustment basis of freshly fetched ``new`` bars.
+
+    Yahoo restates ``Adj Close`` backwards after every dividend, by the
+    same factor for every earlier bar, so the factor is measured once on
+    the dates both frames hold from the same source and applied to the
+    whole stored ``Adj Close`` column. It is taken at the earliest such
+    date: an event inside the overlap only restates the bars before it,
+    and the stored bars that are kept all precede the overlap. If
+    ``Close`` itself changed there (a split), raw prices and volumes are
+    stale too: ``stored`` is returned as is, with a reason the caller
+    records via :func:`_flag_refetch`.
+    """
+    cols = ["Date", "Close", "Adj Close", "Source"]
+    both = stored[cols].merge(new[cols], on="Date", suffixes=("_old", "_new")).sort_values("Date")
+    both = both[both["Source_old"].astype(str) == both["Source_new"].astype(str)]
+    if both.empty:
+        return stored, None
 
-                if not old.empty:
-                    df = pd.concat([old, df], ignore_index=True)
+    close = (both["Close_new"] / both["Close_old"]).to_numpy(float)
+    finite = close[np.isfinite(close)]
+    close_ratio = float(finite[0]) if len(finite) else 1.0
+    if abs(close_ratio - 1.0) > SPLIT_TOLERANCE:
+        return stored, f"close restated x{close_ratio:.6g}"
+
+    adj = (both["Adj Close_new"] / both["Adj Close_old"]).to_numpy(float)
+    finite = adj[np.isfinite(adj)]
+    if not len(finite):
+        return stored, None
+    factor = float(finite[0])
+    if abs(factor - 1.0) <= ADJ_TOLERANCE:
+        return stored, None
+    stored = stored.copy()
+    stored["Adj Close"] = stored["Adj Close"].to_numpy(float) * factor
+    log.info("%s: adjustment factor changed (x%.6g), rescaled %d stored Adj Close values", ticker, factor, len(stored))
+    return stored, None
+
+
+class WrittenFile(str):
+    """Path of a file written by :func:`save_prices_csv`, :func:`save_prices_parquet` or
+    :func:`~marketdata.store.write_dataset`.
+
+    It is the path string itself, so lists of them work wherever lists of
+    paths did, and also records what the write did: the ``ticker``, the
+    ``rows`` and ``nbytes`` written (just the appended ones for an
+    append), the ``seconds`` it took and whether it ``appended``.
+    """
+
+    ticker: str
+    rows: int
+    nbytes: int
+    seconds: float
+    appended: bool
+
+    def __new__(cls, path: str, *, ticker: str, rows: int, nbytes: int, seconds: float, appended: bool = False):
+        self = super().__new__(cls, path)
+        self.ticker, self.rows, self.nbytes, self.seconds, self.appended = ticker, rows, nbytes, seconds, appended
+        return self
+
+    def __getnewargs_ex__(self):
+        fields = dict(ticker=self.ticker, rows=self.rows, nbytes=self.nbytes, seconds=self.seconds)
+        return (str(self),), {**fields, "appended": self.appended}
+
+
+def _write_csv_file(ticker: str, path: str, df: pd.DataFrame, incremental: bool) -> tuple[WrittenFile, str | None]:
+    """Write one ticker's CSV (see :func:`save_prices_csv`); runs in a writer pool.
+
+    Returns the written file and, if stored prices turned out restated,
+    the reason to flag the ticker for a refetch.
+    """
+    t0 = time.perf_counter()
+    df = df.drop_duplicates(subset=["Date"], keep="last").sort_values("Date")
+    restated = None
+    if incremental:
+        tail = _read_csv_tail(path, df["Date"].iloc[0])
+        if tail is not None and tail[0] == COLUMNS:
+            _, last, stored = tail
+            new = df if last is None else df[df["Date"] > last]
+            overlap = df.iloc[:0] if last is None else df[df["Date"] <= last]
+            if (overlap.empty and stored.empty) or _frames_match(
+                overlap.reset_index(drop=True), stored.reindex(columns=COLUMNS).reset_index(drop=True)
+            ):
+                nbytes = 0
+                if not new.empty:
+                    size = os.path.getsize(path)
+                    _append_csv(new, path)
+                    nbytes = os.path.getsize(path) - size
+                seconds = time.perf_counter() - t0
+                done = WrittenFile(path, ticker=ticker, rows=len(new), nbytes=nbytes, seconds=seconds, appended=True)
+                return done, None
+
+        # Revised/overlapping rows, new file or unreadable tail: full rewrite.
+        try:
+            old = pd.read_csv(path, parse_dates=["Date"])
+        except Exception:  # FileNotFoundError or malformed file
+            old = pd.DataFrame()
 
-            # De-dupe and sort by Date
+        if not old.empty:
+            old, restated = _reconcile_adjustments(ticker, old.reindex(columns=COLUMNS), df)
+            df = pd.concat([old, df], ignore_index=True)
             df = df.drop_duplicates(subset=["Date"], keep="last").sort_values("Date")
+            df = df.reindex(columns=COLUMNS)
 
-            cols = [
-                "Date",
-                "Open",
-                "High",
-                "Low",
-                "Close",
-                "Adj Close",
-                "Volume",
-                "Ticker",
-                "Source",
-            ]
-            df = df.reindex(columns=cols)
-            df.to_csv(path, index=False)
-            paths.append(path)
-            log.info("%s: wrote %s (%d rows)", t, path, len(df))
-        except Exception as e:  # pragma: no cover - filesystem failures
-            log.error("%s: failed to write %s (%s)", t, path, str(e))
+    _atomic_to_csv(df, path)
+    seconds = time.perf_counter() - t0
+    return WrittenFile(path, ticker=ticker, rows=len(df), nbytes=os.path.getsize(path), seconds=seconds), restated
 
+
+def _atomic_to_parquet(df: pd.DataFrame, path: str, **kwargs) -> None:
+    """Write ``df`` to a temp file next to ``path`` and rename it into place."""
+    # Dot-prefixed, so dataset readers skip it while it is being written.
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".", suffix=".tmp")
+    os.close(fd)
+    try:
+        df.to_parquet(tmp_path, index=False, **kwargs)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _write_parquet_file(
+    ticker: str, path: str, df: pd.DataFrame, incremental: bool, compression: str, row_group_size: int | None
+) -> tuple[WrittenFile, str | None]:
+    """Write one ticker's Parquet file (see :func:`save_prices_parquet`); runs in a writer pool.
+
+    With ``incremental`` the stored bars are merged with ``df`` as for a
+    CSV rewrite. Returns the written file and the refetch reason, if any.
+    """
+    t0 = time.perf_counter()
+    restated = None
+    if incremental:
+        try:
+            old = pd.read_parquet(path)
+        except Exception:  # FileNotFoundError or malformed file
+            old = pd.DataFrame()
+        if not old.empty:
+            old, restated = _reconcile_adjustments(ticker, old.reindex(columns=COLUMNS), df)
+            df = pd.concat([old, df], ignore_index=True)
+    df = df.drop_duplicates(subset=["Date"], keep="last").sort_values("Date").reindex(columns=COLUMNS)
+    _atomic_to_parquet(df, path, compression=compression, row_group_size=row_group_size)
+    seconds = time.perf_counter() - t0
+    return WrittenFile(path, ticker=ticker, rows=len(df), nbytes=os.path.getsize(path), seconds=seconds), restated
+
+
+def _writer_pool(workers: int, processes: bool = False) -> Executor:
+    """Return a writer pool of ``workers`` threads, or processes with ``processes``.
+
+    Worker processes come from a fork server (spawned where there is none):
+    forking a process whose fetch and writer threads are running can copy a
+    lock some thread holds and deadlock the child.
+    """
+    if not processes:
+        return ThreadPoolExecutor(max_workers=workers)
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+
+
+def _run_writers(
+    fn: Callable, jobs: List[tuple], workers: int | Executor, processes: bool
+) -> Iterator[tuple[tuple, object]]:
+    """Yield ``(job, fn(*job) or the exception it raised)`` for each job, in order.
+
+    With ``workers`` > 1 the jobs run on a thread pool, or a process pool
+    with ``processes`` (for CPU-bound formatting that holds the GIL; see
+    :func:`_writer_pool`); an existing executor is used as is.
+    """
+    if isinstance(workers, Executor):
+        pool = workers
+    elif workers <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            try:
+                yield job, fn(*job)
+            except Exception as e:
+                yield job, e
+        return
+    else:
+        pool = _writer_pool(min(workers, len(jobs)), processes)
+    try:
+        futures = [pool.submit(fn, *job) for job in jobs]
+        for job, fut in zip(jobs, futures):
+            try:
+                yield job, fut.result()
+            except Exception as e:
+                yield job, e
+    finally:
+        if pool is not workers:
+            pool.shutdown()
+
+
+def _collect_writes(
+    results: Iterator[tuple[tuple, object]],
+    out_dir: str,
+    *,
+    replaced: bool,
+    metrics: RunMetrics | None,
+) -> List[WrittenFile]:
+    """Log and record writer results in the calling process; return the files written."""
+    paths: List[WrittenFile] = []
+    for (t, path, *_), result in results:
+        if isinstance(result, Exception):
+            log.error("%s: failed to write %s (%s)", t, path, str(result))
+            continue
+        done, restated = result
+        if restated is not None:
+            _flag_refetch(out_dir, t, restated)
+        elif replaced:
+            _clear_refetch(out_dir, t)
+        if metrics is not None:
+            metrics.record_write(t, done.rows, done.nbytes)
+            metrics.add_stage("write", done.seconds)
+        if done.appended:
+            log.info("%s: appended %d rows to %s", t, done.rows, path)
+        else:
+            log.info("%s: wrote %s (%d rows)", t, path, done.rows)
+        paths.append(done)
     return paths
 
 
-def save_prices_parquet(bars: Dict[str, pd.DataFrame], out_dir: str) -> List[str]:
-    paths: List[str] = []
+def save_prices_csv(
+    bars: Dict[str, pd.DataFrame],
+    out_dir: str,
+    incremental: bool = True,
+    metrics: RunMetrics | None = None,
+    *,
+    workers: int | Executor = 1,
+    processes: bool = False,
+) -> List[WrittenFile]:
+    """Write one ``<TICKER>_D.csv`` per ticker.
+
+    With ``incremental`` only the tail of an existing file is read: bars newer
+    than the last stored ``Date`` are appended in place, and the file is only
+    re-read and rewritten when the new bars revise or fill in stored dates.
+    Rewrites go through a temp file and ``os.replace`` so a crash never
+    leaves a truncated CSV; a failed append is truncated back.
+
+    When new bars overlap stored ones, their adjustment factors are compared
+    first: after a dividend the stored ``Adj Close`` history is rescaled in
+    place, after a split the ticker is flagged for a full refetch (see
+    :func:`pending_refetch`). A non-incremental write clears that flag.
+
+    With ``workers`` > 1 files are written concurrently on a thread pool,
+    or with ``processes`` on a process pool, since CSV formatting is
+    CPU-bound; ``workers`` may also be an executor to reuse across calls.
+    Returns a :class:`WrittenFile` (a path with per-file rows,
+    bytes and seconds) per ticker written, in ``bars`` order. With
+    ``metrics``, the rows and bytes written per ticker and the total
+    ``write`` time are recorded.
+    """
     os.makedirs(out_dir, exist_ok=True)
+    # Light guard; frames from get_prices are already normalized.
+    jobs = [
+        (t, f"{out_dir}/{t.replace('^','_')}_D.csv", _as_normalized(df), incremental)
+        for t, df in bars.items()
+        if not df.empty
+    ]
+    results = _run_writers(_write_csv_file, jobs, workers, processes)
+    return _collect_writes(results, out_dir, replaced=not incremental, metrics=metrics)
 
-    for t, df in bars.items():
-        if df.empty:
-            continue
 
-        # Ensure normalized schema (same as CSV writer).
-        df = _ensure_date_column(df)
+def save_prices_parquet(
+    bars: Dict[str, pd.DataFrame],
+    out_dir: str,
+    *,
+    partitioned: bool = False,
+    incremental: bool = True,
+    compression: str = "snappy",
+    row_group_size: int | None = None,
+    metrics: RunMetrics | None = None,
+    workers: int | Executor = 1,
+    processes: bool = False,
+) -> List[WrittenFile]:
+    """Write one ``<TICKER>_D.parquet`` per ticker, or a partitioned dataset.
+
+    Each file is written to a temp path and renamed into place, on a
+    writer pool as for :func:`save_prices_csv` (``workers``,
+    ``processes``); returns :class:`WrittenFile` paths. With
+    ``incremental`` a ticker's stored bars are read back and merged with
+    the new ones, reconciling adjustment factors as for
+    :func:`save_prices_csv`; Parquet can't be appended to, so the whole
+    file is rewritten. Without it the file holds only ``bars``.
 
-        path = f"{out_dir}/{t.replace('^','_')}_D.parquet"
-        try:
-            cols = [
-                "Date",
-                "Open",
-                "High",
-                "Low",
-                "Close",
-                "Adj Close",
-                "Volume",
-                "Ticker",
-                "Source",
-            ]
-            df = df.reindex(columns=cols)
-            df.to_parquet(path, index=False)
-            paths.append(path)
-            log.info("%s: wrote %s (%d rows)", t, path, len(df))
-        except Exception as e:  # pragma: no cover
-            log.error("%s: failed to write %s (%s)", t, path, str(e))
+    With ``partitioned`` the bars go to a ``Ticker=<T>/year=<YYYY>`` dataset
+    under ``out_dir`` (see :func:`marketdata.store.write_dataset`), which
+    :func:`marketdata.store.load_prices` reads back selectively.
+    """
+    if partitioned:
+        from .store import write_dataset
 
-    return paths
+        return write_dataset(
+            bars,
+            out_dir,
+            incremental=incremental,
+            compression=compression,
+            row_group_size=row_group_size,
+            metrics=metrics,
+            workers=workers,
+            processes=processes,
+        )
 
+    os.makedirs(out_dir, exist_ok=True)
+    # Ensure normalized schema (same as CSV writer).
+    jobs = [
+        (t, f"{out_dir}/{t.replace('^','_')}_D.parquet", _as_normalized(df), incremental, compression, row_group_size)
+        for t, df in bars.items()
+        if not df.empty
+    ]
+    results = _run_writers(_write_parquet_file, jobs, workers, processes)
+    return _collect_writes(results, out_dir, replaced=not incremental, metrics=metrics)
 
-def main(argv: list[str] | None = None) -> int:
-    p = argparse.ArgumentParser(
-        prog="prices",
-        description="Fetch OHLCV via Yahoo and save optional CSV/Parquet.",
-    )
-    p.add_argument(
-        "--tickers",
-        nargs="+",
-        help="Symbols (Yahoo format). Separate with spaces or commas.",
-    )
-    p.add_argument("--config", help="JSON/YAML watchlist file")
-    p.add_argument("--group", default="watchlist", help="Group name in watchlist config")
-    p.add_argument("--start", required=True)
-    p.add_argument("--end", required=True)
-    p.add_argument("--out-dir", "--out", dest="out_dir", default="")
-    p.add_argument("--format", choices=["csv", "parquet"], default="csv")
-    p.add_argument("--on-error", choices=["raise", "warn", "ignore"], default="warn")
-    p.add_argument("--incremental", action="store_true")
-    p.add_argument("--log-level", default="INFO")
-    p.add_argument("--table", action="store_true", help="Print full tables instead of a summary")
-
-    args = p.parse_args(argv)
-    logging.basicConfig(level=getattr(logging, args.log_level.upper(), logging.INFO))
-
-    if args.out_dir and args.out_dir.endswith(".csv"):
-        p.error("--out-dir expects a directory, not a file name")
-
-    tickers: List[str] = []
-    if args.tickers:
-        for group in args.tickers:
-            tickers.extend(
-                [t.strip().upper() for t in group.split(",") if t.strip()]
-            )
-    if args.config:
-        with open(args.config, "r", encoding="utf-8") as fh:
-            if args.config.lower().endswith((".yaml", ".yml")):
-                try:
-                    import yaml  # type: ignore
-                except ImportError as e:  # pragma: no cover - optional dep
-                    p.error("PyYAML required for YAML configs")
-                cfg = yaml.safe_load(fh)
-            else:
-                cfg = json.load(fh)
-        groups = cfg.get("groups", {})
-        if args.group and args.group in groups:
-            tickers.extend(groups[args.group])
-        else:
-            tickers.extend(cfg.get("tickers", []))
-    tickers = sorted({t.strip().upper() for t in tickers if t})
-    if not tickers:
-        p.error("No tickers provided. Use --tickers or --config.")
 
-    bars = get_prices(tickers, start=args.start, end=args.end, on_error=args.on_error)
+def _csv_date_range(path: str) -> tuple[pd.Timestamp, pd.Timestamp] | None:
+    """Return the first and last ``Date`` of a canonical bar CSV, reading only its ends."""
+    tail = _read_csv_tail(path, pd.Timestamp.max)
+    if tail is None or tail[1] is None:
+        return None
+    with open(path, "rb") as fh:
+        fh.readline()
+        first = fh.readline().split(b",", 1)[0].decode()
+    try:
+        return pd.Timestamp(first), tail[1]
+    except ValueError:
+        return None
+
+
+def stored_ranges(
+    tickers: List[str],
+    out_dir: str,
+    *,
+    format: str = "csv",
+    partitioned: bool = False,
+) -> Dict[str, tuple[pd.Timestamp, pd.Timestamp] | None]:
+    """Return ``{ticker: (first Date, last Date)}`` of the bars stored under ``out_dir``.
+
+    Tickers with nothing stored map to ``None``. Only file ends, Parquet
+    footers or the mmap index are read. ``format`` is ``"csv"``,
+    ``"parquet"`` or ``"mmap"``, as for the CLI.
+    """
+    if format == "mmap":
+        from .mmap_store import MmapStore
 
-    successes = 0
-    if args.out_dir:
-        if args.format == "csv":
-            paths = save_prices_csv(bars, out_dir=args.out_dir, incremental=args.incremental)
+        store = MmapStore(out_dir)
+
+    out: Dict[str, tuple[pd.Timestamp, pd.Timestamp] | None] = {}
+    for t in tickers:
+        name = t.replace("^", "_")
+        if format == "csv":
+            out[t] = _csv_date_range(f"{out_dir}/{name}_D.csv")
+        elif format == "mmap":
+            dates = store.arrays(t)["Date"]
+            out[t] = (pd.Timestamp(dates[0]), pd.Timestamp(dates[-1])) if len(dates) else None
+        elif partitioned:
+            from .store import _stored_date_range
+
+            out[t] = _stored_date_range(out_dir, t)
         else:
-            paths = save_prices_parquet(bars, out_dir=args.out_dir)
-        print("Saved:", paths)
-        successes = len(paths)
-    else:
-        for t, df in bars.items():
-            if args.table:
-                if df.empty:
-                    print(f"{t}: no data")
-                else:
-                    print(f"{t}:")
-                    print(df.to_string(index=False))
-            else:
-                src = df["Source"].iloc[-1] if not df.empty else "NA"
-                print(f"{t}: rows={len(df)} source={src}")
-        successes = sum(1 for df in bars.values() if not df.empty)
+            try:
+                dates = pd.read_parquet(f"{out_dir}/{name}_D.parquet", columns=["Date"])["Date"]
+            except FileNotFoundError:
+                dates = pd.Series(dtype="datetime64[ns]")
+            out[t] = (dates.min(), dates.max()) if not dates.empty else None
+    return out
 
-    return 0 if successes > 0 else 2
 
+def up_to_date(
+    tickers: List[str],
+    end: str,
+    out_dir: str,
+    *,
+    format: str = "csv",
+    partitioned: bool = False,
+) -> List[str]:
+    """Return the tickers whose bars under ``out_dir`` already reach ``end``.
 
-def cli() -> None:  # console_scripts entrypoint
-    sys.exit(main())
+    A ticker is current when its stored bars (see :func:`stored_ranges`)
+    reach its last completed session on or before ``end`` (see
+    :func:`marketdata.calendars.session_ends`); an incremental fetch could
+    only return bars already written. Where the stored bars begin is not
+    considered: a first bar after the requested start is usually just the
+    listing date. Tickers flagged for a refetch (see
+    :func:`pending_refetch`) never are.
+    """
+    ends = session_ends(tickers, _weekend_safe_end(pd.Timestamp(end)))
+    ranges = stored_ranges(tickers, out_dir, format=format, partitioned=partitioned)
+    flagged = pending_refetch(out_dir)
+    return [
+        t
+        for t, bounds in ranges.items()
+        if bounds is not None
+        and t.upper() not in flagged
+        and bounds[1] >= ends[t]
+    ]
+
+
+def _cached_stooq(cache_dir: str) -> StooqProvider:
+    """Stooq provider keeping raw full-history downloads under ``cache_dir``."""
+    return StooqProvider(
+        cache_dir=os.path.join(cache_dir, "stooq"),
+        max_concurrency=STOOQ.limiter.max_concurrency,
+        rate=STOOQ.limiter.rate,
+    )
 
 
 if __name__ == "__main__":  # pragma: no cover
-    sys.exit(main())
+    raise SystemExit(main())
@@ -0,0 +1,413 @@
+from __future__ import annotations
+
+import io
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+import pandas as pd
+
+from .metrics import RunMetrics
+
+log = logging.getLogger(__name__)
+
+
+def _stooq_symbol(symbol: str) -> str:
+    """Map Yahoo-style symbols to stooq symbols."""
+    parts = symbol.split(".")
+    if len(parts) == 2:
+        ticker, suffix = parts
+        mapping = {"L": "uk", "PA": "fr", "MI": "it"}
+        return f"{ticker.lower()}.{mapping.get(suffix.upper(), suffix.lower())}"
+    return f"{symbol.lower()}.us"
+
+
+def _split_yahoo_frame(raw: pd.DataFrame | None, tickers: List[str]) -> Dict[str, pd.DataFrame]:
+    """Split a (possibly multi-ticker) ``yf.download`` result into per-symbol frames.
+
+    Multi-ticker downloads come back with ``(ticker, field)`` MultiIndex
+    columns and the union of all trading dates, so symbols Yahoo could not
+    resolve show up as all-NaN rows; those are dropped to an empty frame.
+    """
+    out: Dict[str, pd.DataFrame] = {t: pd.DataFrame() for t in tickers}
+    if raw is None or raw.empty:
+        return out
+
+    if not isinstance(raw.columns, pd.MultiIndex):
+        # Flat columns only make sense for a single-symbol request.
+        if len(tickers) == 1:
+            out[tickers[0]] = raw
+        return out
+
+    # Locate the column level holding the symbols (level 0 with group_by="ticker").
+    wanted = {t.upper() for t in tickers}
+    for level in range(raw.columns.nlevels):
+        names = {str(v).upper(): v for v in raw.columns.get_level_values(level).unique()}
+        if wanted & set(names):
+            break
+    else:
+        return out
+
+    for t in tickers:
+        key = names.get(t.upper())
+        if key is None:
+            continue
+        df = raw.xs(key, axis=1, level=level).dropna(how="all")
+        df.columns.name = None
+        out[t] = df
+    return out
+
+
+class RateLimiter:
+    """Bound in-flight requests and request rate for a single provider.
+
+    Used as a context manager around one network request. ``max_concurrency``
+    caps simultaneous requests; ``rate`` (requests per second, ``None`` for
+    unlimited) spaces out request starts across all threads sharing the
+    limiter.
+    """
+
+    def __init__(self, max_concurrency: int = 4, rate: float | None = None) -> None:
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.rate = rate
+        self._sem = threading.BoundedSemaphore(self.max_concurrency)
+        self._interval = 1.0 / rate if rate else 0.0
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+
+    def acquire(self, cancelled: threading.Event | None = None) -> bool:
+        """Take a request slot; returns ``False``, holding nothing, once ``cancelled`` is set."""
+        while not self._sem.acquire(timeout=None if cancelled is None else 0.05):
+            if cancelled.is_set():
+                return False
+        if cancelled is not None and cancelled.is_set():
+            self._sem.release()
+            return False
+        if self._interval:
+            with self._lock:
+                now = time.monotonic()
+                wait = self._next_start - now
+                self._next_start = max(now, self._next_start) + self._interval
+            if wait > 0:
+                time.sleep(wait)
+        return True
+
+    def release(self) -> None:
+        self._sem.release()
+
+    def __enter__(self) -> "RateLimiter":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a provider whose circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Stop calling a provider after ``threshold`` consecutive failed attempts.
+
+    Once open, :meth:`allow` refuses calls for ``cooldown`` seconds. After
+    that, calls are let through again; a success closes the breaker, while a
+    single further failure re-opens it for another cool-down.
+    """
+
+    def __init__(self, threshold: int = 5, cooldown: float = 60.0) -> None:
+        self.threshold = max(1, int(threshold))
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return not self.allow()
+
+    def allow(self) -> bool:
+        with self._lock:
+            return self._opened_at is None or time.monotonic() - self._opened_at >= self.cooldown
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+
+
+class Provider:
+    """A market data source with its own limits, retries and circuit breaker.
+
+    Subclasses implement :meth:`download` (one network attempt for a group of
+    symbols, returning raw per-symbol frames). :meth:`fetch` wraps it with the
+    limiter and exponential backoff. Backoff sleeps happen outside the
+    limiter, so a retrying symbol never holds a request slot other symbols
+    could use. Every failed attempt counts towards the breaker; while it is
+    open, :meth:`fetch` raises :class:`CircuitOpenError` without calling out.
+    """
+
+    name = ""
+    retries = 1
+    backoff = 1.0
+    # Intraday intervals served, as (longest window per request, how far back
+    # bars are available); daily bars are always served.
+    intervals: Dict[str, tuple[str, str]] = {}
+
+    def __init__(
+        self,
+        *,
+        max_concurrency: int = 4,
+        rate: float | None = None,
+        failure_threshold: int = 5,
+        cooldown: float = 60.0,
+    ) -> None:
+        self.limiter = RateLimiter(max_concurrency, rate)
+        self.breaker = CircuitBreaker(failure_threshold, cooldown)
+
+    def download(self, tickers: List[str], start: pd.Timestamp, end: pd.Timestamp) -> Dict[str, pd.DataFrame]:
+        raise NotImplementedError
+
+    def download_intraday(
+        self, tickers: List[str], start: pd.Timestamp, end: pd.Timestamp, interval: str
+    ) -> Dict[str, pd.DataFrame]:
+        """Download ``interval`` bars starting in ``start``..``end`` (exclusive), one of :attr:`intervals`."""
+        raise NotImplementedError
+
+    def fetch(
+        self,
+        tickers: List[str],
+        start: pd.Timestamp,
+        end: pd.Timestamp,
+        metrics: RunMetrics | None = None,
+        interval: str = "1d",
+        cancelled: threading.Event | None = None,
+        started: threading.Event | None = None,
+    ) -> Dict[str, pd.DataFrame]:
+        """Download ``tickers`` with retries; re-raises the last error.
+
+        With an intraday ``interval`` (see :attr:`intervals`),
+        :meth:`download_intraday` is called instead of :meth:`download`.
+        With ``metrics``, every attempt's latency, retries and breaker
+        refusals are recorded against this provider's name. Once
+        ``cancelled`` is set, an attempt still waiting for a limiter slot
+        gives up and ``{}`` is returned without calling out. ``started`` is
+        set once an attempt holds a limiter slot and is about to call out.
+        """
+        if interval != "1d" and interval not in self.intervals:
+            raise ValueError(f"{self.name} does not serve {interval} bars")
+        last_err: Exception | None = None
+        for attempt in range(self.retries):
+            if not self.breaker.allow():
+                if metrics is not None:
+                    metrics.inc_circuit_open(self.name)
+                raise CircuitOpenError(f"{self.name} circuit open") from last_err
+            if attempt and metrics is not None:
+                metrics.inc_retry(self.name)
+            if not self.limiter.acquire(cancelled):
+                log.debug("%s: %s request cancelled", ",".join(tickers), self.name)
+                return {}
+            if started is not None:
+                started.set()
+            t0 = time.perf_counter()
+            try:
+                try:
+                    if interval == "1d":
+                        result = self.download(tickers, start, end)
+                    else:
+                        result = self.download_intraday(tickers, start, end, interval)
+                finally:
+                    self.limiter.release()
+            except Exception as e:  # pragma: no cover - network failures
+                last_err = e
+                if metrics is not None:
+                    metrics.observe_request(self.name, time.perf_counter() - t0, ok=False)
+                self.breaker.record_failure()
+                log.debug("%s: %s attempt %d failed (%s)", ",".join(tickers), self.name, attempt + 1, e)
+                if attempt < self.retries - 1 and self.breaker.allow():
+                    time.sleep(self.backoff * 2**attempt)
+            else:
+                if metrics is not None:
+                    metrics.observe_request(self.name, time.perf_counter() - t0)
+                self.breaker.record_success()
+                return result
+        assert last_err is not None
+        raise last_err
+
+
+class YahooProvider(Provider):
+    name = "yahoo"
+    retries = 3
+    # Yahoo's documented limits, with a day's margin on the lookback so a
+    # window starting right at the edge isn't refused.
+    intervals = {
+        "1m": ("7D", "29D"),
+        "2m": ("59D", "59D"),
+        "5m": ("59D", "59D"),
+        "15m": ("59D", "59D"),
+        "30m": ("59D", "59D"),
+        "60m": ("729D", "729D"),
+        "90m": ("59D", "59D"),
+        "1h": ("729D", "729D"),
+    }
+
+    def download(self, tickers: List[str], start: pd.Timestamp, end: pd.Timestamp) -> Dict[str, pd.DataFrame]:
+        import yfinance as yf  # slow to import; only needed once Yahoo is actually called
+
+        raw = yf.download(
+            tickers[0] if len(tickers) == 1 else tickers,
+            start=start,
+            end=end + pd.Timedelta(days=1),  # yfinance end is exclusive
+            progress=False,
+            auto_adjust=False,
+            group_by="ticker",
+        )
+        return _split_yahoo_frame(raw, tickers)
+
+    def download_intraday(
+        self, tickers: List[str], start: pd.Timestamp, end: pd.Timestamp, interval: str
+    ) -> Dict[str, pd.DataFrame]:
+        import yfinance as yf
+
+        raw = yf.download(
+            tickers[0] if len(tickers) == 1 else tickers,
+            start=start,
+            end=end,
+            interval=interval,
+            progress=False,
+            auto_adjust=False,
+            prepost=False,
+            group_by="ticker",
+        )
+        return _split_yahoo_frame(raw, tickers)
+
+
+class StooqProvider(Provider):
+    """Stooq daily CSV downloads over a pooled keep-alive HTTP session.
+
+    Stooq only serves a symbol's entire history, so with ``cache_dir`` the
+    raw payload is kept as ``<cache_dir>/<symbol>.csv`` and reused while it
+    is younger than ``max_age``; any window is then sliced locally.
+    """
+
+    name = "stooq"
+    # Columns Stooq publishes; anything else in the payload is skipped.
+    _dtypes = {"Open": "float64", "High": "float64", "Low": "float64", "Close": "float64", "Volume": "float64"}
+
+    def __init__(
+        self,
+        *,
+        base_url: str = "https://stooq.com/q/d/l/",
+        cache_dir: str | None = None,
+        max_age: pd.Timedelta | str = "12h",
+        **kwargs,
+    ) -> None:
+        super().__init__(**kwargs)
+        self.base_url = base_url
+        self.cache_dir = cache_dir
+        self.max_age = pd.Timedelta(max_age)
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self):
+        with self._session_lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.limiter.max_concurrency)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._session = session
+            return self._session
+
+    def _cache_path(self, sym: str) -> str | None:
+        return os.path.join(self.cache_dir, f"{sym}.csv") if self.cache_dir else None
+
+    def _cached_payload(self, sym: str) -> bytes | None:
+        path = self._cache_path(sym)
+        if path is None:
+            return None
+        try:
+            if time.time() - os.path.getmtime(path) > self.max_age.total_seconds():
+                return None
+            with open(path, "rb") as fh:
+                return fh.read()
+        except FileNotFoundError:
+            return None
+
+    def _store_payload(self, sym: str, payload: bytes) -> None:
+        path = self._cache_path(sym)
+        if path is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(payload)
+        os.replace(tmp_path, path)
+
+    def _parse(self, payload: bytes, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+        header = payload.split(b"\n", 1)[0].decode(errors="replace")
+        if "Date" not in header.split(","):
+            # Unknown symbols come back as a plain "No data" body.
+            return pd.DataFrame()
+        sdf = pd.read_csv(
+            io.BytesIO(payload),
+            usecols=lambda c: c == "Date" or c in self._dtypes,
+            dtype=self._dtypes,
+            parse_dates=["Date"],
+        )
+        sdf = sdf[(sdf["Date"] >= start) & (sdf["Date"] <= end)]
+        if not sdf.empty:
+            # Stooq doesn't provide Adj Close; replicate Close.
+            sdf["Adj Close"] = sdf["Close"]
+        return sdf
+
+    def fetch(
+        self,
+        tickers: List[str],
+        start: pd.Timestamp,
+        end: pd.Timestamp,
+        metrics: RunMetrics | None = None,
+        interval: str = "1d",
+        cancelled: threading.Event | None = None,
+        started: threading.Event | None = None,
+    ) -> Dict[str, pd.DataFrame]:
+        if interval != "1d":
+            raise ValueError(f"{self.name} only serves daily bars")
+        # Fresh cached payloads are served without touching the limiter.
+        out: Dict[str, pd.DataFrame] = {}
+        for t in tickers:
+            payload = self._cached_payload(_stooq_symbol(t))
+            if payload is not None:
+                out[t] = self._parse(payload, start, end)
+        missing = [t for t in tickers if t not in out]
+        if missing:
+            out.update(super().fetch(missing, start, end, metrics, cancelled=cancelled, started=started))
+        return out
+
+    def download(self, tickers: List[str], start: pd.Timestamp, end: pd.Timestamp) -> Dict[str, pd.DataFrame]:
+        out: Dict[str, pd.DataFrame] = {}
+        for t in tickers:
+            sym = _stooq_symbol(t)
+            resp = self.session.get(self.base_url, params={"s": sym, "i": "d"}, timeout=30)
+            resp.raise_for_status()
+            self._store_payload(sym, resp.content)
+            out[t] = self._parse(resp.content, start, end)
+        return out
+
+
+# Shared instances so limits apply across concurrent get_prices calls.
+YAHOO = YahooProvider(max_concurrency=4, rate=4.0)
+STOOQ = StooqProvider(max_concurrency=2, rate=2.0)
@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import shutil
+import time
+from typing import Dict, Iterable, List
+
+import pandas as pd
+
+from .cache import _atomic_write_json
+from .calendars import for_symbol, session_ends
+from .prices import (
+    _weekend_safe_end,
+    iter_prices,
+    pending_refetch,
+    save_prices_csv,
+    save_prices_parquet,
+    stored_ranges,
+)
+
+log = logging.getLogger(__name__)
+
+STATE_NAME = ".refresh.json"
+ARCHIVE_DIR = "_archive"
+
+
+def plan_refresh(
+    tickers: List[str],
+    out_dir: str,
+    *,
+    added: Iterable[str] = (),
+    history_start: str = "2000-01-01",
+    end: str | None = None,
+    lookback: int = 5,
+    format: str = "csv",
+    partitioned: bool = False,
+) -> dict:
+    """Decide what each ticker in the watchlist needs.
+
+    Tickers in ``added``, with nothing stored under ``out_dir`` or flagged
+    for a refetch (see :func:`~marketdata.prices.pending_refetch`) get
+    their full history from ``history_start``; the others are fetched from
+    ``lookback`` sessions before their newest stored bar, so recent
+    revisions are picked up, or skipped when that bar is already their last
+    completed session. Returns ``{"history": [...], "current": [...],
+    "windows": {start: [tickers]}, "refetch": [...]}`` with ``end``
+    resolved; ``refetch`` lists the flagged tickers, whose stored bars
+    should be replaced rather than merged into.
+    """
+    end_dt = _weekend_safe_end(pd.Timestamp(end) if end else pd.Timestamp.today().normalize())
+    added = {t.upper() for t in added}
+    ends = session_ends(tickers, end_dt)
+    ranges = stored_ranges(tickers, out_dir, format=format, partitioned=partitioned)
+    flagged = pending_refetch(out_dir)
+    refetch = [t for t in tickers if t.upper() in flagged]
+
+    history: List[str] = []
+    current: List[str] = []
+    windows: Dict[str, List[str]] = {}
+    for t in tickers:
+        bounds = ranges[t]
+        if t.upper() in added or bounds is None or t.upper() in flagged:
+            history.append(t)
+        elif bounds[1] >= ends[t]:
+            current.append(t)
+        else:
+            start = for_symbol(t).add_sessions(bounds[1], -lookback)
+            windows.setdefault(str(start.date()), []).append(t)
+    if history:
+        windows.setdefault(str(pd.Timestamp(history_start).date()), []).extend(history)
+    return {"end": str(end_dt.date()), "history": history, "current": current, "windows": windows, "refetch": refetch}
+
+
+def archive(
+    tickers: Iterable[str],
+    out_dir: str,
+    archive_dir: str | None = None,
+    *,
+    format: str = "csv",
+    partitioned: bool = False,
+) -> List[str]:
+    """Move the stored bars of ``tickers`` out of ``out_dir``; return those archived.
+
+    Files (and ``Ticker=`` partitions) are moved to ``archive_dir``
+    (``<out_dir>/_archive`` by default, which dataset readers ignore),
+    replacing an older archive of the same ticker. A memory-mapped store
+    can't give up files, so its bars are exported to ``<TICKER>_D.csv``
+    there and the ticker is dropped from the index.
+    """
+    archive_dir = archive_dir or os.path.join(out_dir, ARCHIVE_DIR)
+    tickers = list(tickers)
+    done: List[str] = []
+    if format == "mmap":
+        from .mmap_store import MmapStore, MmapWriter
+
+        store = MmapStore(out_dir)
+        for t in tickers:
+            df = store.frame(t)
+            if not df.empty:
+                save_prices_csv({t: df.copy()}, archive_dir, incremental=False)
+        del store
+        with MmapWriter(out_dir) as writer:
+            done = writer.remove(tickers)
+    else:
+        for t in tickers:
+            if format == "parquet" and partitioned:
+                from .store import _ticker_dir
+
+                src = _ticker_dir(out_dir, t)
+            else:
+                src = os.path.join(out_dir, f"{t.replace('^', '_')}_D.{format}")
+            if not os.path.exists(src):
+                continue
+            dst = os.path.join(archive_dir, os.path.basename(src))
+            os.makedirs(archive_dir, exist_ok=True)
+            if os.path.isdir(dst):
+                shutil.rmtree(dst)
+            shutil.move(src, dst)
+            done.append(t)
+    for t in done:
+        log.info("%s: archived to %s", t, archive_dir)
+    return done
+
+
+def refresh(
+    tickers: List[str],
+    out_dir: str,
+    *,
+    added: Iterable[str] = (),
+    removed: Iterable[str] = (),
+    version: str | None = None,
+    history_start: str = "2000-01-01",
+    end: str | None = None,
+    lookback: int = 5,
+    format: str = "csv",
+    partitioned: bool = False,
+    archive_dir: str | None = None,
+    **options,
+) -> dict:
+    """Bring ``out_dir`` in line with a watchlist, fetching as little as possible.
+
+    ``added`` and ``removed`` are the watchlist changes (see
+    ``watchlist-update``); added names are backfilled from
+    ``history_start``, existing ones only get their latest bars (see
+    :func:`plan_refresh`), names flagged after a split are refetched and
+    rewritten in full, and removed ones are archived (see
+    :func:`archive`). ``version`` identifies the watchlist the changes came
+    from, e.g. its ``last_updated`` stamp: once a refresh of that version
+    has finished, its changes are recorded in ``<out_dir>/.refresh.json``
+    and not applied again. ``options`` go to
+    :func:`~marketdata.prices.iter_prices`; a ``metrics`` option also
+    records the writes.
+
+    Returns a summary with the ``history``, ``updated``, ``current``,
+    ``archived`` and ``failed`` tickers.
+    """
+    tickers = list(dict.fromkeys(t.upper() for t in tickers))
+    state_path = os.path.join(out_dir, STATE_NAME)
+    try:
+        with open(state_path, "r", encoding="utf-8") as fh:
+            state = json.load(fh)
+    except (FileNotFoundError, json.JSONDecodeError):
+        state = {}
+    if version is not None and state.get("version") == version:
+        log.info("refresh: watchlist changes of %s already applied", version)
+        added, removed = (), ()
+
+    plan = plan_refresh(
+        tickers,
+        out_dir,
+        added=added,
+        history_start=history_start,
+        end=end,
+        lookback=lookback,
+        format=format,
+        partitioned=partitioned,
+    )
+    keep = set(tickers)
+    archived = archive(
+        [t.upper() for t in removed if t.upper() not in keep],
+        out_dir,
+        archive_dir,
+        format=format,
+        partitioned=partitioned,
+    )
+    log.info(
+        "refresh: %d full histories, %d updates, %d already current, %d archived",
+        len(plan["history"]),
+        sum(len(g) for g in plan["windows"].values()) - len(plan["history"]),
+        len(plan["current"]),
+        len(archived),
+    )
+
+    metrics = options.get("metrics")
+    mmap_writer = None
+    if format == "mmap":
+        from .mmap_store import MmapWriter
+
+        mmap_writer = MmapWriter(out_dir, metrics=metrics)
+    replace = set(plan["refetch"])
+    written: List[str] = []
+    try:
+        for start, group in plan["windows"].items():
+            for t, df in iter_prices(group, start, plan["end"], **options):
+                if df.empty:
+                    continue
+                incremental = t not in replace
+                if mmap_writer is not None:
+                    paths = mmap_writer.write({t: df}, incremental=incremental)
+                elif format == "csv":
+                    paths = save_prices_csv({t: df}, out_dir, incremental=incremental, metrics=metrics)
+                else:
+                    paths = save_prices_parquet(
+                        {t: df}, out_dir, partitioned=partitioned, incremental=incremental, metrics=metrics
+                    )
+                # The file writers log failures and carry on; only what they wrote counts as refreshed.
+                written.extend(getattr(p, "ticker", p) for p in paths)
+    finally:
+        if mmap_writer is not None:
+            mmap_writer.close()
+
+    history, ok = set(plan["history"]), set(written)
+    fetched = [t for g in plan["windows"].values() for t in g]
+    summary = {
+        "history": plan["history"],
+        "updated": [t for t in fetched if t not in history and t in ok],
+        "current": plan["current"],
+        "archived": archived,
+        "failed": [t for t in fetched if t not in ok],
+    }
+    if version is not None:
+        _atomic_write_json(state_path, {"version": version, "finished_at": time.time(), **summary})
+    return summary
@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+import io
+import json
+import logging
+import os
+import socketserver
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+
+from .cache import Range, _merge_ranges, _missing_ranges
+from .calendars import for_symbol, session_ends
+from .prices import COLUMNS, _weekend_safe_end, iter_prices
+
+log = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8765
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+
+
+class MemoryCache:
+    """Thread-safe LRU of normalized bars keyed by ticker.
+
+    Each entry holds the ticker's bars plus the inclusive date ranges they
+    cover; once the frames together exceed ``max_bytes`` the least recently
+    requested tickers are dropped.
+    """
+
+    def __init__(self, max_bytes: int = 512 << 20) -> None:
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries: OrderedDict[str, Tuple[pd.DataFrame, List[Range], int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, ticker: str, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame | None:
+        """Return bars for ``start``..``end`` if fully covered, else ``None``."""
+        key = ticker.upper()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or _missing_ranges(entry[1], start, end, for_symbol(key)):
+                return None
+            self._entries.move_to_end(key)
+            df = entry[0]
+        return df[(df["Date"] >= start) & (df["Date"] <= end)].reset_index(drop=True)
+
+    def put(self, ticker: str, df: pd.DataFrame, start: pd.Timestamp, end: pd.Timestamp) -> None:
+        """Merge ``df`` in and mark ``start``..``end`` as covered."""
+        key = ticker.upper()
+        with self._lock:
+            old = self._entries.pop(key, None)
+            ranges = [] if old is None else old[1]
+            if old is not None:
+                self.nbytes -= old[2]
+                df = pd.concat([old[0], df], ignore_index=True)
+                df = df.drop_duplicates(subset=["Date"], keep="last").sort_values("Date").reset_index(drop=True)
+            if start <= end:
+                ranges = _merge_ranges(ranges + [(start, end)])
+            size = int(df.memory_usage(deep=True).sum())
+            self._entries[key] = (df, ranges, size)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes and len(self._entries) > 1:
+                dropped, (_, _, dropped_size) = self._entries.popitem(last=False)
+                self.nbytes -= dropped_size
+                log.debug("%s: evicted from memory cache", dropped)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+
+class BarServer:
+    """Serve :func:`marketdata.prices.get_prices` results from a shared memory cache.
+
+    ``memory`` holds the served bars; ``options`` are passed to
+    :func:`~marketdata.prices.iter_prices` for symbols that are not (fully)
+    cached. Fetches in flight are tracked per symbol: a client asking for a
+    symbol another client is already fetching waits for that fetch instead
+    of starting its own, while different symbols are fetched in parallel.
+    Cache hits are answered without waiting.
+    """
+
+    def __init__(self, *, memory: MemoryCache | None = None, **options) -> None:
+        self.memory = memory if memory is not None else MemoryCache()
+        self.options = options
+        self._lock = threading.Lock()
+        # ticker -> future of the (start, end, bars or None) fetch running for it
+        self._inflight: Dict[str, Future] = {}
+
+    def get(self, tickers: List[str], start: str, end: str, *, on_error: str = "warn") -> Dict[str, pd.DataFrame]:
+        tickers = list(dict.fromkeys(t.upper() for t in tickers))
+        start_dt = pd.Timestamp(start)
+        end_dt = _weekend_safe_end(pd.Timestamp(end))
+        # As in iter_prices, nothing past a symbol's last completed session is fetched or cached.
+        ends = session_ends(tickers, end_dt)
+
+        out = {t: self.memory.get(t, start_dt, ends[t]) for t in tickers}
+        while any(df is None for df in out.values()):
+            claimed: List[str] = []
+            waiting: Dict[str, Future] = {}
+            with self._lock:
+                for t in tickers:
+                    if out[t] is None:
+                        if t in self._inflight:
+                            waiting[t] = self._inflight[t]
+                        else:
+                            self._inflight[t] = Future()
+                            claimed.append(t)
+            if claimed:
+                self._fetch(claimed, start_dt, end_dt, ends, out, on_error)
+            for t, fut in waiting.items():
+                lo, hi, df = fut.result()
+                out[t] = self.memory.get(t, start_dt, ends[t])
+                # Empty answers are not cached, so take them from the fetch if it covered this window.
+                if out[t] is None and df is not None and lo <= start_dt and hi >= ends[t]:
+                    out[t] = df[(df["Date"] >= start_dt) & (df["Date"] <= ends[t])].reset_index(drop=True)
+            # Symbols still missing had a fetch for another window (or a failed one); claim them next round.
+        return {t: out[t] for t in tickers}
+
+    def _fetch(
+        self,
+        claimed: List[str],
+        start_dt: pd.Timestamp,
+        end_dt: pd.Timestamp,
+        ends: Dict[str, pd.Timestamp],
+        out: Dict[str, pd.DataFrame | None],
+        on_error: str,
+    ) -> None:
+        """Fetch the ``claimed`` symbols into ``out``, settling each one's in-flight future as it lands."""
+
+        def settle(t: str) -> None:
+            with self._lock:
+                fut = self._inflight.pop(t, None)
+            if fut is not None:
+                fut.set_result((start_dt, ends[t], out[t]))
+
+        try:
+            missing = []
+            for t in claimed:
+                out[t] = self.memory.get(t, start_dt, ends[t])  # another client may have just fetched it
+                if out[t] is None:
+                    missing.append(t)
+                else:
+                    settle(t)
+            for t, df in iter_prices(missing, start_dt, end_dt, on_error=on_error, **self.options):
+                # Empty answers are not cached; they may be transient failures.
+                if not df.empty:
+                    self.memory.put(t, df, start_dt, ends[t])
+                out[t] = df
+                settle(t)
+        finally:
+            # Waiters on a symbol the fetch never answered (it raised) retry it themselves.
+            for t in claimed:
+                settle(t)
+
+
+def _to_json(bars: Dict[str, pd.DataFrame]) -> bytes:
+    parts = []
+    for t, df in bars.items():
+        if df.empty:
+            frame = '{"columns":[],"data":[]}'
+        else:
+            frame = df.to_json(orient="split", index=False, date_format="iso")
+        parts.append(f"{json.dumps(t)}:{frame}")
+    return ("{" + ",".join(parts) + "}").encode()
+
+
+def _to_arrow(bars: Dict[str, pd.DataFrame]) -> bytes:
+    try:
+        import pyarrow as pa
+    except ImportError as e:  # pragma: no cover - optional dep
+        raise ImportError("pyarrow required for Arrow responses: pip install -e .[parquet]") from e
+
+    frames = [df for df in bars.values() if not df.empty]
+    stacked = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=COLUMNS)
+    table = pa.Table.from_pandas(stacked.reindex(columns=COLUMNS), preserve_index=False)
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "marketdata"
+
+    def _send(self, status: int, body: bytes, content_type: str = "application/json") -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:  # noqa: N802 - http.server API
+        url = urlsplit(self.path)
+        bar_server: BarServer = self.server.bar_server  # type: ignore[attr-defined]
+        if url.path == "/health":
+            memory = bar_server.memory
+            self._send(200, json.dumps({"tickers": len(memory), "bytes": memory.nbytes}).encode())
+            return
+        if url.path != "/prices":
+            self._send(404, json.dumps({"error": f"unknown path {url.path}"}).encode())
+            return
+
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            tickers = [t.strip() for t in query["tickers"].split(",") if t.strip()]
+            start, end = query["start"], query["end"]
+            fmt = query.get("format", "json")
+            if fmt not in ("json", "arrow"):
+                raise ValueError(f"unknown format {fmt!r}")
+        except (KeyError, ValueError) as e:
+            self._send(400, json.dumps({"error": f"bad request: {e}"}).encode())
+            return
+
+        try:
+            bars = bar_server.get(tickers, start, end, on_error=query.get("on_error", "warn"))
+            if fmt == "arrow":
+                self._send(200, _to_arrow(bars), ARROW_STREAM)
+            else:
+                self._send(200, _to_json(bars))
+        except Exception as e:
+            log.warning("%s: request failed (%s)", ",".join(tickers), e)
+            self._send(502, json.dumps({"error": str(e)}).encode())
+
+    def log_message(self, format: str, *args) -> None:  # noqa: A002 - http.server API
+        log.debug("%s", format % args)
+
+
+class _UnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        # BaseHTTPRequestHandler expects a (host, port) client address.
+        return request, ("local", 0)
+
+
+def make_server(
+    bar_server: BarServer, *, host: str = "127.0.0.1", port: int = DEFAULT_PORT, socket_path: str | None = None
+) -> socketserver.BaseServer:
+    """Bind an HTTP server for ``bar_server`` on ``host:port`` or a Unix socket."""
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)  # stale socket from a previous run
+        server: socketserver.BaseServer = _UnixHTTPServer(socket_path, _Handler)
+    else:
+        server = ThreadingHTTPServer((host, port), _Handler)
+    server.bar_server = bar_server  # type: ignore[attr-defined]
+    return server
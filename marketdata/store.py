@@ -0,0 +1,346 @@
+from __future__ import annotations
+
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import Executor
+from typing import Dict, List, Sequence
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+from .metrics import RunMetrics
+from .prices import COLUMNS, WrittenFile, _as_normalized, _atomic_to_parquet, _collect_writes, _run_writers
+
+log = logging.getLogger(__name__)
+
+# Intraday bars live in one dataset per interval under <root>/_intraday; the
+# leading underscore keeps readers of a daily dataset at <root> out of them.
+INTRADAY_DIR = "_intraday"
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as e:  # pragma: no cover - optional dep
+        raise ImportError("pyarrow required for the Parquet store: pip install -e .[parquet]") from e
+
+
+def _file_schema(tz: str | None = None):
+    """Schema of each part file (``Ticker`` lives in the partition path).
+
+    Intraday datasets store ``Date`` as UTC timestamps (``tz="UTC"``).
+    """
+    import pyarrow as pa
+
+    prices = [pa.field(c, pa.float64()) for c in ["Open", "High", "Low", "Close", "Adj Close"]]
+    return pa.schema(
+        [pa.field("Date", pa.timestamp("ns", tz=tz))]
+        + prices
+        + [pa.field("Volume", pa.int64()), pa.field("Source", pa.dictionary(pa.int32(), pa.string()))]
+    )
+
+
+def _partition_schema():
+    import pyarrow as pa
+
+    return pa.schema([("Ticker", pa.string()), ("year", pa.int16())])
+
+
+def dataset_root(root: str, interval: str = "1d") -> str:
+    """Return the dataset directory holding ``interval`` bars under ``root``.
+
+    Daily bars use ``root`` itself, intraday ones ``<root>/_intraday/<interval>``.
+    """
+    return root if interval == "1d" else os.path.join(root, INTRADAY_DIR, interval)
+
+
+def _utc(ts) -> pd.Timestamp:
+    ts = pd.Timestamp(ts)
+    return ts.tz_localize("UTC") if ts.tz is None else ts.tz_convert("UTC")
+
+
+def _ticker_dir(root: str, ticker: str) -> str:
+    return os.path.join(root, f"Ticker={quote(ticker.upper(), safe='')}")
+
+
+def _year_dirs(tdir: str) -> List[str]:
+    """Return a ticker's ``year=<YYYY>`` directories holding part files, oldest year first."""
+    try:
+        names = [n for n in os.listdir(tdir) if n.startswith("year=")]
+    except FileNotFoundError:
+        return []
+    dirs = [os.path.join(tdir, n) for n in sorted(names, key=lambda n: int(n[5:]))]
+    return [d for d in dirs if _part_files(d)]
+
+
+def _footer_bounds(files: List[str]) -> tuple[pd.Timestamp, pd.Timestamp] | None:
+    """Return the oldest and newest ``Date`` in ``files`` from their Parquet footers only."""
+    import pyarrow.parquet as pq
+
+    bounds = None
+    for path in files:
+        meta = pq.ParquetFile(path).metadata
+        col = meta.schema.to_arrow_schema().get_field_index("Date")
+        for i in range(meta.num_row_groups):
+            stats = meta.row_group(i).column(col).statistics
+            if stats is not None and stats.has_min_max:
+                lo, hi = pd.Timestamp(stats.min), pd.Timestamp(stats.max)
+                bounds = (lo, hi) if bounds is None else (min(bounds[0], lo), max(bounds[1], hi))
+    return bounds
+
+
+def _stored_date_range(root: str, ticker: str) -> tuple[pd.Timestamp, pd.Timestamp] | None:
+    """Return the oldest and newest stored ``Date`` for ``ticker`` from Parquet footers only.
+
+    Only the footers of the oldest and newest stored years are read.
+    """
+    years = _year_dirs(_ticker_dir(root, ticker))
+    if not years:
+        return None
+    first = _footer_bounds(_part_files(years[0]))
+    last = first if len(years) == 1 else _footer_bounds(_part_files(years[-1]))
+    if first is None or last is None:
+        return first or last
+    return first[0], last[1]
+
+
+def _stored_max_date(root: str, ticker: str) -> pd.Timestamp | None:
+    """Return the newest stored ``Date`` for ``ticker`` from the newest year's Parquet footers only."""
+    years = _year_dirs(_ticker_dir(root, ticker))
+    bounds = _footer_bounds(_part_files(years[-1])) if years else None
+    return bounds[1] if bounds is not None else None
+
+
+def _read_parts(files: List[str]) -> pd.DataFrame:
+    """Read a year's part files, later parts winning for a ``Date`` stored twice."""
+    import pyarrow.parquet as pq
+
+    df = pd.concat([pq.read_table(f).to_pandas() for f in sorted(files)], ignore_index=True)
+    return df.drop_duplicates(subset=["Date"], keep="last")
+
+
+# Value columns compared to tell a restated bar from a re-sent one.
+_VALUES = ["Open", "High", "Low", "Close", "Adj Close", "Volume"]
+
+
+def _incremental_parts(
+    tdir: str, df: pd.DataFrame, last: pd.Timestamp | None, max_parts: int
+) -> List[tuple[int, pd.DataFrame, List[str]]]:
+    """Plan an incremental write of ``df`` into a ticker's directory (see :func:`write_dataset`).
+
+    Returns ``(year, bars, replaced)`` per part file to write, where
+    ``replaced`` lists the year's existing parts the new one supersedes.
+    """
+    planned = []
+    for year, part in df.groupby(df["Date"].dt.year, sort=True):
+        files = _part_files(os.path.join(tdir, f"year={year}"))
+        fresh = part["Date"] > last if last is not None else pd.Series(True, index=part.index)
+        if not files or (fresh.all() and len(files) < max_parts):
+            planned.append((year, part, []))
+            continue
+        stored = _read_parts(files)
+        if not fresh.all():
+            missing = ~part["Date"].isin(stored["Date"])
+            old = part[~fresh & ~missing]
+            held = stored.set_index("Date").reindex(old["Date"])
+            same = np.isclose(old[_VALUES].to_numpy(float), held[_VALUES].to_numpy(float), equal_nan=True)
+            if same.all():
+                # Nothing restated: only dates not stored yet are written.
+                part = part[fresh | missing]
+                if part.empty:
+                    continue
+                if len(files) < max_parts:
+                    planned.append((year, part, []))
+                    continue
+        merged = pd.concat([stored, part], ignore_index=True)
+        merged = merged.drop_duplicates(subset=["Date"], keep="last").sort_values("Date")
+        planned.append((year, merged, files))
+    return planned
+
+
+def _write_part(
+    ticker: str, path: str, part: pd.DataFrame, tz: str | None, compression: str, row_group_size: int | None
+):
+    """Write one year of a ticker's bars as a new part file; runs in a writer pool."""
+    t0 = time.perf_counter()
+    part = part.drop(columns=["Ticker"], errors="ignore").assign(Volume=part["Volume"].fillna(0).astype("int64"))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    _atomic_to_parquet(
+        part,
+        path,
+        schema=_file_schema(tz),
+        compression=compression,
+        row_group_size=row_group_size,
+        use_dictionary=["Source"],
+    )
+    seconds = time.perf_counter() - t0
+    return WrittenFile(path, ticker=ticker, rows=len(part), nbytes=os.path.getsize(path), seconds=seconds), None
+
+
+def _part_files(tdir: str) -> List[str]:
+    return [os.path.join(d, name) for d, _, files in os.walk(tdir) for name in files if name.endswith(".parquet")]
+
+
+# Once a year partition would hold more part files than this, an incremental
+# write rewrites it as one file, so appending runs don't pile up small files.
+MAX_PARTS = 16
+
+
+def write_dataset(
+    bars: Dict[str, pd.DataFrame],
+    root: str,
+    *,
+    incremental: bool = True,
+    compression: str = "snappy",
+    row_group_size: int | None = None,
+    metrics: RunMetrics | None = None,
+    interval: str = "1d",
+    workers: int | Executor = 1,
+    processes: bool = False,
+    max_parts: int = MAX_PARTS,
+) -> List[WrittenFile]:
+    """Write bars into a Hive-partitioned ``Ticker=<T>/year=<YYYY>`` dataset.
+
+    Each call adds new ``part-*.parquet`` files, one per ticker and year,
+    each written to a hidden temp file and renamed into place. With
+    ``incremental`` only bars whose ``Date`` isn't stored yet are appended:
+    those newer than the stored maximum (read from file footers), plus any
+    older ones missing from their year, so a window written out of order
+    (say a retried backfill chunk) still lands. A bar sent again for a
+    stored date with different values is a restatement and replaces the
+    stored one: its year is rewritten as a single part holding the stored
+    bars and the new ones. A year that would otherwise grow past
+    ``max_parts`` files is compacted the same way. Without ``incremental``
+    the ticker's old files are removed once its new ones are all in place,
+    as are the files a rewritten year replaces. ``Source`` is
+    dictionary-encoded and ``Ticker`` lives only in the partition path.
+
+    Parts are written on a writer pool and recorded in ``metrics`` as for
+    :func:`~marketdata.prices.save_prices_csv` (``workers``,
+    ``processes``); returns a
+    :class:`~marketdata.prices.WrittenFile` per part file, and a zero-row
+    one for the ticker's directory when it had nothing new to write.
+
+    Intraday bars (an ``interval`` such as ``"5m"``, with UTC ``Date``
+    timestamps) go to their own dataset, see :func:`dataset_root`.
+    """
+    _require_pyarrow()
+
+    intraday = interval != "1d"
+    tz = "UTC" if intraday else None
+    out_dir, root = root, dataset_root(root, interval)
+    jobs: List[tuple] = []
+    stale: Dict[str, List[str]] = {}
+    paths: List[WrittenFile] = []
+    for t, df in bars.items():
+        if df.empty:
+            continue
+
+        df = _as_normalized(df).drop_duplicates(subset=["Date"], keep="last").sort_values("Date")
+        tdir = _ticker_dir(root, t)
+        try:
+            if incremental:
+                last = _stored_max_date(root, t)
+                if intraday and last is not None:
+                    last = _utc(last)
+                planned = _incremental_parts(tdir, df, last, max_parts)
+                stale[t] = [f for _, _, replaced in planned for f in replaced]
+            else:
+                planned = [(year, part, []) for year, part in df.groupby(df["Date"].dt.year, sort=True)]
+                stale[t] = _part_files(tdir)
+        except Exception as e:  # pragma: no cover - unreadable footers
+            log.error("%s: failed to read dataset %s (%s)", t, tdir, str(e))
+            continue
+        if not planned:
+            log.info("%s: dataset already up to date", t)
+            paths.append(WrittenFile(tdir, ticker=t, rows=0, nbytes=0, seconds=0.0, appended=True))
+            continue
+
+        stamp = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+        for year, part, _ in planned:
+            path = os.path.join(tdir, f"year={year}", f"part-{stamp}.parquet")
+            jobs.append((t, path, part, tz, compression, row_group_size))
+
+    results = _run_writers(_write_part, jobs, workers, processes)
+    paths += _collect_writes(results, out_dir, replaced=not incremental and not intraday, metrics=metrics)
+
+    written: Dict[str, int] = {}
+    for p in paths:
+        written[p.ticker] = written.get(p.ticker, 0) + 1
+    for t, old in stale.items():
+        if written.get(t, 0) < sum(job[0] == t for job in jobs):
+            continue  # keep the old files until every new part is in place
+        for path in old:
+            os.remove(path)
+        for year_dir in {os.path.dirname(path) for path in old}:
+            if not os.listdir(year_dir):
+                os.rmdir(year_dir)
+    return paths
+
+
+def load_prices(
+    tickers: Sequence[str],
+    start: str | pd.Timestamp | None = None,
+    end: str | pd.Timestamp | None = None,
+    *,
+    root: str,
+    columns: Sequence[str] | None = None,
+    interval: str = "1d",
+) -> Dict[str, pd.DataFrame]:
+    """Load bars for ``tickers`` from a dataset written by :func:`write_dataset`.
+
+    ``Ticker`` and ``year`` filters prune whole partitions and the ``Date``
+    filter is pushed down to row-group statistics, so only the files and row
+    groups that can match are read. ``columns`` limits the value columns read
+    (``Date`` and ``Ticker`` are always included). Returns frames keyed by
+    ticker like :func:`marketdata.prices.get_prices`; tickers with no stored
+    bars map to an empty frame.
+
+    An intraday ``interval`` reads that interval's dataset under ``root``;
+    its ``Date`` values are UTC and naive ``start``/``end`` are read as UTC.
+    """
+    _require_pyarrow()
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    intraday = interval != "1d"
+    root = dataset_root(root, interval)
+    wanted = [t.upper() for t in tickers]
+    out: Dict[str, pd.DataFrame] = {t: pd.DataFrame() for t in tickers}
+    if not wanted or not os.path.isdir(root):
+        return out
+
+    cols = [c for c in COLUMNS if columns is None or c in columns or c in ("Date", "Ticker")]
+    # An explicit schema avoids opening any file just to discover it.
+    dataset = ds.dataset(
+        root,
+        schema=pa.unify_schemas([_file_schema("UTC" if intraday else None), _partition_schema()]),
+        format="parquet",
+        partitioning=ds.partitioning(_partition_schema(), flavor="hive"),
+    )
+    filt = ds.field("Ticker").isin(wanted)
+    if start is not None:
+        start_dt = _utc(start) if intraday else pd.Timestamp(start)
+        filt &= (ds.field("year") >= start_dt.year) & (ds.field("Date") >= start_dt)
+    if end is not None:
+        end_dt = _utc(end) if intraday else pd.Timestamp(end)
+        filt &= (ds.field("year") <= end_dt.year) & (ds.field("Date") <= end_dt)
+
+    table = dataset.to_table(columns=cols, filter=filt)
+    if table.num_rows == 0:
+        return out
+    df = table.to_pandas()
+    df["Ticker"] = df["Ticker"].astype(str)
+    if "Source" in df.columns:
+        df["Source"] = df["Source"].astype(str)
+    df = df.drop_duplicates(subset=["Ticker", "Date"], keep="last").sort_values(["Ticker", "Date"])
+
+    by_ticker = dict(tuple(df.groupby("Ticker", sort=False)))
+    for t in tickers:
+        part = by_ticker.get(t.upper())
+        if part is not None:
+            out[t] = part[cols].reset_index(drop=True)
+    return out
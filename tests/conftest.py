@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+
+from marketdata import cache
+from marketdata.prices import normalize_batch
+from marketdata.providers import Provider
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    """Point the default cache at a per-test directory, so runs never touch ``~/.cache``."""
+    path = tmp_path / "default-cache"
+    monkeypatch.setattr(cache, "DEFAULT_CACHE_DIR", str(path))
+    return path
+
+
+class RecordingProvider(Provider):
+    """Offline provider returning one bar per weekday and logging each request."""
+
+    def __init__(self, name="yahoo", empty=(), **kwargs):
+        super().__init__(**kwargs)
+        self.name = name
+        self.empty = set(empty)
+        self.requests = []
+
+    def download(self, tickers, start, end):
+        self.requests.append((tuple(tickers), start, end))
+        idx = pd.bdate_range(start, end, name="Date")
+        return {
+            t: pd.DataFrame(
+                {"Open": 1.0, "High": 1.0, "Low": 1.0, "Close": 1.0, "Volume": 5},
+                index=idx[:0] if t in self.empty else idx,
+            )
+            for t in tickers
+        }
+
+
+def make_bars(ticker, dates, close=1.0, *, source="yahoo", volume=100, **columns):
+    """Bars for ``ticker`` on ``dates`` as fetches return them, i.e. :func:`normalize_batch` output.
+
+    ``close`` (a scalar or one value per date) fills every price column;
+    ``columns`` overrides single columns, e.g. ``**{"Adj Close": 9.5}``.
+    """
+    idx = pd.DatetimeIndex(pd.to_datetime(dates), name="Date")
+    prices = dict.fromkeys(["Open", "High", "Low", "Close", "Adj Close"], close)
+    raw = pd.DataFrame({**prices, "Volume": volume, **columns}, index=idx)
+    return normalize_batch({ticker: raw}, source)[ticker]
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+
+from conftest import make_bars
+from marketdata import analytics
+from marketdata.analytics import DerivedCache, resample, returns, rolling_volatility
+
+
+def _universe(n):
+    dates = pd.bdate_range("2024-01-01", periods=n)
+    bars = {}
+    for t, seed in (("AAPL", 0), ("MSFT", 1)):
+        close = 100 * np.exp(np.cumsum(np.random.default_rng(seed).normal(0, 0.01, n)))
+        bars[t] = make_bars(t, dates, close, volume=10, High=close * 1.01, Low=close * 0.99)
+    bars["MSFT"] = bars["MSFT"].iloc[5:].reset_index(drop=True)
+    return bars
+
+
+def test_series_match_per_ticker_loops():
+    bars = _universe(60)
+    r = returns(bars).unstack("Ticker")
+    expected = bars["MSFT"].set_index("Date")["Adj Close"].pct_change()
+    np.testing.assert_allclose(r["MSFT"].dropna(), expected.dropna())
+    # No return spans two tickers.
+    assert r["MSFT"].first_valid_index() == bars["MSFT"]["Date"].iloc[1]
+
+    vol = rolling_volatility(bars, 10).unstack("Ticker")["AAPL"]
+    logret = np.log(bars["AAPL"].set_index("Date")["Adj Close"]).diff()
+    np.testing.assert_allclose(vol.dropna(), (logret.rolling(10).std() * np.sqrt(252)).dropna())
+
+    weekly = resample(bars).loc["AAPL"]
+    first = bars["AAPL"].iloc[:5]
+    assert weekly.index[0] == first["Date"].iloc[-1]
+    assert weekly["Open"].iloc[0] == first["Open"].iloc[0] and weekly["High"].iloc[0] == first["High"].max()
+    assert weekly["Volume"].iloc[0] == 50
+
+
+def _frame(result):
+    return result.to_frame() if isinstance(result, pd.Series) else result
+
+
+def test_cache_recomputes_only_the_changed_tails(tmp_path, monkeypatch):
+    cache = DerivedCache(str(tmp_path))
+    after = _universe(110)
+    before = {t: df.iloc[:-10].copy() for t, df in after.items()}
+    restated = {**after, "MSFT": after["MSFT"].assign(**{"Adj Close": after["MSFT"]["Adj Close"] * 0.98})}
+
+    fed = []
+    real = analytics._returns
+    monkeypatch.setattr(analytics, "_returns", lambda df, *a, **k: fed.append(len(df)) or real(df, *a, **k))
+    check = dict(check_categorical=False, check_index_type=False)
+    for fn in (returns, rolling_volatility, resample):
+        fn(before, cache=cache)
+        fed.clear()
+        pd.testing.assert_frame_equal(_frame(fn(after, cache=cache)), _frame(fn(after)), **check)
+        if fn is returns:
+            # Only each ticker's 10 new bars, plus one bar of warm-up, were fed through.
+            assert fed[0] == 2 * 11
+        elif fn is rolling_volatility:
+            assert fed[0] == 2 * (10 + 21)
+
+        # Unchanged bars are served straight from the cache.
+        fed.clear()
+        fn(after, cache=cache)
+        assert fed == []
+
+        # A restated history is recomputed, and matches an uncached run.
+        pd.testing.assert_frame_equal(_frame(fn(restated, cache=cache)), _frame(fn(restated)), **check)
+
+    names = sorted(p.name for p in tmp_path.glob("*.json"))
+    assert names == ["resample-W-FRI.json", "returns-Adj_Close-1-simple.json", "volatility-Adj_Close-21-252.json"]
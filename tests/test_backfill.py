@@ -0,0 +1,107 @@
+import json
+
+import pandas as pd
+import pytest
+
+from marketdata.backfill import plan_chunks, run_backfill
+from marketdata.providers import Provider
+
+
+class Flaky(Provider):
+    """Offline provider that fails for symbols in ``broken``."""
+
+    retries = 1
+
+    def __init__(self, name, broken=(), **kwargs):
+        super().__init__(failure_threshold=1000, **kwargs)
+        self.name = name
+        self.broken = set(broken)
+        self.requests = []
+
+    def download(self, tickers, start, end):
+        self.requests.append((tuple(tickers), start.year))
+        if self.broken & set(tickers):
+            raise ConnectionError("boom")
+        idx = pd.bdate_range(start, end, name="Date")
+        return {t: pd.DataFrame({c: 1.0 for c in ["Open", "High", "Low", "Close"]}, index=idx) for t in tickers}
+
+
+def test_plan_chunks_splits_tickers_and_years():
+    chunks = plan_chunks(["A", "B", "C"], "2010-01-01", "2019-06-30", chunk_size=2, years_per_chunk=4)
+    assert [(c["tickers"], c["start"], c["end"]) for c in chunks[:3]] == [
+        (["A", "B"], "2010-01-01", "2013-12-31"),
+        (["A", "B"], "2014-01-01", "2017-12-31"),
+        (["A", "B"], "2018-01-01", "2019-06-30"),
+    ]
+    assert len(chunks) == 6 and len({c["id"] for c in chunks}) == 6
+
+
+def test_backfill_resumes_only_failed_chunks(tmp_path):
+    out = tmp_path / "out"
+    kwargs = dict(chunk_size=1, years_per_chunk=1, parallel=2)
+    primary, fallback = Flaky("yahoo", broken={"B"}), Flaky("stooq", broken={"B"})
+    seen = []
+    manifest = run_backfill(
+        ["A", "B"],
+        "2022-01-01",
+        "2023-12-31",
+        str(out),
+        providers=(primary, fallback),
+        progress=lambda done, total, eta: seen.append((done, total)),
+        **kwargs,
+    )
+    status = {c["id"]: c["status"] for c in manifest["chunks"]}
+    assert sorted(status.values()) == ["done", "done", "failed", "failed"]
+    assert seen[-1] == (4, 4)
+    assert len(pd.read_csv(out / "A_D.csv")) == len(pd.bdate_range("2022-01-01", "2023-12-31"))
+    assert json.loads((out / ".backfill.json").read_text())["chunks"] == manifest["chunks"]
+
+    # The rerun only touches B's chunks.
+    primary, fallback = Flaky("yahoo"), Flaky("stooq")
+    manifest = run_backfill(["A", "B"], "2022-01-01", "2023-12-31", str(out), providers=(primary, fallback), **kwargs)
+    assert all(c["status"] == "done" for c in manifest["chunks"])
+    assert {t for req in primary.requests for t in req[0]} == {"B"}
+    assert (out / "B_D.csv").exists()
+
+    with pytest.raises(ValueError):
+        run_backfill(["A", "C"], "2022-01-01", "2023-12-31", str(out), providers=(primary, fallback), **kwargs)
+
+
+class BadYear(Flaky):
+    """Offline provider that fails every request starting in ``year``."""
+
+    def __init__(self, name, year):
+        super().__init__(name)
+        self.year = year
+
+    def download(self, tickers, start, end):
+        if start.year == self.year:
+            raise ConnectionError("boom")
+        return super().download(tickers, start, end)
+
+
+@pytest.mark.parametrize("partitioned", [False, True])
+def test_backfill_parquet_keeps_every_chunk(tmp_path, partitioned):
+    pytest.importorskip("pyarrow")
+    from marketdata.store import load_prices
+
+    out = str(tmp_path / "out")
+    kwargs = dict(format="parquet", partitioned=partitioned, chunk_size=1, years_per_chunk=1)
+    broken = (BadYear("y", 2022), BadYear("s", 2022))
+    first = run_backfill(["A"], "2021-01-01", "2023-12-31", out, providers=broken, **kwargs)
+    assert [c["status"] for c in first["chunks"]] == ["done", "failed", "done"]
+
+    # The retried middle year lands even though newer bars are already stored.
+    again = run_backfill(["A"], "2021-01-01", "2023-12-31", out, providers=(Flaky("y"), Flaky("s")), **kwargs)
+    assert all(c["status"] == "done" for c in again["chunks"])
+    df = load_prices(["A"], root=out)["A"] if partitioned else pd.read_parquet(f"{out}/A_D.parquet")
+    assert df["Date"].tolist() == list(pd.bdate_range("2021-01-01", "2023-12-31"))
+
+
+def test_backfill_fails_chunks_whose_bars_were_not_written(tmp_path, monkeypatch):
+    from marketdata import backfill
+
+    monkeypatch.setattr(backfill, "save_prices_csv", lambda bars, out_dir, incremental: [])
+    manifest = run_backfill(["A"], "2023-01-01", "2023-12-31", str(tmp_path), providers=(Flaky("y"), Flaky("s")))
+    assert manifest["chunks"][0]["status"] == "failed"
+    assert manifest["chunks"][0]["error"] == "failed to write A"
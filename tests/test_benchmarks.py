@@ -0,0 +1,22 @@
+from benchmarks.bench_prices import compare, run_suite
+
+
+def test_benchmark_suite_smoke():
+    report = run_suite([3], history=20, workers=2, batch_size=2)
+    result = report["results"]["3"]
+    assert result["rows"] == 60
+    assert result["bytes_written"]["csv"] > 0
+    assert set(result["stages_sec"]) >= {"fetch", "normalize", "save_csv", "save_csv_parallel", "save_csv_incremental"}
+    assert compare(report, report) == []
+
+
+def test_benchmark_compare_flags_regressions():
+    base = {"results": {"10": {"tickers_per_sec": 100.0, "peak_rss_mb": 50.0, "stages_sec": {"fetch": 1.0}, "bytes_written": {}}}}
+    slow = {"results": {"10": {"tickers_per_sec": 50.0, "peak_rss_mb": 50.0, "stages_sec": {"fetch": 2.0}, "bytes_written": {}}}}
+    lines = compare(slow, base, tolerance=0.25)
+    assert len(lines) == 2
+    assert any("tickers_per_sec" in line for line in lines)
+    assert compare(base, slow) == []
+
+    slow["results"]["10"]["stages_sec"]["save_csv_parallel"] = 1.0
+    assert compare(slow, base)[-1] == "10 tickers: stages_sec.save_csv_parallel missing from baseline"
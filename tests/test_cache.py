@@ -0,0 +1,132 @@
+import pandas as pd
+
+from conftest import RecordingProvider
+from marketdata import prices as mp
+from marketdata.cache import BarCache, NegativeCache, _missing_ranges
+
+D = pd.Timestamp
+
+
+def test_missing_ranges():
+    covered = [(D("2024-01-08"), D("2024-01-12")), (D("2024-01-22"), D("2024-01-26"))]
+    assert _missing_ranges([], D("2024-01-01"), D("2024-01-05")) == [(D("2024-01-01"), D("2024-01-05"))]
+    assert _missing_ranges(covered, D("2024-01-08"), D("2024-01-12")) == []
+    assert _missing_ranges(covered, D("2024-01-03"), D("2024-01-26")) == [
+        (D("2024-01-03"), D("2024-01-07")),
+        (D("2024-01-13"), D("2024-01-21")),
+    ]
+    # A weekend-only gap between two cached weeks needs no fetch.
+    assert _missing_ranges(covered + [(D("2024-01-15"), D("2024-01-19"))], D("2024-01-08"), D("2024-01-26")) == []
+
+
+def test_get_prices_fetches_only_uncached_gaps(tmp_path):
+    yahoo, stooq = RecordingProvider(), RecordingProvider("stooq")
+    cache = BarCache(str(tmp_path / "cache"))
+
+    first = mp.get_prices(["AAPL", "MSFT"], "2024-01-08", "2024-01-12", providers=(yahoo, stooq), cache=cache)
+    assert len(first["AAPL"]) == 5
+    assert len(yahoo.requests) == 2
+
+    # Same window again, from a fresh cache object: no network at all.
+    cache = BarCache(str(tmp_path / "cache"))
+    again = mp.get_prices(["AAPL", "MSFT"], "2024-01-08", "2024-01-12", providers=(yahoo, stooq), cache=cache)
+    assert len(yahoo.requests) == 2
+    pd.testing.assert_frame_equal(again["AAPL"], first["AAPL"])
+
+    # A wider window only fetches the new week, batched across both tickers.
+    wider = mp.get_prices(
+        ["AAPL", "MSFT"], "2024-01-08", "2024-01-19", batch_size=10, providers=(yahoo, stooq), cache=cache
+    )
+    assert yahoo.requests[2:] == [(("AAPL", "MSFT"), D("2024-01-13"), D("2024-01-19"))]
+    assert len(wider["MSFT"]) == 10
+    assert wider["MSFT"]["Date"].is_monotonic_increasing
+    assert stooq.requests == []
+
+
+def test_bar_cache_size_eviction(tmp_path):
+    cache = BarCache(str(tmp_path))
+    df = pd.DataFrame({"Date": [D("2024-01-05")], "Close": [1.0]})
+    cache.store("OLD", df, D("2024-01-05"), D("2024-01-05"))
+    cache.store("NEW", df, D("2024-01-05"), D("2024-01-05"))
+    cache.index["OLD"]["accessed_at"] -= 60
+    # Room for one entry only: the least recently read one goes.
+    cache.max_bytes = cache.index["NEW"]["bytes"]
+    cache.evict()
+    assert list(cache.index) == ["NEW"]
+    assert not (tmp_path / "bars" / "OLD.pkl").exists()
+    assert list(BarCache(str(tmp_path)).index) == ["NEW"]
+
+
+def test_bar_cache_ttl(tmp_path):
+    cache = BarCache(str(tmp_path), ttl="1h")
+    df = pd.DataFrame({"Date": [D("2024-01-05")], "Close": [1.0]})
+    cache.store("AAPL", df, D("2024-01-05"), D("2024-01-05"))
+    assert cache.missing("AAPL", D("2024-01-05"), D("2024-01-05")) == []
+    cache.index["AAPL"]["ranges"][0][2] -= 7200
+    assert cache.missing("AAPL", D("2024-01-05"), D("2024-01-05")) == [(D("2024-01-05"), D("2024-01-05"))]
+
+
+def test_bar_cache_ttl_survives_later_writes(tmp_path):
+    cache = BarCache(str(tmp_path), ttl="1h")
+    old = pd.DataFrame({"Date": [D("2024-01-04")], "Close": [1.0]})
+    cache.store("AAPL", old, D("2024-01-04"), D("2024-01-04"))
+    cache.index["AAPL"]["ranges"][0][2] -= 3000
+    # A fresh adjacent write merges ranges but keeps the older write time...
+    cache.store("AAPL", old.assign(Date=D("2024-01-05")), D("2024-01-05"), D("2024-01-05"))
+    assert cache.missing("AAPL", D("2024-01-04"), D("2024-01-05")) == []
+    # ...so the stale Jan 4 bar still expires on schedule and is fetched again.
+    cache.index["AAPL"]["ranges"][0][2] -= 1200
+    assert cache.missing("AAPL", D("2024-01-04"), D("2024-01-05")) == [(D("2024-01-04"), D("2024-01-05"))]
+    assert "AAPL" not in BarCache(str(tmp_path)).index
+
+
+
+def _recent_window():
+    end = pd.Timestamp.today().normalize()
+    return str((end - pd.Timedelta(days=10)).date()), str(end.date())
+
+
+def test_negative_cache_skips_dead_symbols(tmp_path):
+    start, end = _recent_window()
+    yahoo, stooq = RecordingProvider(empty={"DEAD"}), RecordingProvider("stooq", empty={"DEAD"})
+    neg = NegativeCache(str(tmp_path))
+
+    bars = mp.get_prices(["AAPL", "DEAD"], start, end, providers=(yahoo, stooq), negative_cache=neg)
+    assert bars["DEAD"].empty and not bars["AAPL"].empty
+    assert [r[0] for r in stooq.requests] == [("DEAD",)]
+
+    # Next run (fresh object, same directory): DEAD never reaches a provider.
+    yahoo.requests.clear()
+    stooq.requests.clear()
+    bars = mp.get_prices(["AAPL", "DEAD"], start, end, providers=(yahoo, stooq), negative_cache=NegativeCache(str(tmp_path)))
+    assert list(bars) == ["AAPL", "DEAD"] and bars["DEAD"].empty
+    assert [r[0] for r in yahoo.requests] == [("AAPL",)]
+    assert stooq.requests == []
+
+    NegativeCache(str(tmp_path)).clear()
+    assert not NegativeCache(str(tmp_path)).is_dead("DEAD")
+
+
+def test_negative_cache_only_records_recent_empty_answers(tmp_path):
+    class Down(RecordingProvider):
+        def download(self, tickers, start, end):
+            raise ConnectionError("yahoo down")
+
+    empty_stooq = RecordingProvider("stooq", empty={"NEW"})
+    neg = NegativeCache(str(tmp_path), expiry="1h")
+
+    # A historical window from before a listing says nothing about liveness.
+    mp.get_prices(["NEW"], "2001-01-01", "2001-02-01", providers=(RecordingProvider(empty={"NEW"}), empty_stooq), negative_cache=neg)
+    assert not neg.is_dead("NEW")
+
+    # Nor does an empty fallback while the primary provider is failing.
+    down = Down()
+    down.retries = 1
+    start, end = _recent_window()
+    mp.get_prices(["NEW"], start, end, providers=(down, empty_stooq), negative_cache=neg)
+    assert not neg.is_dead("NEW")
+
+    mp.get_prices(["NEW"], start, end, providers=(RecordingProvider(empty={"NEW"}), empty_stooq), negative_cache=neg)
+    assert neg.is_dead("NEW")
+    neg.entries["NEW"] -= 7200
+    assert not neg.is_dead("NEW")
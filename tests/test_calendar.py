@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+
+from conftest import RecordingProvider
+from marketdata import calendars
+from marketdata import prices as mp
+from marketdata.cache import BarCache, _missing_ranges
+from marketdata.calendars import UK, US, WEEKDAYS, for_symbol, session_ends
+
+D = pd.Timestamp
+
+
+def test_holiday_tables():
+    assert calendars.easter(2024) == D("2024-03-31").date()
+    assert calendars.easter(2025) == D("2025-04-20").date()
+    # Good Friday, July 4th observed on a Friday, Juneteenth, Christmas.
+    assert not US.is_session("2024-03-29")
+    assert not US.is_session("2020-07-03")
+    assert not US.is_session("2024-06-19")
+    assert US.is_session("2024-12-24")
+    # London closes on Easter Monday, New York doesn't.
+    assert US.is_session("2024-04-01") and not UK.is_session("2024-04-01")
+    # A Saturday Christmas moves both UK holidays to Monday and Tuesday.
+    expected = pd.to_datetime(["2021-12-24", "2021-12-29", "2021-12-30", "2021-12-31"])
+    assert list(UK.sessions("2021-12-24", "2021-12-31")) == list(expected)
+    assert WEEKDAYS.is_session("2024-12-25")
+
+
+def test_vectorized_session_arithmetic():
+    days = pd.to_datetime(["2024-07-04", "2024-07-06", "2024-07-08"])
+    np.testing.assert_array_equal(US.is_session(days), [False, False, True])
+    assert list(US.rollback(days)) == [D("2024-07-03"), D("2024-07-05"), D("2024-07-08")]
+    assert list(US.rollforward(days)) == [D("2024-07-05"), D("2024-07-08"), D("2024-07-08")]
+    assert list(US.add_sessions(days, 1)) == [D("2024-07-05"), D("2024-07-08"), D("2024-07-09")]
+    assert US.add_sessions("2024-07-06", -1) == D("2024-07-05")
+    assert US.count_sessions("2024-12-23", "2025-01-03") == 8
+    np.testing.assert_array_equal(US.count_sessions(days, days), [0, 0, 1])
+    assert US.count_sessions("2024-01-05", "2024-01-01") == 0
+
+
+def test_last_completed_session():
+    # Before the close (plus settling time) the session isn't final yet.
+    assert US.last_completed_session(D("2024-07-03 12:00")) == D("2024-07-02")
+    assert US.last_completed_session(D("2024-07-03 16:45")) == D("2024-07-03")
+    # Over the holiday weekend the newest final bar is still Wednesday's.
+    assert US.last_completed_session(D("2024-07-06 21:00", tz="UTC")) == D("2024-07-05")
+    assert US.last_completed_session(D("2024-07-05 02:00", tz="UTC")) == D("2024-07-03")
+    # 17:00 UTC is after the London close but before New York's.
+    now = D("2024-07-03 17:00", tz="UTC")
+    assert session_ends(["VOD.L", "AAPL"], "2024-07-31", now) == {"VOD.L": D("2024-07-03"), "AAPL": D("2024-07-02")}
+
+
+def test_for_symbol_follows_stooq_suffixes():
+    assert for_symbol("AAPL") is US and for_symbol("^GSPC") is US
+    assert for_symbol("VOD.L") is UK
+    assert for_symbol("MC.PA") is calendars.FR and for_symbol("ENI.MI") is calendars.IT
+    assert for_symbol("7203.T") is WEEKDAYS and for_symbol("EURUSD=X") is WEEKDAYS
+
+
+def test_holiday_gaps_need_no_fetch(tmp_path):
+    covered = [(D("2024-03-25"), D("2024-03-28")), (D("2024-04-02"), D("2024-04-05"))]
+    # Good Friday to Easter Monday holds no London session, but New York trades on the Monday.
+    assert _missing_ranges(covered, D("2024-03-25"), D("2024-04-05"), UK) == []
+    assert _missing_ranges(covered, D("2024-03-25"), D("2024-04-05"), US) == [(D("2024-03-29"), D("2024-04-01"))]
+
+    yahoo, stooq = RecordingProvider(), RecordingProvider("stooq")
+    cache = BarCache(str(tmp_path))
+    mp.get_prices(["AAPL"], "2024-01-02", "2024-01-12", providers=(yahoo, stooq), cache=cache)
+    # Ending the window on Martin Luther King Jr. Day changes nothing to fetch.
+    mp.get_prices(["AAPL"], "2024-01-02", "2024-01-15", providers=(yahoo, stooq), cache=cache)
+    assert len(yahoo.requests) == 1
+
+
+def test_windows_without_completed_sessions_skip_the_network():
+    yahoo, stooq = RecordingProvider(), RecordingProvider("stooq")
+    tomorrow = pd.Timestamp.today().normalize() + pd.Timedelta(days=1)
+    later = tomorrow + pd.Timedelta(days=7)
+    bars = mp.get_prices(["AAPL"], str(tomorrow.date()), str(later.date()), providers=(yahoo, stooq))
+    assert bars["AAPL"].empty
+    assert yahoo.requests == [] and stooq.requests == []
+
+    # Requests are cut at the last completed session, never reaching into one still open.
+    today = pd.Timestamp.today().normalize()
+    mp.get_prices(["AAPL"], str((today - pd.Timedelta(days=20)).date()), str(today.date()), providers=(yahoo, stooq))
+    assert yahoo.requests[0][2] == US.last_completed_session()
+
+
+def test_cli_incremental_skips_tickers_already_current(tmp_path, monkeypatch):
+    fetched = []
+
+    def fake_iter_prices(tickers, start, end, on_error="warn", **kwargs):
+        fetched.extend(tickers)
+        idx = pd.bdate_range(start, end, name="Date")
+        raw = {t: pd.DataFrame({"Open": 1.0, "High": 1.0, "Low": 1.0, "Close": 1.0}, index=idx) for t in tickers}
+        yield from mp.normalize_batch(raw, "yahoo").items()
+
+    monkeypatch.setattr(mp, "iter_prices", fake_iter_prices)
+    argv = ["--tickers", "AAPL,MSFT", "--start", "2024-01-02", "--end", "2024-01-06", "--out-dir", str(tmp_path)]
+    argv += ["--incremental", "--no-cache"]
+    assert mp.main(argv) == 0
+    assert fetched == ["AAPL", "MSFT"]
+    assert mp.up_to_date(["AAPL", "MSFT", "IBM"], "2024-01-06", str(tmp_path)) == ["AAPL", "MSFT"]
+    # A later first bar (say a listing date) doesn't make a ticker stale; only the last one counts.
+    assert mp.up_to_date(["AAPL"], "2024-01-05", str(tmp_path)) == ["AAPL"]
+    assert mp.up_to_date(["AAPL"], "2024-01-09", str(tmp_path)) == []
+
+    fetched.clear()
+    assert mp.main(argv) == 0
+    assert fetched == []
@@ -1,4 +1,5 @@
 import pandas as pd
+import pytest
 from marketdata import prices
 
 
@@ -15,10 +16,10 @@ def test_cli_saves_csv(tmp_path, monkeypatch, capsys):
         "Source": ["yahoo"],
     })
 
-    def fake_get_prices(tickers, start, end, on_error="warn"):
-        return {tickers[0]: df.assign(Ticker=tickers[0])}
+    def fake_iter_prices(tickers, start, end, on_error="warn", **kwargs):
+        yield tickers[0], df.assign(Ticker=tickers[0])
 
-    monkeypatch.setattr(prices, "get_prices", fake_get_prices)
+    monkeypatch.setattr(prices, "iter_prices", fake_iter_prices)
     out_dir = tmp_path / "out"
     rc = prices.main([
         "--tickers",
@@ -52,7 +53,7 @@ def test_cli_watchlist(tmp_path, monkeypatch, capsys):
         }
     )
 
-    def fake_get_prices(tickers, start, end, on_error="warn"):
+    def fake_get_prices(tickers, start, end, on_error="warn", **kwargs):
         return {t: df.assign(Ticker=t) for t in tickers}
 
     monkeypatch.setattr(prices, "get_prices", fake_get_prices)
@@ -71,3 +72,95 @@ def test_cli_watchlist(tmp_path, monkeypatch, capsys):
     assert rc == 0
     captured = capsys.readouterr().out
     assert "AAPL" in captured
+
+
+def test_cli_writes_as_tickers_arrive(tmp_path, monkeypatch):
+    df = pd.DataFrame(
+        {
+            "Date": [pd.Timestamp("2024-01-05")],
+            "Open": [1.0],
+            "High": [1.0],
+            "Low": [1.0],
+            "Close": [1.0],
+            "Adj Close": [1.0],
+            "Volume": [0],
+            "Ticker": ["AAPL"],
+            "Source": ["yahoo"],
+        }
+    )
+    out_dir = tmp_path / "out"
+
+    def fake_iter_prices(tickers, start, end, on_error="warn", **kwargs):
+        yield "AAPL", df
+        # The first ticker is already on disk before the next fetch fails.
+        assert (out_dir / "AAPL_D.csv").exists()
+        raise RuntimeError("provider died")
+
+    monkeypatch.setattr(prices, "iter_prices", fake_iter_prices)
+    with pytest.raises(RuntimeError):
+        prices.main(["--tickers", "AAPL,MSFT", "--start", "2024-01-02", "--end", "2024-01-05", "--out-dir", str(out_dir)])
+    assert len(pd.read_csv(out_dir / "AAPL_D.csv")) == 1
+
+
+def test_cli_mmap_format(tmp_path, monkeypatch):
+    from marketdata import mmap_store
+
+    df = pd.DataFrame(
+        {
+            "Date": [pd.Timestamp("2024-01-05")],
+            "Open": [1.0],
+            "High": [1.0],
+            "Low": [1.0],
+            "Close": [1.0],
+            "Adj Close": [1.0],
+            "Volume": [0],
+            "Ticker": ["AAPL"],
+            "Source": ["yahoo"],
+        }
+    )
+
+    def fake_iter_prices(tickers, start, end, on_error="warn", **kwargs):
+        for t in tickers:
+            yield t, df.assign(Ticker=t)
+
+    monkeypatch.setattr(prices, "iter_prices", fake_iter_prices)
+    out_dir = tmp_path / "mm"
+    argv = ["--tickers", "AAPL,MSFT", "--start", "2024-01-02", "--end", "2024-01-05", "--out-dir", str(out_dir)]
+    rc = prices.main(argv + ["--format", "mmap"])
+    assert rc == 0
+    bars = mmap_store.load_prices(["AAPL", "MSFT"], root=str(out_dir))
+    assert len(bars["AAPL"]) == len(bars["MSFT"]) == 1
+
+
+def test_cli_write_workers_batch_arrivals(tmp_path, monkeypatch):
+    df = pd.DataFrame(
+        {
+            "Date": [pd.Timestamp("2024-01-05")],
+            "Open": [1.0],
+            "High": [1.0],
+            "Low": [1.0],
+            "Close": [1.0],
+            "Adj Close": [1.0],
+            "Volume": [0],
+            "Ticker": ["AAPL"],
+            "Source": ["yahoo"],
+        }
+    )
+    out_dir = tmp_path / "out"
+    batches = []
+    real_save = prices.save_prices_csv
+
+    def fake_iter_prices(tickers, start, end, on_error="warn", **kwargs):
+        for t in tickers:
+            yield t, df.assign(Ticker=t)
+
+    def recording_save(bars, **kwargs):
+        batches.append(sorted(bars))
+        return real_save(bars, **kwargs)
+
+    monkeypatch.setattr(prices, "iter_prices", fake_iter_prices)
+    monkeypatch.setattr(prices, "save_prices_csv", recording_save)
+    argv = ["--tickers", "A,B,C", "--start", "2024-01-02", "--end", "2024-01-05", "--out-dir", str(out_dir)]
+    assert prices.main(argv + ["--write-workers", "2"]) == 0
+    assert batches == [["A", "B"], ["C"]]
+    assert sorted(p.name for p in out_dir.iterdir()) == ["A_D.csv", "B_D.csv", "C_D.csv"]
@@ -0,0 +1,30 @@
+import subprocess
+import sys
+
+import pytest
+
+HEAVY = ("pandas", "numpy", "yfinance", "pyarrow")
+
+
+@pytest.mark.parametrize(
+    "module",
+    ["marketdata.cli", "watchlist.update_watchlist"],
+)
+def test_cli_help_does_not_import_heavy_deps(module):
+    code = (
+        "import sys\n"
+        f"from {module} import main\n"
+        "try:\n"
+        "    main(['--help'])\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        f"print('loaded:' + ','.join(m for m in {HEAVY!r} if m in sys.modules))\n"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert out.stdout.strip().splitlines()[-1] == "loaded:"
+
+
+def test_prices_import_does_not_load_yfinance():
+    code = "import sys, marketdata.prices; print('yfinance' in sys.modules)"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "False"
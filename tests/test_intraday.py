@@ -0,0 +1,118 @@
+import pandas as pd
+import pytest
+
+from marketdata import prices as mp
+from marketdata.intraday import bar_length, iter_intraday, time_windows, update_intraday
+from marketdata.providers import Provider
+
+D = pd.Timestamp
+NOW = D("2024-07-10 17:57", tz="UTC")
+
+
+class IntradayProvider(Provider):
+    """Offline provider serving 5-minute bars in New York time for each requested window."""
+
+    name = "yahoo"
+    intervals = {"5m": ("2D", "10D")}
+
+    def __init__(self):
+        super().__init__(max_concurrency=8)
+        self.requests = []
+
+    def download(self, tickers, start, end):
+        raise AssertionError("daily download used for intraday bars")
+
+    def download_intraday(self, tickers, start, end, interval):
+        self.requests.append((tuple(tickers), start, end, interval))
+        idx = pd.date_range(start, end, freq="5min", inclusive="left").tz_convert("America/New_York")
+        idx = idx[(idx.hour >= 10) & (idx.hour < 16)]
+        close = (idx.asi8 // 10**9 % 1000).astype(float)
+        bars = pd.DataFrame({"Open": close, "High": close, "Low": close, "Close": close, "Volume": 10}, index=idx)
+        return {t: bars for t in tickers}
+
+
+class DailyOnly(Provider):
+    name = "stooq"
+
+    def download(self, tickers, start, end):
+        raise AssertionError("fallback asked for intraday bars it doesn't serve")
+
+
+def test_time_windows_follow_provider_limits():
+    yahoo = IntradayProvider()
+    windows = time_windows("2024-06-20", "2024-07-09", "5m", yahoo, now=NOW)
+    # Clipped to the 10-day lookback, split into 2-day windows, ending with the day.
+    assert windows[0][0] == NOW - pd.Timedelta(days=10)
+    assert windows[-1][1] == D("2024-07-10", tz="UTC")
+    assert all(hi - lo <= pd.Timedelta(days=2) for lo, hi in windows)
+    assert all(a[1] == b[0] for a, b in zip(windows, windows[1:]))
+    assert time_windows("2024-07-11", "2024-07-12", "5m", yahoo, now=NOW) == []
+    with pytest.raises(ValueError):
+        time_windows("2024-07-08", "2024-07-09", "1m", yahoo, now=NOW)
+    with pytest.raises(ValueError):
+        bar_length("3d")
+
+
+def test_windows_are_fetched_concurrently_and_stitched_in_utc():
+    yahoo = IntradayProvider()
+    providers = (yahoo, DailyOnly())
+    kwargs = dict(interval="5m", workers=4, providers=providers, now=NOW)
+    out = dict(iter_intraday(["AAPL", "MSFT"], "2024-07-03", "2024-07-10", **kwargs))
+    assert len(yahoo.requests) == 2 * 4
+    df = out["AAPL"]
+    assert list(df.columns) == mp.COLUMNS
+    assert str(df["Date"].dt.tz) == "UTC"
+    assert df["Date"].is_monotonic_increasing and df["Date"].is_unique
+    assert df["Date"].iloc[0] == D("2024-07-03 14:00", tz="UTC")
+    # The 17:55 bar is still forming at 17:57.
+    assert df["Date"].iloc[-1] == D("2024-07-10 17:50", tz="UTC")
+
+    # get_prices routes intraday intervals the same way.
+    day = str((pd.Timestamp.now(tz="UTC") - pd.Timedelta(days=3)).date())
+    bars = mp.get_prices(["AAPL"], day, day, interval="5m", providers=providers)
+    assert str(bars["AAPL"]["Date"].dt.tz) == "UTC"
+    assert bars["AAPL"]["Date"].dt.date.astype(str).eq(day).all()
+
+
+def test_update_appends_without_rereading(tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    from marketdata import store
+
+    yahoo = IntradayProvider()
+    kwargs = dict(interval="5m", providers=(yahoo, DailyOnly()))
+    first = update_intraday(["AAPL"], "2024-07-08", "2024-07-09", str(tmp_path), now=NOW, **kwargs)
+    assert first and all("_intraday" in p and "Ticker=AAPL" in p for p in first)
+
+    # The next run only asks for bars after the newest stored one...
+    monkeypatch.setattr(pd, "read_parquet", lambda *a, **k: pytest.fail("stored bars reread"))
+    yahoo.requests.clear()
+    later = NOW + pd.Timedelta(days=1)
+    second = update_intraday(["AAPL"], "2024-07-08", "2024-07-11", str(tmp_path), now=later, **kwargs)
+    assert yahoo.requests[0][1] == D("2024-07-09 19:55", tz="UTC") + bar_length("5m")
+    assert len(second) == 1 and second[0] not in first
+
+    # ...and the daily dataset in the same directory doesn't see them.
+    assert store.load_prices(["AAPL"], root=str(tmp_path))["AAPL"].empty
+    loaded = store.load_prices(["AAPL"], "2024-07-09", "2024-07-12", root=str(tmp_path), interval="5m")["AAPL"]
+    assert loaded["Date"].is_unique
+    assert loaded["Date"].iloc[0] == D("2024-07-09 14:00", tz="UTC")
+    assert loaded["Date"].iloc[-1] == D("2024-07-11 17:50", tz="UTC")
+
+
+def test_cli_interval(tmp_path, monkeypatch):
+    from marketdata import intraday
+
+    calls = []
+
+    def fake_update(tickers, start, end, out_dir, *, interval, **options):
+        calls.append((tickers, out_dir, interval, options))
+        return [f"{out_dir}/_intraday/{interval}/Ticker=AAPL/year=2024/part-0.parquet"]
+
+    monkeypatch.setattr(intraday, "update_intraday", fake_update)
+    argv = ["--tickers", "AAPL", "--start", "2024-07-08", "--end", "2024-07-09", "--out-dir", str(tmp_path)]
+    assert mp.main(argv + ["--interval", "5m", "--workers", "4"]) == 0
+    [(tickers, out_dir, interval, options)] = calls
+    assert (tickers, out_dir, interval, options["workers"]) == (["AAPL"], str(tmp_path), "5m", 4)
+
+    with pytest.raises(SystemExit):
+        mp.main(argv + ["--interval", "3d"])
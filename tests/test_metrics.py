@@ -0,0 +1,70 @@
+import json
+import os
+
+import pandas as pd
+
+from marketdata import prices as mp
+from marketdata.metrics import RunMetrics
+from marketdata.providers import Provider
+
+
+class Flaky(Provider):
+    """Offline provider failing its first ``failures`` attempts; ``empty`` symbols return no rows."""
+
+    def __init__(self, name, failures=0, empty=(), **kwargs):
+        super().__init__(**kwargs)
+        self.name = name
+        self.failures = failures
+        self.empty = set(empty)
+
+    def download(self, tickers, start, end):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError(f"{self.name} down")
+        idx = pd.DatetimeIndex([start, end], name="Date")
+        bars = pd.DataFrame({c: [1.0, 2.0] for c in ["Open", "High", "Low", "Close"]}, index=idx)
+        return {t: pd.DataFrame() if t in self.empty else bars for t in tickers}
+
+
+def test_get_prices_records_metrics(tmp_path):
+    yahoo = Flaky("yahoo", failures=1, empty={"B"})
+    yahoo.retries, yahoo.backoff = 2, 0.0
+    stooq = Flaky("stooq")
+    metrics = RunMetrics()
+
+    bars = mp.get_prices(
+        ["A", "B"], "2024-01-02", "2024-01-05", providers=(yahoo, stooq), batch_size=2, metrics=metrics
+    )
+    paths = mp.save_prices_csv(bars, str(tmp_path), metrics=metrics)
+    metrics.finish()
+
+    d = metrics.to_dict()
+    assert d["requests"]["yahoo"]["count"] == 2
+    assert d["request_errors"] == {"yahoo": 1}
+    assert d["retries"] == {"yahoo": 1}
+    assert d["requests"]["stooq"]["count"] == 1
+    assert d["fallbacks"] == 1
+    assert d["stage_seconds"]["normalize"] > 0
+    assert d["rows_written"] == {"A": 2, "B": 2}
+    assert sum(d["bytes_written"].values()) == sum(os.path.getsize(p) for p in paths)
+    assert d["wall_seconds"] == metrics.to_dict()["wall_seconds"]  # frozen by finish()
+
+
+def test_metrics_export_formats(tmp_path):
+    metrics = RunMetrics()
+    metrics.observe_request("yahoo", 0.2)
+    metrics.observe_request("yahoo", 3.0, ok=False)
+    metrics.record_write("AAPL", 10, 512)
+
+    out = tmp_path / "run.json"
+    metrics.write(str(out))
+    assert json.loads(out.read_text())["requests"]["yahoo"]["buckets"]["0.25"] == 1
+
+    prom = tmp_path / "marketdata.prom"
+    metrics.write(str(prom))
+    text = prom.read_text()
+    assert 'marketdata_provider_request_seconds_bucket{provider="yahoo",le="5.0"} 2' in text
+    assert 'marketdata_provider_request_seconds_count{provider="yahoo"} 2' in text
+    assert 'marketdata_provider_request_errors_total{provider="yahoo"} 1' in text
+    assert 'marketdata_bytes_written_total{ticker="AAPL"} 512' in text
+    assert "# TYPE marketdata_run_wall_seconds gauge" in text
@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+
+from conftest import make_bars
+from marketdata import mmap_store
+from marketdata.prices import COLUMNS
+
+
+def test_write_and_memory_map(tmp_path):
+    root = str(tmp_path / "mm")
+    bars = {
+        "AAPL": make_bars("AAPL", pd.bdate_range("2024-01-01", periods=5)),
+        "MSFT": make_bars("MSFT", pd.bdate_range("2024-01-01", periods=3)),
+    }
+    written = mmap_store.write_store(bars, root)
+    assert written == ["AAPL", "MSFT"]
+
+    store = mmap_store.MmapStore(root)
+    arrs = store.arrays("AAPL", "2024-01-02", "2024-01-04")
+    assert isinstance(arrs["Close"], np.memmap)
+    assert len(arrs["Date"]) == 3
+
+    df = store.frame("MSFT")
+    assert list(df.columns) == COLUMNS
+    assert np.shares_memory(df["Close"].to_numpy(), store._maps["Close"])
+    assert df["Date"].tolist() == list(pd.bdate_range("2024-01-01", periods=3))
+    assert (df["Source"] == "yahoo").all() and (df["Ticker"] == "MSFT").all()
+    assert mmap_store.load_prices(["NOPE"], root=root)["NOPE"].empty
+
+
+def test_incremental_append_relocate_and_compact(tmp_path):
+    root = str(tmp_path / "mm")
+    week = pd.bdate_range("2024-01-01", periods=5)
+    mmap_store.write_store({"AAPL": make_bars("AAPL", week), "MSFT": make_bars("MSFT", week)}, root)
+
+    cap = mmap_store._capacity(5)
+    index = mmap_store._read_index(root)
+    assert index["tickers"] == {"AAPL": [0, 5, cap], "MSFT": [cap, 5, cap]} and index["rows"] == 2 * cap
+
+    # New bars go into each run's spare rows; nothing else is rewritten.
+    size = (tmp_path / "mm" / "close-0.f8").stat().st_size
+    more = {"AAPL": make_bars("AAPL", ["2024-01-08"]), "MSFT": make_bars("MSFT", ["2024-01-08", "2024-01-09"])}
+    mmap_store.write_store(more, root)
+    index = mmap_store._read_index(root)
+    assert index["tickers"] == {"AAPL": [0, 6, cap], "MSFT": [cap, 7, cap]} and index["rows"] == 2 * cap
+    assert (tmp_path / "mm" / "close-0.f8").stat().st_size == size
+    assert mmap_store.load_prices(["MSFT"], root=root)["MSFT"]["Date"].iloc[-1] == pd.Timestamp("2024-01-09")
+
+    # Revised bars: the merged rows move to the end, revisions win.
+    revised = make_bars("AAPL", pd.bdate_range("2024-01-05", periods=3), close=2.0, source="stooq")
+    mmap_store.write_store({"AAPL": revised}, root)
+    df = mmap_store.load_prices(["AAPL"], root=root)["AAPL"]
+    assert len(df) == 7
+    assert df["Close"].tolist() == [1.0] * 4 + [2.0] * 3
+    assert df["Source"].astype(str).tolist()[-1] == "stooq"
+
+    # Replacing orphans more rows than are reserved, which triggers compaction.
+    day = pd.bdate_range("2024-02-01", periods=1)
+    bars = {"AAPL": make_bars("AAPL", day), "MSFT": make_bars("MSFT", day)}
+    mmap_store.write_store(bars, root, incremental=False)
+    index = mmap_store._read_index(root)
+    assert index["generation"] == 1 and index["rows"] == 2 * mmap_store._capacity(1)
+    assert sorted(p.name for p in (tmp_path / "mm").iterdir() if p.name.startswith("close")) == ["close-1.f8"]
+    assert len(mmap_store.load_prices(["AAPL"], root=root)["AAPL"]) == 1
+
+
+def test_runs_outgrowing_their_spare_rows(tmp_path):
+    root = str(tmp_path / "mm")
+    days = pd.bdate_range("2024-01-01", periods=200)
+    mmap_store.write_store({"AAPL": make_bars("AAPL", days[:10]), "MSFT": make_bars("MSFT", days[:10])}, root)
+
+    # AAPL outgrows its run and moves to the end with room to spare; MSFT
+    # keeps its place and grows into its spare rows.
+    mmap_store.write_store({"AAPL": make_bars("AAPL", days[10:100]), "MSFT": make_bars("MSFT", days[10:50])}, root)
+    index = mmap_store._read_index(root)
+    cap = mmap_store._capacity(10)
+    assert index["tickers"]["AAPL"] == [2 * cap, 100, mmap_store._capacity(100)]
+    assert index["tickers"]["MSFT"] == [cap, 50, cap]
+
+    # The last run can always grow past its end.
+    mmap_store.write_store({"AAPL": make_bars("AAPL", days[100:])}, root)
+    assert mmap_store._read_index(root)["tickers"]["AAPL"] == [2 * cap, 200, 200]
+    bars = mmap_store.load_prices(["AAPL", "MSFT"], root=root)
+    assert bars["AAPL"]["Date"].tolist() == list(days)
+    assert bars["MSFT"]["Date"].tolist() == list(days[:50])
+
+
+def test_interrupted_write_is_ignored(tmp_path):
+    root = str(tmp_path / "mm")
+    mmap_store.write_store({"AAPL": make_bars("AAPL", pd.bdate_range("2024-01-01", periods=2))}, root)
+    with open(tmp_path / "mm" / "close-0.f8", "ab") as fh:
+        fh.write(b"\0" * 5)  # torn append never made it into the index
+    mmap_store.write_store({"MSFT": make_bars("MSFT", pd.bdate_range("2024-01-01", periods=2))}, root)
+    bars = mmap_store.load_prices(["AAPL", "MSFT"], root=root)
+    assert bars["MSFT"]["Close"].tolist() == [1.0, 1.0]
+
+
+def test_writes_survive_a_writer_that_is_never_closed(tmp_path):
+    root = str(tmp_path / "mm")
+    days = pd.bdate_range("2024-01-01", periods=100)
+    writer = mmap_store.MmapWriter(root)
+    writer.write({"AAPL": make_bars("AAPL", days[:5]), "MSFT": make_bars("MSFT", days[:5])})
+    writer.write({"AAPL": make_bars("AAPL", days[5:10])})  # in place, into the spare rows
+    writer.write({"AAPL": make_bars("AAPL", days[10:])})  # outgrows the run: relocated
+    writer.remove(["MSFT"])
+    del writer  # e.g. the process was killed before close()
+
+    bars = mmap_store.load_prices(["AAPL", "MSFT"], root=root)
+    assert bars["AAPL"]["Date"].tolist() == list(days)
+    assert bars["MSFT"].empty
+
+
+def test_incremental_write_rescales_adj_close(tmp_path):
+    root = str(tmp_path / "mm")
+    mmap_store.write_store({"AAPL": make_bars("AAPL", pd.bdate_range("2024-01-01", periods=10), close=10.0)}, root)
+    fresh = make_bars("AAPL", pd.bdate_range("2024-01-10", periods=5), close=10.0).assign(**{"Adj Close": 9.5})
+    mmap_store.write_store({"AAPL": fresh}, root)
+
+    df = mmap_store.MmapStore(root).frame("AAPL")
+    assert len(df) == 12
+    np.testing.assert_allclose(df["Adj Close"], 9.5)
+
+
+def test_writer_accepts_normalize_batch_output(tmp_path):
+    from marketdata.prices import normalize_batch
+
+    idx = pd.bdate_range("2024-01-01", periods=3, name="Date")
+    raw = {t: pd.DataFrame({"Open": 1.0, "High": 1.0, "Low": 1.0, "Close": 1.0, "Volume": 5}, index=idx) for t in "AB"}
+    bars = normalize_batch(raw, {"A": "yahoo", "B": "stooq"})
+    assert isinstance(bars["A"]["Source"].dtype, pd.CategoricalDtype)
+
+    root = str(tmp_path / "mm")
+    with mmap_store.MmapWriter(root) as writer:
+        assert writer.write(bars) == ["A", "B"]
+    loaded = mmap_store.load_prices(["A", "B"], root=root)
+    assert loaded["B"]["Source"].astype(str).tolist() == ["stooq"] * 3
+    assert loaded["A"]["Date"].tolist() == list(idx)
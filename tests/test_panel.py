@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from marketdata import panel
+from marketdata import prices as mp
+from marketdata.providers import Provider
+
+
+def _raw(n, start="2024-01-01"):
+    idx = pd.bdate_range(start, periods=n, name="Date")
+    return pd.DataFrame({c: np.arange(n, dtype=float) for c in ["Open", "High", "Low", "Close"]}, index=idx)
+
+
+def test_long_and_wide_round_trip():
+    bars = {"MSFT": mp._normalize(_raw(3), "MSFT", "yahoo"), "AAPL": mp._normalize(_raw(2), "AAPL", "stooq")}
+    bars["NONE"] = pd.DataFrame()
+
+    long = panel.to_long(bars, float32=True)
+    assert long.index.names == ["Ticker", "Date"] and long.index.is_monotonic_increasing
+    assert long["Close"].dtype == np.float32
+    assert isinstance(long["Source"].dtype, pd.CategoricalDtype)
+    assert long.loc["MSFT"]["Close"].tolist() == [0.0, 1.0, 2.0]
+    assert long.memory_usage(deep=True).sum() < sum(df.memory_usage(deep=True).sum() for df in bars.values())
+
+    back = panel.from_long(long)
+    assert sorted(back) == ["AAPL", "MSFT"]
+    assert list(back["AAPL"].columns) == mp.COLUMNS
+    assert back["AAPL"]["Source"].tolist() == ["stooq", "stooq"]
+
+    wide = panel.to_wide(bars)
+    assert wide.shape == (3, 4)
+    assert np.isnan(wide["Adj Close"]["AAPL"].iloc[-1])
+    assert panel.from_wide(wide)["AAPL"]["Close"].tolist() == [0.0, 1.0]
+    assert panel.to_wide(long, "Close").columns.tolist() == ["AAPL", "MSFT"]
+
+
+def test_get_prices_output_modes():
+    class Stub(Provider):
+        name = "yahoo"
+
+        def download(self, tickers, start, end):
+            return {t: _raw(3, start) for t in tickers}
+
+    providers = (Stub(), Stub())
+    long = mp.get_prices(["B", "A"], "2024-01-01", "2024-01-03", providers=providers, output="long")
+    assert long.index.get_level_values("Ticker").unique().tolist() == ["A", "B"]
+    wide = mp.get_prices(["B", "A"], "2024-01-01", "2024-01-03", providers=providers, output="wide", float32=True)
+    assert wide["Close"].dtypes.eq(np.float32).all()
+    with pytest.raises(ValueError):
+        mp.get_prices(["A"], "2024-01-01", "2024-01-03", providers=providers, output="table")
@@ -1,5 +1,9 @@
 import pandas as pd
+import time
+
+from conftest import make_bars
 from marketdata.prices import _stooq_symbol, _weekend_safe_end, get_latest_close
+from marketdata.providers import Provider, StooqProvider, YahooProvider
 
 def test_symbol_map():
     assert _stooq_symbol("BP.L") == "bp.uk"
@@ -25,10 +29,11 @@ def test_get_latest_close(monkeypatch):
         "Source": ["yahoo"],
     })
 
-    def fake_get_prices(tickers, start, end, on_error="warn"):
+    def fake_get_prices(tickers, start, end, on_error="warn", **kwargs):
         return {tickers[0]: df}
 
     monkeypatch.setattr("marketdata.prices.get_prices", fake_get_prices)
+    monkeypatch.setattr("marketdata.prices._LATEST_CLOSES", {})
     asof, px = get_latest_close("AAPL")
     assert asof == pd.Timestamp("2024-01-05")
     assert px == 1.0
@@ -131,3 +136,388 @@ def test_save_prices_csv_bad_existing(tmp_path):
         "Source",
     ]
     assert len(out) == 1
+
+
+def test_get_prices_batched(monkeypatch):
+    calls = []
+
+    def fake_yf_download(tickers, **kwargs):
+        calls.append(tickers)
+        idx = pd.DatetimeIndex([pd.Timestamp("2024-01-04"), pd.Timestamp("2024-01-05")], name="Date")
+        fields = ["Open", "High", "Low", "Close", "Adj Close", "Volume"]
+        frames = {}
+        for t in [tickers] if isinstance(tickers, str) else tickers:
+            # DEAD is unknown to Yahoo: present in the columns but all NaN.
+            value = float("nan") if t == "DEAD" else 1.0
+            frames[t] = pd.DataFrame({f: [value, value] for f in fields}, index=idx)
+        return pd.concat(frames, axis=1)
+
+    stooq_calls = []
+
+    class FakeStooq(StooqProvider):
+        def download(self, tickers, start, end):
+            stooq_calls.extend(tickers)
+            return {t: pd.DataFrame() for t in tickers}
+
+    monkeypatch.setattr("yfinance.download", fake_yf_download)
+    from marketdata import prices as mp
+
+    bars = mp.get_prices(
+        ["AAPL", "MSFT", "DEAD", "IBM"],
+        start="2024-01-01",
+        end="2024-01-05",
+        batch_size=3,
+        providers=(YahooProvider(), FakeStooq()),
+    )
+    assert calls == [["AAPL", "MSFT", "DEAD"], "IBM"]
+    assert stooq_calls == ["DEAD"]
+    assert bars["DEAD"].empty
+    for t in ["AAPL", "MSFT", "IBM"]:
+        assert list(bars[t].columns) == mp.COLUMNS
+        assert len(bars[t]) == 2
+        assert (bars[t]["Ticker"] == t).all()
+
+
+class SlowProvider(Provider):
+    """Offline provider that answers every symbol after ``latency`` seconds."""
+
+    def __init__(self, name, latency, empty=(), **kwargs):
+        super().__init__(**kwargs)
+        self.name = name
+        self.latency = latency
+        self.empty = set(empty)
+
+    def download(self, tickers, start, end):
+        time.sleep(self.latency)
+        out = {}
+        for t in tickers:
+            if t in self.empty:
+                out[t] = pd.DataFrame()
+                continue
+            out[t] = pd.DataFrame(
+                {"Open": [1.0], "High": [1.0], "Low": [1.0], "Close": [1.0], "Volume": [10]},
+                index=pd.DatetimeIndex([end], name="Date"),
+            )
+        return out
+
+
+def test_get_prices_concurrent_scaling():
+    from marketdata import prices as mp
+
+    tickers = [f"T{i}" for i in range(8)]
+
+    def run(workers):
+        providers = (
+            SlowProvider("yahoo", 0.1, empty={"T3"}, max_concurrency=8),
+            SlowProvider("stooq", 0.1, max_concurrency=2),
+        )
+        t0 = time.perf_counter()
+        bars = mp.get_prices(tickers, "2024-01-01", "2024-01-05", workers=workers, providers=providers)
+        return bars, time.perf_counter() - t0
+
+    serial, serial_time = run(1)
+    parallel, parallel_time = run(8)
+    assert list(parallel) == tickers
+    assert parallel["T3"]["Source"].iloc[0] == "stooq"
+    assert all(parallel[t]["Source"].iloc[0] == "yahoo" for t in tickers if t != "T3")
+    assert serial_time >= 0.8
+    assert parallel_time < serial_time / 2
+
+
+def test_rate_limiter_bounds_concurrency():
+    from concurrent.futures import ThreadPoolExecutor
+    import threading
+
+    from marketdata.providers import RateLimiter
+
+    limiter = RateLimiter(max_concurrency=2)
+    lock = threading.Lock()
+    active = peak = 0
+
+    def work(_):
+        nonlocal active, peak
+        with limiter:
+            with lock:
+                active += 1
+                peak = max(peak, active)
+            time.sleep(0.02)
+            with lock:
+                active -= 1
+
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        list(pool.map(work, range(12)))
+    assert peak == 2
+
+
+def test_get_prices_on_error_raise_concurrent():
+    import pytest
+
+    from marketdata import prices as mp
+
+    class Broken(Provider):
+        name = "stooq"
+
+        def download(self, tickers, start, end):
+            raise RuntimeError("down")
+
+    providers = (SlowProvider("yahoo", 0.0, empty={"BAD"}), Broken())
+    with pytest.raises(RuntimeError):
+        mp.get_prices(["A", "BAD", "C"], "2024-01-01", "2024-01-05", workers=3, on_error="raise", providers=providers)
+    bars = mp.get_prices(["A", "BAD", "C"], "2024-01-01", "2024-01-05", workers=3, on_error="ignore", providers=providers)
+    assert bars["BAD"].empty and not bars["A"].empty
+
+
+def test_save_prices_csv_appends_in_place(tmp_path):
+    import os
+
+    from marketdata.prices import _read_csv_tail, save_prices_csv
+
+    history = pd.bdate_range("2020-01-01", periods=500)
+    save_prices_csv({"AAPL": make_bars("AAPL", history)}, out_dir=str(tmp_path))
+    path = tmp_path / "AAPL_D.csv"
+    inode = os.stat(path).st_ino
+
+    # Small blocks force the backwards scan across several reads.
+    names, last, tail = _read_csv_tail(str(path), history[-3], block_size=64)
+    assert last == history[-1]
+    assert list(tail["Date"]) == list(history[-3:])
+
+    # Overlapping-but-identical rows plus two new bars: appended, not rewritten.
+    new_dates = list(history[-2:]) + list(pd.bdate_range(history[-1] + pd.Timedelta(days=1), periods=2))
+    save_prices_csv({"AAPL": make_bars("AAPL", new_dates)}, out_dir=str(tmp_path), incremental=True)
+    assert os.stat(path).st_ino == inode
+    out = pd.read_csv(path, parse_dates=["Date"])
+    assert len(out) == 502
+    assert out["Date"].is_monotonic_increasing and out["Date"].is_unique
+
+
+def test_save_prices_csv_rewrites_revised_rows(tmp_path):
+    import os
+
+    from marketdata.prices import save_prices_csv
+
+    history = pd.bdate_range("2024-01-01", periods=10)
+    save_prices_csv({"AAPL": make_bars("AAPL", history)}, out_dir=str(tmp_path))
+    path = tmp_path / "AAPL_D.csv"
+    inode = os.stat(path).st_ino
+
+    save_prices_csv({"AAPL": make_bars("AAPL", history[-1:], close=2.0)}, out_dir=str(tmp_path), incremental=True)
+    assert os.stat(path).st_ino != inode  # atomic replace, not in-place edit
+    out = pd.read_csv(path, parse_dates=["Date"])
+    assert len(out) == 10
+    assert out["Close"].iloc[-1] == 2.0
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_save_prices_csv_torn_tail(tmp_path):
+    from marketdata.prices import save_prices_csv
+
+    history = pd.bdate_range("2024-01-01", periods=5)
+    path = tmp_path / "AAPL_D.csv"
+    make_bars("AAPL", history).to_csv(path, index=False)
+    path.write_text(path.read_text() + "2024-01-08,1.0,1.")  # interrupted append
+
+    save_prices_csv({"AAPL": make_bars("AAPL", pd.bdate_range("2024-01-08", periods=2))}, out_dir=str(tmp_path))
+    out = pd.read_csv(path, parse_dates=["Date"])
+    assert len(out) == 7
+    assert out["Close"].notna().all()
+
+
+def test_iter_prices_streams_with_bounded_in_flight():
+    from marketdata import prices as mp
+
+    class Counting(SlowProvider):
+        started = 0
+
+        def download(self, tickers, start, end):
+            Counting.started += 1
+            return super().download(tickers, start, end)
+
+    tickers = [f"T{i}" for i in range(20)]
+    providers = (Counting("yahoo", 0.01, max_concurrency=8), SlowProvider("stooq", 0.0))
+    it = mp.iter_prices(tickers, "2024-01-01", "2024-01-05", workers=4, max_in_flight=3, providers=providers)
+    first = next(it)
+    assert first[0] in tickers and not first[1].empty
+    # A stalled consumer stops new requests once the in-flight budget is used.
+    time.sleep(0.2)
+    assert Counting.started <= 1 + 3
+    rest = dict(it)
+    assert sorted(rest) == sorted(set(tickers) - {first[0]})
+    assert Counting.started == 20
+
+
+def test_get_latest_closes_batches_and_memoizes(monkeypatch):
+    from marketdata import prices as mp
+
+    calls = []
+
+    def fake_get_prices(tickers, start, end, on_error="warn", **kwargs):
+        calls.append((list(tickers), kwargs.get("batch_size")))
+        return {
+            t: pd.DataFrame() if t == "DEAD" else make_bars(t, ["2024-01-04", "2024-01-05"], close=float(len(t)))
+            for t in tickers
+        }
+
+    monkeypatch.setattr(mp, "get_prices", fake_get_prices)
+    monkeypatch.setattr(mp, "_LATEST_CLOSES", {})
+
+    closes = mp.get_latest_closes(["AAPL", "MSFT", "DEAD", "GE"])
+    assert calls == [(["AAPL", "MSFT", "DEAD", "GE"], 100)]
+    assert closes == {
+        "AAPL": (pd.Timestamp("2024-01-05"), 4.0),
+        "MSFT": (pd.Timestamp("2024-01-05"), 4.0),
+        "GE": (pd.Timestamp("2024-01-05"), 2.0),
+    }
+
+    # Memoized symbols are free; only the new one is fetched.
+    assert mp.get_latest_close("GE") == (pd.Timestamp("2024-01-05"), 2.0)
+    mp.get_latest_closes(["AAPL", "IBM"])
+    assert calls[1:] == [(["IBM"], 100)]
+
+    # Expired entries are fetched again.
+    mp.get_latest_closes(["AAPL"], ttl=0)
+    assert calls[2:] == [(["AAPL"], 100)]
+
+    # The memo keeps only the most recently fetched symbols.
+    monkeypatch.setattr(mp, "LATEST_CLOSES_MAX", 3)
+    mp.get_latest_closes(["A", "B"])
+    assert list(mp._LATEST_CLOSES) == ["IBM", "A", "B"]
+
+
+def test_normalize_batch_vectorized():
+    from marketdata import prices as mp
+
+    idx = pd.DatetimeIndex(["2024-01-02", "2024-01-03"], name="Date")
+    raw = {
+        "aapl": pd.DataFrame({"Open": 1.0, "High": 2.0, "Low": 0.5, "Close": 1.5, "Volume": [10, 20]}, index=idx),
+        "MSFT": pd.DataFrame(
+            {"date": ["2024-01-02"], "open": [3.0], "high": [3.0], "low": [3.0], "close": [3.0], "adj close": [2.9]}
+        ),
+        "BAD": pd.DataFrame({"Close": [1.0]}, index=idx[:1]),
+        "EMPTY": pd.DataFrame(),
+    }
+    stacked = mp.normalize_batch(raw, {"aapl": "yahoo", "MSFT": "stooq", "BAD": "yahoo", "EMPTY": "yahoo"}, split=False)
+    assert list(stacked.columns) == mp.COLUMNS
+    assert stacked.attrs["normalized"]
+    assert isinstance(stacked["Ticker"].dtype, pd.CategoricalDtype)
+    assert stacked["Ticker"].tolist() == ["AAPL", "AAPL", "MSFT"]
+    assert stacked["Source"].tolist() == ["yahoo", "yahoo", "stooq"]
+    assert stacked["Adj Close"].tolist() == [1.5, 1.5, 2.9]  # filled from Close only where missing
+    assert stacked["Volume"].tolist() == [10, 20, 0]
+
+    bars = mp.normalize_batch(raw, "yahoo")
+    assert list(bars) == ["aapl", "MSFT", "BAD", "EMPTY"]
+    assert bars["BAD"].empty and bars["EMPTY"].empty
+    assert bars["MSFT"]["Date"].tolist() == [pd.Timestamp("2024-01-02")]
+    assert list(bars["aapl"].index) == [0, 1] and bars["aapl"].attrs["normalized"]
+
+
+def test_normalize_batch_date_sources(caplog):
+    from marketdata import prices as mp
+
+    prices = {"Open": 1.0, "High": 1.0, "Low": 1.0, "Close": [1.0, 2.0]}
+    dates = ["2024-01-02", "2024-01-03"]
+    raw = {
+        # reset_index() output: a RangeIndex plus the dates in an "index" column
+        "RESET": pd.DataFrame({"index": pd.to_datetime(dates), **prices}),
+        "NAMED": pd.DataFrame(prices, index=pd.Index(dates, name="Date")),
+        "NODATE": pd.DataFrame(prices),
+    }
+    bars = mp.normalize_batch(raw, "yahoo")
+    assert bars["RESET"]["Date"].tolist() == list(pd.to_datetime(dates))
+    assert bars["NAMED"]["Date"].tolist() == list(pd.to_datetime(dates))
+    assert bars["NODATE"].empty
+    assert "NODATE: missing 'Date'" in caplog.text
+
+
+def test_incremental_csv_rescales_adj_close_after_dividend(tmp_path):
+    from marketdata.prices import pending_refetch, save_prices_csv
+
+    stored = make_bars("AAPL", pd.bdate_range("2024-01-02", "2024-01-31"), close=10.0)
+    save_prices_csv({"AAPL": stored}, str(tmp_path))
+
+    # A dividend since the last run: Yahoo now reports every earlier Adj Close 2% lower.
+    fresh = make_bars("AAPL", pd.bdate_range("2024-01-25", "2024-02-09"), close=10.0)
+    fresh["Adj Close"] = 9.8
+    save_prices_csv({"AAPL": fresh}, str(tmp_path))
+
+    saved = pd.read_csv(tmp_path / "AAPL_D.csv", parse_dates=["Date"])
+    assert len(saved) == len(pd.bdate_range("2024-01-02", "2024-02-09"))
+    assert (saved["Adj Close"] - 9.8).abs().max() < 1e-9
+    assert saved["Close"].eq(10.0).all()
+    assert pending_refetch(str(tmp_path)) == {}
+
+
+def test_reconcile_measures_the_factor_before_an_event_in_the_overlap():
+    from marketdata.prices import _reconcile_adjustments
+
+    stored = make_bars("AAPL", pd.bdate_range("2024-01-02", "2024-01-31"), close=10.0)
+    # The overlap runs Jan 25..31 and a 2% dividend went ex on Jan 29: only
+    # bars before it are restated, the last three overlap bars are not.
+    fresh = make_bars("AAPL", pd.bdate_range("2024-01-25", "2024-02-09"), close=10.0)
+    fresh.loc[fresh["Date"] < "2024-01-29", "Adj Close"] = 9.8
+    rescaled, restated = _reconcile_adjustments("AAPL", stored, fresh)
+    assert restated is None
+    assert (rescaled["Adj Close"] - 9.8).abs().max() < 1e-9
+
+    # Likewise a split inside the overlap is still caught.
+    split = make_bars("AAPL", pd.bdate_range("2024-01-25", "2024-02-09"), close=10.0)
+    split.loc[split["Date"] < "2024-01-29", "Close"] = 5.0
+    assert _reconcile_adjustments("AAPL", stored, split)[1] == "close restated x0.5"
+
+
+def test_incremental_csv_flags_split_for_refetch(tmp_path):
+    from marketdata.prices import pending_refetch, save_prices_csv, up_to_date
+
+    save_prices_csv({"AAPL": make_bars("AAPL", pd.bdate_range("2024-01-02", "2024-01-31"), close=100.0)}, str(tmp_path))
+    split = make_bars("AAPL", pd.bdate_range("2024-01-25", "2024-02-09"), close=50.0)
+    save_prices_csv({"AAPL": split}, str(tmp_path))
+
+    assert list(pending_refetch(str(tmp_path))) == ["AAPL"]
+    assert up_to_date(["AAPL"], "2024-02-09", str(tmp_path)) == []
+
+    # Rewriting the full history clears the flag.
+    full = make_bars("AAPL", pd.bdate_range("2024-01-02", "2024-02-09"), close=50.0)
+    save_prices_csv({"AAPL": full}, str(tmp_path), incremental=False)
+    assert pending_refetch(str(tmp_path)) == {}
+
+
+def test_writers_run_on_a_pool_and_report_per_file_stats(tmp_path):
+    import os
+    import pickle
+
+    from marketdata.metrics import RunMetrics
+    from marketdata.prices import WrittenFile, save_prices_csv, save_prices_parquet
+
+    bars = {f"T{i}": make_bars(f"T{i}", pd.bdate_range("2024-01-02", periods=20), close=float(i)) for i in range(6)}
+    serial = save_prices_csv(bars, str(tmp_path / "serial"))
+    metrics = RunMetrics()
+    threaded = save_prices_csv(bars, str(tmp_path / "threads"), workers=3, metrics=metrics)
+    forked = save_prices_csv(bars, str(tmp_path / "procs"), workers=2, processes=True)
+
+    assert [os.path.basename(p) for p in threaded] == [f"T{i}_D.csv" for i in range(6)]
+    for a, b, c in zip(serial, threaded, forked):
+        assert open(a).read() == open(b).read() == open(c).read()
+    assert all(isinstance(p, WrittenFile) and p.rows == 20 and p.nbytes == os.path.getsize(p) for p in forked)
+    assert metrics.bytes_written["T3"] == threaded[3].nbytes and metrics.stage_seconds["write"] > 0
+
+    # Appends report only what was appended; paths still compare and pickle as strings.
+    more = {"T0": make_bars("T0", pd.bdate_range("2024-01-30", periods=2), close=0.0)}
+    (appended,) = save_prices_csv(more, str(tmp_path / "serial"), workers=4)
+    assert appended.appended and appended.rows == 2 and appended == serial[0]
+    assert pickle.loads(pickle.dumps(appended)).nbytes == appended.nbytes
+
+    written = save_prices_parquet(bars, str(tmp_path / "pq"), workers=3)
+    assert [p.rows for p in written] == [20] * 6
+    assert not [f for f in os.listdir(tmp_path / "pq") if f.endswith(".tmp")]
+
+
+def test_writer_processes_are_not_forked():
+    from marketdata.prices import _writer_pool
+
+    # Forking while fetch threads hold locks can deadlock the child.
+    pool = _writer_pool(2, processes=True)
+    try:
+        assert pool._mp_context.get_start_method() in ("forkserver", "spawn")
+    finally:
+        pool.shutdown()
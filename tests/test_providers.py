@@ -0,0 +1,166 @@
+import time
+
+import pandas as pd
+import pytest
+
+from marketdata import prices as mp
+from marketdata.providers import CircuitBreaker, CircuitOpenError, Provider
+
+
+class Stub(Provider):
+    """Offline provider with configurable latency and failure."""
+
+    def __init__(self, name, latency=0.0, fail=False, **kwargs):
+        super().__init__(**kwargs)
+        self.name = name
+        self.latency = latency
+        self.fail = fail
+        self.calls = 0
+
+    def download(self, tickers, start, end):
+        self.calls += 1
+        time.sleep(self.latency)
+        if self.fail:
+            raise ConnectionError(f"{self.name} down")
+        idx = pd.DatetimeIndex([end], name="Date")
+        return {t: pd.DataFrame({"Open": 1.0, "High": 1.0, "Low": 1.0, "Close": 1.0}, index=idx) for t in tickers}
+
+
+def test_circuit_breaker_states():
+    breaker = CircuitBreaker(threshold=2, cooldown=0.05)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.is_open
+    time.sleep(0.06)
+    assert breaker.allow()  # half-open: one probe goes through
+    breaker.record_failure()
+    assert breaker.is_open  # ...and a failed probe re-opens at once
+    time.sleep(0.06)
+    breaker.record_success()
+    assert breaker.allow()
+
+
+def test_open_breaker_routes_straight_to_fallback():
+    yahoo = Stub("yahoo", fail=True, failure_threshold=3, cooldown=60)
+    yahoo.backoff = 0.0
+    stooq = Stub("stooq")
+
+    bars = mp.get_prices(["A", "B", "C"], "2024-01-01", "2024-01-05", providers=(yahoo, stooq))
+    assert all(df["Source"].iloc[0] == "stooq" for df in bars.values())
+    # Three failed attempts on A open the circuit; B and C never call Yahoo.
+    assert yahoo.calls == 3
+    assert stooq.calls == 3
+    with pytest.raises(CircuitOpenError):
+        yahoo.fetch(["D"], pd.Timestamp("2024-01-01"), pd.Timestamp("2024-01-05"))
+
+
+def test_hedged_request_takes_first_valid_answer():
+    slow_yahoo, stooq = Stub("yahoo", latency=0.5), Stub("stooq", latency=0.01)
+    t0 = time.perf_counter()
+    bars = mp.get_prices(["A"], "2024-01-01", "2024-01-05", providers=(slow_yahoo, stooq), hedge_after=0.05)
+    assert time.perf_counter() - t0 < 0.3
+    assert bars["A"]["Source"].iloc[0] == "stooq"
+
+    fast_yahoo, stooq = Stub("yahoo"), Stub("stooq")
+    bars = mp.get_prices(["A"], "2024-01-01", "2024-01-05", providers=(fast_yahoo, stooq), hedge_after=0.05)
+    assert bars["A"]["Source"].iloc[0] == "yahoo"
+    assert stooq.calls == 0
+
+
+
+def test_hedging_is_bounded_and_drops_losers():
+    import threading
+
+    slow_yahoo, stooq = Stub("yahoo", latency=0.3), Stub("stooq", latency=0.4, max_concurrency=1)
+    tickers = [f"T{i}" for i in range(20)]
+    kwargs = dict(batch_size=20, providers=(slow_yahoo, stooq), hedge_after=0.05)
+    bars = mp.get_prices(tickers, "2024-01-01", "2024-01-05", **kwargs)
+    assert all(df["Source"].iloc[0] == "yahoo" for df in bars.values())
+    hedge_threads = [th for th in threading.enumerate() if th.name.startswith("hedge")]
+    assert len(hedge_threads) <= mp.HEDGE_WORKERS
+    # Only HEDGE_SYMBOLS symbols were hedged, and once Yahoo answered, the
+    # ones still waiting on Stooq's single request slot never called out.
+    time.sleep(0.5)
+    assert stooq.calls == 1
+
+
+def test_queued_healthy_primaries_are_not_hedged():
+    # Each request answers well within hedge_after once it holds one of
+    # Yahoo's two slots, though most wait longer than that for a slot.
+    yahoo, stooq = Stub("yahoo", latency=0.05, max_concurrency=2), Stub("stooq")
+    tickers = [f"T{i}" for i in range(16)]
+    kwargs = dict(workers=16, providers=(yahoo, stooq), hedge_after=0.1)
+    bars = mp.get_prices(tickers, "2024-01-01", "2024-01-05", **kwargs)
+    assert all(df["Source"].iloc[0] == "yahoo" for df in bars.values())
+    assert yahoo.calls == 16
+    assert stooq.calls == 0
+
+
+STOOQ_CSV = b"""Date,Open,High,Low,Close,Volume
+2024-01-02,10,11,9,10.5,1000
+2024-01-03,10.5,12,10,11.5,2000
+2024-01-04,11.5,12,11,11,1500
+2024-01-05,11,11.5,10,10.25,1200
+"""
+
+
+@pytest.fixture
+def stooq_server():
+    """Local stand-in for stooq.com serving a fixture CSV per symbol."""
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qs, urlparse
+
+    hits = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            sym = parse_qs(urlparse(self.path).query)["s"][0]
+            hits.append((sym, self.client_address))
+            body = STOOQ_CSV if sym == "aapl.us" else b"No data"
+            self.send_response(200)
+            self.send_header("Content-Type", "text/csv")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/q/d/l/", hits
+    server.shutdown()
+    server.server_close()
+
+
+def test_stooq_payload_cache_and_keep_alive(tmp_path, stooq_server):
+    from marketdata.providers import StooqProvider
+
+    url, hits = stooq_server
+    stooq = StooqProvider(base_url=url, cache_dir=str(tmp_path))
+    D = pd.Timestamp
+
+    first = stooq.fetch(["AAPL"], D("2024-01-02"), D("2024-01-03"))["AAPL"]
+    assert list(first["Close"]) == [10.5, 11.5]
+    assert first["Volume"].dtype == "float64"
+    assert list(first.columns) == ["Date", "Open", "High", "Low", "Close", "Volume", "Adj Close"]
+
+    # An overlapping window is sliced from the cached payload: no new request.
+    second = stooq.fetch(["AAPL"], D("2024-01-03"), D("2024-01-05"))["AAPL"]
+    assert list(second["Close"]) == [11.5, 11, 10.25]
+    assert len(hits) == 1
+
+    # Unknown symbols are an empty answer, not an error; both reuse one connection.
+    assert stooq.fetch(["NOPE"], D("2024-01-02"), D("2024-01-05"))["NOPE"].empty
+    assert len(hits) == 2
+    assert hits[0][1] == hits[1][1]
+
+    # Stale payloads are downloaded again.
+    stale = StooqProvider(base_url=url, cache_dir=str(tmp_path), max_age="0s")
+    stale.fetch(["AAPL"], D("2024-01-02"), D("2024-01-05"))
+    assert len(hits) == 3
@@ -0,0 +1,124 @@
+import json
+
+import pandas as pd
+import pytest
+
+from conftest import RecordingProvider, make_bars
+from marketdata import prices as mp
+from marketdata.refresh import plan_refresh, refresh
+
+D = pd.Timestamp
+
+
+def _store(out_dir, ticker, start, end):
+    mp.save_prices_csv({ticker: make_bars(ticker, pd.bdate_range(start, end))}, str(out_dir))
+
+
+def test_plan_refresh(tmp_path):
+    _store(tmp_path, "OLD", "2024-01-02", "2024-03-01")
+    _store(tmp_path, "DONE", "2024-01-02", "2024-03-08")
+    plan = plan_refresh(["OLD", "DONE", "NEW"], str(tmp_path), history_start="2020-01-01", end="2024-03-08")
+    assert plan["history"] == ["NEW"] and plan["current"] == ["DONE"]
+    # Existing names restart a few sessions before their newest bar.
+    assert plan["windows"] == {"2024-02-23": ["OLD"], "2020-01-01": ["NEW"]}
+
+
+def test_refresh_applies_watchlist_changes_once(tmp_path):
+    _store(tmp_path, "AAPL", "2024-01-02", "2024-03-01")
+    _store(tmp_path, "GONE", "2024-01-02", "2024-03-01")
+    yahoo, stooq = RecordingProvider(), RecordingProvider("stooq")
+    kwargs = dict(history_start="2023-01-02", end="2024-03-08", lookback=2, providers=(yahoo, stooq))
+
+    summary = refresh(
+        ["AAPL", "MSFT"], str(tmp_path), added=["MSFT"], removed=["GONE"], version="v1", **kwargs
+    )
+    assert summary == {
+        "history": ["MSFT"],
+        "updated": ["AAPL"],
+        "current": [],
+        "archived": ["GONE"],
+        "failed": [],
+    }
+    assert sorted(yahoo.requests) == [
+        (("AAPL",), D("2024-02-28"), D("2024-03-08")),
+        (("MSFT",), D("2023-01-02"), D("2024-03-08")),
+    ]
+    assert not (tmp_path / "GONE_D.csv").exists()
+    assert len(pd.read_csv(tmp_path / "_archive" / "GONE_D.csv")) == 44
+    assert pd.read_csv(tmp_path / "AAPL_D.csv")["Date"].iloc[-1] == "2024-03-08"
+    assert json.loads((tmp_path / ".refresh.json").read_text())["version"] == "v1"
+
+    # The same watchlist again: everything is current, MSFT is not refetched.
+    yahoo.requests.clear()
+    summary = refresh(["AAPL", "MSFT"], str(tmp_path), added=["MSFT"], removed=["GONE"], version="v1", **kwargs)
+    assert summary["current"] == ["AAPL", "MSFT"] and summary["history"] == []
+    assert yahoo.requests == []
+
+
+def test_refresh_reports_tickers_whose_write_failed(tmp_path, monkeypatch):
+    _store(tmp_path, "AAPL", "2024-01-02", "2024-03-01")
+    _store(tmp_path, "MSFT", "2024-01-02", "2024-03-01")
+    write = mp._write_csv_file
+
+    def failing_write(ticker, path, df, incremental):
+        if ticker == "MSFT":
+            raise OSError("disk full")
+        return write(ticker, path, df, incremental)
+
+    monkeypatch.setattr(mp, "_write_csv_file", failing_write)
+    yahoo, stooq = RecordingProvider(), RecordingProvider("stooq")
+    summary = refresh(["AAPL", "MSFT"], str(tmp_path), end="2024-03-08", lookback=2, providers=(yahoo, stooq))
+    assert summary["updated"] == ["AAPL"]
+    assert summary["failed"] == ["MSFT"]
+    assert pd.read_csv(tmp_path / "MSFT_D.csv")["Date"].iloc[-1] == "2024-03-01"
+
+
+def test_cli_refresh_reads_changes_from_watchlist(tmp_path, monkeypatch):
+    calls = []
+
+    def fake_refresh(tickers, out_dir, **kwargs):
+        calls.append((tickers, kwargs["added"], kwargs["removed"], kwargs["version"]))
+        return {"history": kwargs["added"], "updated": [], "current": [], "archived": [], "failed": []}
+
+    monkeypatch.setattr("marketdata.refresh.refresh", fake_refresh)
+    cfg = tmp_path / "tickers.json"
+    cfg.write_text(
+        json.dumps(
+            {
+                "last_updated": "2024-03-08T22:00:00Z",
+                "tickers": ["AAPL", "MSFT"],
+                "changes": {"since": None, "added": ["MSFT"], "removed": ["GONE"]},
+            }
+        )
+    )
+    rc = mp.main(["refresh", "--config", str(cfg), "--out-dir", str(tmp_path / "out"), "--no-cache"])
+    assert rc == 0
+    assert calls == [(["AAPL", "MSFT"], ["MSFT"], ["GONE"], "2024-03-08T22:00:00Z")]
+
+
+def test_refresh_refetches_flagged_split_in_full(tmp_path):
+    _store(tmp_path, "AAPL", "2024-01-02", "2024-03-01")
+    mp._flag_refetch(str(tmp_path), "AAPL", "close restated x0.5")
+    yahoo, stooq = RecordingProvider(), RecordingProvider("stooq")
+
+    summary = refresh(["AAPL"], str(tmp_path), history_start="2024-02-01", end="2024-03-08", providers=(yahoo, stooq))
+    assert summary["history"] == ["AAPL"]
+    assert yahoo.requests == [(("AAPL",), D("2024-02-01"), D("2024-03-08"))]
+    # The stale history is replaced, not merged into.
+    assert pd.read_csv(tmp_path / "AAPL_D.csv")["Date"].iloc[0] == "2024-02-01"
+    assert mp.pending_refetch(str(tmp_path)) == {}
+
+
+def test_refresh_keeps_flat_parquet_history(tmp_path):
+    pytest.importorskip("pyarrow")
+    mp.save_prices_parquet({"AAPL": make_bars("AAPL", pd.bdate_range("2023-01-02", "2024-03-01"))}, str(tmp_path))
+    yahoo, stooq = RecordingProvider(), RecordingProvider("stooq")
+
+    summary = refresh(
+        ["AAPL"], str(tmp_path), format="parquet", end="2024-03-08", lookback=2, providers=(yahoo, stooq)
+    )
+    assert summary["updated"] == ["AAPL"]
+    assert yahoo.requests == [(("AAPL",), D("2024-02-28"), D("2024-03-08"))]
+    # Only the lookback window was fetched, but the stored history is kept.
+    df = pd.read_parquet(tmp_path / "AAPL_D.parquet")
+    assert df["Date"].tolist() == list(pd.bdate_range("2023-01-02", "2024-03-08"))
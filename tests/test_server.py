@@ -0,0 +1,113 @@
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from marketdata import client
+from marketdata.prices import COLUMNS
+from marketdata.providers import Provider
+from marketdata.server import BarServer, MemoryCache, make_server
+
+
+class Counting(Provider):
+    """Offline provider returning one bar per weekday and counting requests."""
+
+    def __init__(self, name, latency=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.name = name
+        self.latency = latency
+        self.calls = 0
+        self.tickers = []
+
+    def download(self, tickers, start, end):
+        self.calls += 1
+        self.tickers += tickers
+        time.sleep(self.latency)
+        idx = pd.bdate_range(start, end, name="Date")
+        return {t: pd.DataFrame({c: 1.0 for c in ["Open", "High", "Low", "Close"]}, index=idx) for t in tickers}
+
+
+@pytest.fixture
+def running(tmp_path):
+    servers = []
+
+    def start(socket_path=None, **kwargs):
+        primary = Counting("yahoo")
+        bar_server = BarServer(providers=(primary, Counting("stooq")), **kwargs)
+        server = make_server(bar_server, port=0, socket_path=socket_path)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        if socket_path:
+            return f"unix://{socket_path}", primary
+        return f"http://127.0.0.1:{server.server_address[1]}", primary
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_server_shares_cached_bars(running):
+    url, primary = running()
+    first = client.get_prices(["aapl", "MSFT"], "2024-01-01", "2024-01-31", url=url)
+    assert list(first) == ["aapl", "MSFT"]
+    assert list(first["MSFT"].columns) == COLUMNS
+    assert first["MSFT"]["Date"].min() == pd.Timestamp("2024-01-01")
+
+    # A narrower window is answered from memory.
+    calls = primary.calls
+    second = client.get_prices(["AAPL"], "2024-01-08", "2024-01-12", url=url)
+    assert primary.calls == calls
+    assert len(second["AAPL"]) == 5
+
+
+def test_server_unix_socket_and_bad_request(running, tmp_path):
+    url, _ = running(socket_path=str(tmp_path / "prices.sock"))
+    bars = client.get_prices(["AAPL"], "2024-01-01", "2024-01-05", url=url)
+    assert len(bars["AAPL"]) == 5
+    with pytest.raises(RuntimeError, match="400"):
+        client.get_prices(["AAPL"], "2024-01-01", "2024-01-05", url=url, format="xml")
+
+
+def test_server_arrow_format(running):
+    pytest.importorskip("pyarrow")
+    url, _ = running()
+    bars = client.get_prices(["AAPL", "MSFT"], "2024-01-01", "2024-01-05", url=url, format="arrow")
+    assert len(bars["AAPL"]) == len(bars["MSFT"]) == 5
+    assert (bars["MSFT"]["Ticker"] == "MSFT").all()
+
+
+def test_server_shares_in_flight_fetches_per_symbol():
+    primary = Counting("yahoo", latency=0.2, max_concurrency=8)
+    bar_server = BarServer(providers=(primary, Counting("stooq")))
+    requests = [["AAPL"]] * 4 + [["MSFT"], ["IBM"], ["AAPL", "NVDA"]]
+    results = [None] * len(requests)
+
+    def ask(i):
+        results[i] = bar_server.get(requests[i], "2024-01-01", "2024-01-05")
+
+    threads = [threading.Thread(target=ask, args=(i,)) for i in range(len(requests))]
+    t0 = time.perf_counter()
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    # One upstream request per symbol, and different symbols don't queue behind each other.
+    assert sorted(primary.tickers) == ["AAPL", "IBM", "MSFT", "NVDA"]
+    assert time.perf_counter() - t0 < 0.6
+    assert all(len(df) == 5 for bars in results for df in bars.values())
+
+
+def test_memory_cache_lru_eviction():
+    df = pd.DataFrame({"Date": pd.bdate_range("2024-01-01", periods=100), "Close": 1.0})
+    size = int(df.memory_usage(deep=True).sum())
+    memory = MemoryCache(max_bytes=2 * size)
+    lo, hi = pd.Timestamp("2024-01-01"), pd.Timestamp("2024-05-17")
+    memory.put("A", df, lo, hi)
+    memory.put("B", df, lo, hi)
+    assert memory.get("A", lo, hi) is not None  # A is now most recently used
+    memory.put("C", df, lo, hi)
+    assert memory.get("B", lo, hi) is None
+    assert memory.get("A", lo, hi) is not None
+    assert memory.get("A", lo, hi + pd.Timedelta(days=3)) is None  # not covered
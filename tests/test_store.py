@@ -0,0 +1,90 @@
+import os
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from conftest import make_bars
+from marketdata.prices import COLUMNS, save_prices_parquet
+from marketdata.store import load_prices, write_dataset
+
+
+def test_dataset_roundtrip_and_append(tmp_path):
+    root = str(tmp_path / "ds")
+    history = pd.bdate_range("2023-12-01", "2024-02-29")
+    bars = {"AAPL": make_bars("AAPL", history), "^GSPC": make_bars("^GSPC", history, close=2.0)}
+    paths = save_prices_parquet(bars, root, partitioned=True)
+    assert (tmp_path / "ds" / "Ticker=AAPL" / "year=2023").is_dir()
+    assert len(paths) == 4
+
+    # Re-sending overlapping bars only appends the genuinely new ones.
+    more = pd.bdate_range("2024-02-26", "2024-03-08")
+    paths = write_dataset({"AAPL": make_bars("AAPL", more)}, root)
+    assert len(paths) == 1 and "year=2024" in paths[0]
+
+    out = load_prices(["AAPL", "^GSPC", "MSFT"], "2024-01-15", "2024-03-31", root=root)
+    assert out["MSFT"].empty
+    assert list(out["AAPL"].columns) == COLUMNS
+    assert out["AAPL"]["Date"].is_unique
+    assert out["AAPL"]["Date"].min() == pd.Timestamp("2024-01-15")
+    assert out["AAPL"]["Date"].max() == pd.Timestamp("2024-03-08")
+    assert out["^GSPC"]["Close"].eq(2.0).all()
+    assert out["^GSPC"]["Ticker"].iloc[0] == "^GSPC"
+
+
+def test_load_prices_prunes_partitions_and_columns(tmp_path):
+    import pyarrow.parquet as pq
+
+    root = str(tmp_path / "ds")
+    history = pd.bdate_range("2022-01-01", "2024-12-31")
+    write_dataset({"AAPL": make_bars("AAPL", history)}, root, row_group_size=20, compression="zstd")
+    part = next((tmp_path / "ds" / "Ticker=AAPL" / "year=2024").glob("*.parquet"))
+    meta = pq.ParquetFile(part).metadata
+    assert meta.num_row_groups > 1
+    assert "Ticker" not in meta.schema.names
+
+    # Corrupt an unrelated year: a pruned read must never open it.
+    for f in (tmp_path / "ds" / "Ticker=AAPL" / "year=2022").glob("*.parquet"):
+        f.write_bytes(b"not parquet")
+    out = load_prices(["AAPL"], "2024-03-01", "2024-03-31", root=root, columns=["Close"])
+    assert list(out["AAPL"].columns) == ["Date", "Close", "Ticker"]
+    assert len(out["AAPL"]) == len(pd.bdate_range("2024-03-01", "2024-03-31"))
+
+
+def test_write_dataset_parts_are_atomic_with_stats(tmp_path):
+    from marketdata.metrics import RunMetrics
+
+    root = tmp_path / "ds"
+    history = pd.bdate_range("2023-06-01", "2024-06-28")
+    bars = {t: make_bars(t, history) for t in ("AAPL", "MSFT")}
+    metrics = RunMetrics()
+    paths = write_dataset(bars, str(root), workers=2, metrics=metrics)
+    assert [(p.ticker, p.rows) for p in paths] == [("AAPL", 152), ("AAPL", 130), ("MSFT", 152), ("MSFT", 130)]
+    assert all(p.nbytes == os.path.getsize(p) for p in paths)
+    assert metrics.rows_written == {"AAPL": len(history), "MSFT": len(history)}
+    assert not list(root.rglob("*.tmp"))
+
+    # A full rewrite swaps in the new parts, then removes the old ones.
+    paths = write_dataset({"AAPL": make_bars("AAPL", history[-5:], close=2.0)}, str(root), incremental=False)
+    assert [p.rows for p in paths] == [5]
+    assert not (root / "Ticker=AAPL" / "year=2023").exists()
+    assert load_prices(["AAPL"], root=str(root))["AAPL"]["Close"].tolist() == [2.0] * 5
+
+
+def test_write_dataset_replaces_restated_bars_and_compacts_years(tmp_path):
+    root = tmp_path / "ds"
+    days = pd.bdate_range("2024-01-02", periods=8)
+    for i in range(4):
+        write_dataset({"AAPL": make_bars("AAPL", days[2 * i : 2 * i + 2])}, str(root), max_parts=3)
+    # The fourth append would make four parts, so the year is rewritten as one.
+    parts = list((root / "Ticker=AAPL" / "year=2024").glob("*.parquet"))
+    assert len(parts) == 1
+    assert load_prices(["AAPL"], root=str(root))["AAPL"]["Date"].tolist() == list(days)
+
+    # Re-sent bars are skipped, restated ones replace what is stored.
+    assert [p.rows for p in write_dataset({"AAPL": make_bars("AAPL", days[-3:])}, str(root))] == [0]
+    restated = make_bars("AAPL", days[-3:], close=[1.0, 0.5, 0.5])
+    (path,) = write_dataset({"AAPL": restated}, str(root))
+    assert path.rows == 8 and not parts[0].exists()
+    assert load_prices(["AAPL"], root=str(root))["AAPL"]["Close"].tolist() == [1.0] * 6 + [0.5] * 2
@@ -1,5 +1,10 @@
+import os
+
+import pandas as pd
+
 from watchlist.update_watchlist import update_watchlist
 
+
 def test_update_watchlist_smoke(tmp_path):
     out_json = tmp_path / "tickers.json"
     payload = update_watchlist(
@@ -9,3 +14,76 @@ def test_update_watchlist_smoke(tmp_path):
         out_json=str(out_json),
     )
     assert "tickers" in payload
+
+
+def test_update_watchlist_records_changes(tmp_path):
+    out_json = tmp_path / "tickers.json"
+    extras = tmp_path / "extras.json"
+    kwargs = dict(portfolio_csv=str(tmp_path / "portfolio.csv"), static_extras_json=str(extras), out_json=str(out_json))
+
+    extras.write_text('{"tickers": ["AAPL", "MSFT"]}')
+    first = update_watchlist(**kwargs)
+    assert first["changes"] == {"since": None, "added": ["AAPL", "MSFT"], "removed": []}
+
+    extras.write_text('{"tickers": ["MSFT", "NVDA"]}')
+    second = update_watchlist(**kwargs)
+    assert second["changes"] == {"since": first["last_updated"], "added": ["NVDA"], "removed": ["AAPL"]}
+
+
+def test_changes_accumulate_until_a_refresh_applies_them(tmp_path):
+    import json
+
+    out_json, extras, state = tmp_path / "tickers.json", tmp_path / "extras.json", tmp_path / ".refresh.json"
+    kwargs = dict(static_extras_json=str(extras), out_json=str(out_json), refresh_state=str(state))
+
+    def update(tickers, version):
+        extras.write_text(json.dumps({"tickers": tickers}))
+        payload = update_watchlist(portfolio_csv=str(tmp_path / "portfolio.csv"), **kwargs)
+        out_json.write_text(json.dumps({**payload, "last_updated": version}))  # distinct stamps within a second
+        return payload["changes"]
+
+    update(["AAPL", "MSFT"], "v1")
+    state.write_text('{"version": "v1"}')
+    assert update(["MSFT", "NVDA"], "v2") == {"since": "v1", "added": ["NVDA"], "removed": ["AAPL"]}
+    # No refresh ran since v1, so v3's changes still include v2's.
+    assert update(["MSFT", "NVDA", "TSLA"], "v3") == {"since": "v1", "added": ["NVDA", "TSLA"], "removed": ["AAPL"]}
+    state.write_text('{"version": "v3"}')
+    assert update(["NVDA", "TSLA"], "v4") == {"since": "v3", "added": [], "removed": ["MSFT"]}
+
+
+def test_chunked_and_tail_reads_agree(tmp_path):
+    dates = pd.bdate_range("2024-01-01", periods=400)
+    trades = pd.DataFrame({"Date": dates, "Ticker": [f"T{i % 50}" for i in range(400)], "Notes": "x" * 200})
+    trades.to_csv(tmp_path / "trades.csv", index=False)
+    port = pd.DataFrame(
+        {
+            "Date": [dates[-3]] * 2 + [dates[-1]] * 3,
+            "Ticker": ["OLD", "aapl", "AAPL", "SOLD", "TOTAL"],
+            "Shares": [1, 2, 2, 0, None],
+            "Cash": 1.0,
+        }
+    )
+    port.to_csv(tmp_path / "portfolio.csv", index=False)
+    kwargs = dict(portfolio_csv=str(tmp_path / "portfolio.csv"), trade_log_csv=str(tmp_path / "trades.csv"))
+    kwargs["retention_days"] = 0
+
+    streamed = update_watchlist(out_json=str(tmp_path / "a.json"), chunksize=7, **kwargs)
+    tailed = update_watchlist(out_json=str(tmp_path / "b.json"), sorted_dates=True, **kwargs)
+    # Trades within a week of the newest one (six sessions), plus the position held on the latest date.
+    assert streamed["tickers"] == tailed["tickers"] == ["AAPL", "T44", "T45", "T46", "T47", "T48", "T49"]
+
+    kwargs["retention_days"] = 5
+    assert "OLD" in update_watchlist(out_json=str(tmp_path / "c.json"), sorted_dates=True, **kwargs)["tickers"]
+
+
+def test_unchanged_watchlist_is_not_rewritten(tmp_path):
+    out_json = tmp_path / "tickers.json"
+    extras = tmp_path / "extras.json"
+    kwargs = dict(portfolio_csv=str(tmp_path / "portfolio.csv"), static_extras_json=str(extras), out_json=str(out_json))
+
+    extras.write_text('{"tickers": ["AAPL"]}')
+    first = update_watchlist(**kwargs)
+    stat = os.stat(out_json)
+    again = update_watchlist(**kwargs)
+    assert again == first
+    assert os.stat(out_json).st_mtime_ns == stat.st_mtime_ns
@@ -5,16 +5,107 @@ import json
 import os
 import shutil
 import tempfile
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 
-import pandas as pd
+if TYPE_CHECKING:  # pandas is imported lazily so `watchlist-update --help` starts fast
+    import pandas as pd
 
 
-def _read_csv_safe(path: str) -> pd.DataFrame:
-    try:
-        return pd.read_csv(path)
-    except FileNotFoundError:
-        return pd.DataFrame()
+# Only these columns are read, with fixed dtypes; Date is parsed per chunk.
+PORTFOLIO_COLUMNS = {"Date": str, "Ticker": str, "Shares": "float64"}
+TRADE_COLUMNS = {"Date": str, "Ticker": str}
+CHUNK_ROWS = 200_000
+TAIL_BLOCK = 1 << 16
+
+
+def _prepare(chunk: pd.DataFrame) -> pd.DataFrame:
+    import pandas as pd
+
+    chunk = chunk.dropna(subset=["Ticker"])
+    chunk = chunk.assign(Date=pd.to_datetime(chunk["Date"], errors="coerce"), Ticker=chunk["Ticker"].str.upper())
+    return chunk.dropna(subset=["Date"])
+
+
+def _tail_rows(path: str, columns: dict, days: int) -> pd.DataFrame:
+    """Read ``path`` backwards from its end until a row older than ``days`` before the newest.
+
+    Only valid when the file is sorted by ``Date``; each pass reads a
+    block four times larger than the last, so a long history costs a few
+    reads of its tail.
+    """
+    import io
+
+    import pandas as pd
+
+    with open(path, "rb") as fh:
+        header = fh.readline()
+        body = fh.tell()
+        size = fh.seek(0, os.SEEK_END)
+        block = TAIL_BLOCK
+        while True:
+            lo = max(body, size - block)
+            fh.seek(lo)
+            data = fh.read(size - lo)
+            block *= 4
+            if lo > body:
+                cut = data.find(b"\n")
+                if cut < 0:
+                    continue
+                data = data[cut + 1 :]  # drop the partial first line
+            rows = pd.read_csv(io.BytesIO(header + data), usecols=lambda c: c in columns, dtype=columns)
+            if "Date" not in rows or "Ticker" not in rows:
+                return rows.iloc[:0]
+            rows = _prepare(rows)
+            if lo == body or (not rows.empty and rows["Date"].min() < rows["Date"].max() - pd.Timedelta(days=days)):
+                return rows
+
+
+def _recent_rows(
+    path: Optional[str],
+    columns: dict,
+    days: int,
+    *,
+    chunksize: int = CHUNK_ROWS,
+    sorted_dates: bool = False,
+) -> pd.DataFrame:
+    """Return the rows of ``path`` dated within ``days`` of its newest ``Date``.
+
+    Only ``columns`` are read, with their dtypes. The file is streamed in
+    ``chunksize`` rows, keeping a running maximum date and dropping rows
+    that fall out of the window as it moves, so memory follows the window
+    rather than the file; with ``sorted_dates`` only its tail is read (see
+    :func:`_tail_rows`). A missing file, or one without ``Date`` and
+    ``Ticker`` columns, gives an empty frame.
+    """
+    import pandas as pd
+
+    empty = pd.DataFrame({c: pd.Series(dtype="datetime64[ns]" if c == "Date" else t) for c, t in columns.items()})
+    if not path or not os.path.exists(path):
+        return empty
+    window = pd.Timedelta(days=days)
+
+    if sorted_dates:
+        rows = _tail_rows(path, columns, days)
+        if rows.empty:
+            return empty
+        cutoff = rows["Date"].max() - window
+        return rows[rows["Date"] >= cutoff].reset_index(drop=True)
+
+    keep, latest = None, None
+    reader = pd.read_csv(path, usecols=lambda c: c in columns, dtype=columns, chunksize=chunksize)
+    with reader:
+        for chunk in reader:
+            if "Date" not in chunk or "Ticker" not in chunk:
+                return empty
+            chunk = _prepare(chunk)
+            if chunk.empty:
+                continue
+            top = chunk["Date"].max()
+            latest = top if latest is None else max(latest, top)
+            cutoff = latest - window
+            chunk = chunk[chunk["Date"] >= cutoff]
+            keep = chunk if keep is None else pd.concat([keep[keep["Date"] >= cutoff], chunk], ignore_index=True)
+    return empty if keep is None else keep.reset_index(drop=True)
 
 
 def _read_static_extras(path: Optional[str]) -> set[str]:
@@ -28,6 +119,20 @@ def _read_static_extras(path: Optional[str]) -> set[str]:
         return set()
 
 
+def _read_previous(path: str) -> dict:
+    """Return the existing payload at ``path``, or ``{}``."""
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            return json.load(fh)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _refreshed_version(path: Optional[str]) -> Optional[str]:
+    """Return the watchlist version the refresh state at ``path`` last applied, or ``None``."""
+    return _read_previous(path).get("version") if path else None
+
+
 def update_watchlist(
     *,
     portfolio_csv: str,
@@ -36,34 +141,56 @@ def update_watchlist(
     out_json: str = "config/tickers.json",
     recent_trade_days: int = 7,
     retention_days: int = 5,
+    chunksize: int = CHUNK_ROWS,
+    sorted_dates: bool = False,
+    refresh_state: Optional[str] = None,
 ) -> dict:
-    port = _read_csv_safe(portfolio_csv)
-    trades = _read_csv_safe(trade_log_csv) if trade_log_csv else pd.DataFrame()
+    """Derive the watchlist from the portfolio and trade log and write it to ``out_json``.
+
+    Active positions on the portfolio's latest date, names held within
+    ``retention_days`` of it, names traded within ``recent_trade_days`` of
+    the newest trade and the static extras make up the list. Both CSVs are
+    streamed with only the columns needed (see :func:`_recent_rows`); pass
+    ``sorted_dates`` when they are appended in date order to read just
+    their tails. If the result matches ``out_json`` apart from its
+    timestamp, the file is left untouched and its payload returned.
+
+    ``changes`` records the names added and removed since the previous
+    file. Given ``refresh_state`` (the ``.refresh.json`` that ``prices
+    refresh`` keeps in its output directory), they are instead counted
+    from the version that refresh last applied, so changes made by several
+    updates between two refreshes all reach the next one.
+    """
+    import pandas as pd
+
+    port = _recent_rows(
+        portfolio_csv, PORTFOLIO_COLUMNS, max(retention_days, 0), chunksize=chunksize, sorted_dates=sorted_dates
+    )
+    trades = _recent_rows(
+        trade_log_csv, TRADE_COLUMNS, recent_trade_days, chunksize=chunksize, sorted_dates=sorted_dates
+    )
     extras = _read_static_extras(static_extras_json)
 
     tickers: set[str] = set()
 
     if not port.empty:
-        port["Date"] = pd.to_datetime(port["Date"])
-        latest_date = port["Date"].max()
-        latest = port[port["Date"] == latest_date]
-        active = latest[(latest["Ticker"].str.upper() != "TOTAL") & (latest.get("Shares", 0) > 0)]
-        tickers.update(active["Ticker"].astype(str).str.upper().tolist())
-
+        latest = port[port["Date"] == port["Date"].max()]
+        if "Shares" in latest:
+            tickers.update(latest.loc[latest["Shares"] > 0, "Ticker"])
         if retention_days > 0:
-            cutoff = latest_date - pd.Timedelta(days=retention_days)
-            recent_hist = port[(port["Ticker"].str.upper() != "TOTAL") & (port["Date"] >= cutoff)]
-            tickers.update(recent_hist["Ticker"].astype(str).str.upper().tolist())
+            tickers.update(port["Ticker"])
 
-    if not trades.empty and "Date" in trades.columns and "Ticker" in trades.columns:
-        trades["Date"] = pd.to_datetime(trades["Date"])
-        tmax = trades["Date"].max()
-        tcut = tmax - pd.Timedelta(days=recent_trade_days)
-        recent_trades = trades[trades["Date"] >= tcut]
-        tickers.update(recent_trades["Ticker"].astype(str).str.upper().tolist())
+    tickers.update(trades["Ticker"])
 
     tickers.update(extras)
     tickers = sorted({t for t in tickers if t and t != "TOTAL"})
+    previous = _read_previous(out_json)
+    since, before = previous.get("last_updated"), set(previous.get("tickers", []))
+    pending = previous.get("changes")
+    if refresh_state and pending and since != _refreshed_version(refresh_state):
+        # The previous file's changes were never applied: count from the list they started at.
+        since = pending.get("since")
+        before = (before - set(pending.get("added", []))) | set(pending.get("removed", []))
 
     payload = {
         "last_updated": pd.Timestamp.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
@@ -72,6 +199,13 @@ def update_watchlist(
             "benchmarks": [t for t in ["SPY", "IWM", "XBI"] if t in tickers],
             "watchlist": tickers,
         },
+        # Difference to the last refreshed (or else the replaced) payload; `prices
+        # refresh` uses it to backfill only added names and archive removed ones.
+        "changes": {
+            "since": since,
+            "added": sorted(set(tickers) - before),
+            "removed": sorted(before - set(tickers)),
+        },
         "sources": {
             "portfolio_file": portfolio_csv,
             "trade_log_file": trade_log_csv,
@@ -79,6 +213,12 @@ def update_watchlist(
         },
     }
 
+    # Nothing but the stamp would change: keep the file (and its changes) as is,
+    # so caches and refreshes keyed on it see the same watchlist.
+    volatile = ("last_updated", "changes")
+    if previous and all(previous.get(k) == v for k, v in payload.items() if k not in volatile):
+        return previous
+
     os.makedirs(os.path.dirname(out_json) or ".", exist_ok=True)
     with tempfile.NamedTemporaryFile("w", delete=False, encoding="utf-8") as tmp:
         json.dump(payload, tmp, indent=2)
@@ -98,6 +238,17 @@ def main(argv: list[str] | None = None) -> int:
     ap.add_argument("--out", default="config/tickers.json")
     ap.add_argument("--recent-trade-days", type=int, default=7)
     ap.add_argument("--retention-days", type=int, default=5)
+    ap.add_argument("--chunksize", type=int, default=CHUNK_ROWS, help="CSV rows read at a time")
+    ap.add_argument(
+        "--sorted",
+        action="store_true",
+        help="The CSVs are in date order: read them backwards from the end instead of in full",
+    )
+    ap.add_argument(
+        "--refresh-state",
+        default=None,
+        help="The .refresh.json in the `prices refresh` output directory: record changes since the version it applied",
+    )
     args = ap.parse_args(argv)
 
     out = update_watchlist(
@@ -107,6 +258,9 @@ def main(argv: list[str] | None = None) -> int:
         out_json=args.out,
         recent_trade_days=args.recent_trade_days,
         retention_days=args.retention_days,
+        chunksize=args.chunksize,
+        sorted_dates=args.sorted,
+        refresh_state=args.refresh_state,
     )
     print(json.dumps(out, indent=2))
     return 0